@@ -25,6 +25,7 @@ def create_app():
     csrf.init_app(app)
 
     from app import models
+    from app import changes  # noqa: F401  (tombstone'ы удалений)
 
     @login_manager.user_loader
     def load_user(user_id):
@@ -34,4 +35,17 @@ def create_app():
     app.register_blueprint(main_bp)
     app.register_blueprint(admin_bp)
 
+    from app.commands import register_commands
+    register_commands(app)
+
+    from app.uploads import image_src, image_srcset
+    app.add_template_filter(image_src)
+    app.add_template_filter(image_srcset)
+
+    from app.cache import init_page_cache
+    init_page_cache(app)
+
+    from app.typeahead import init_typeahead
+    init_typeahead(app)
+
     return app
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from app import db
+from app.changes import record_deleted
+from app.models import Product, Batch
+from app.stock import adjust_stock
+
+
+class InsufficientStock(ValueError):
+    def __init__(self, product, available):
+        self.product = product
+        self.available = available
+        super().__init__(f"Недостаточно остатков для товара '{product.name}'. Доступно: {available}")
+
+
+class AllocatedLine:
+    def __init__(self, product, quantity, source_produced_at):
+        self.product = product
+        self.quantity = quantity
+        self.source_produced_at = source_produced_at
+
+
+def _lock_batches(product_ids, today, skip_locked=True):
+    # Порядок блокировки фиксирован (товар, дата изготовления, id), чтобы параллельные
+    # подтверждения не ловили взаимоблокировку. SKIP LOCKED: партии, которые сейчас
+    # списывает другая касса, просто не считаются доступными — отсюда возможна ложная
+    # нехватка, см. allocate(). populate_existing: после ожидания блокировки в сессии
+    # должны оказаться свежие остатки, а не прочитанные раньше в этой транзакции.
+    return (
+        Batch.query
+        .filter(Batch.product_id.in_(product_ids), Batch.expires_at >= today)
+        .order_by(Batch.product_id.asc(), Batch.produced_at.asc(), Batch.id.asc())
+        .with_for_update(skip_locked=skip_locked)
+        .populate_existing()
+        .all()
+    )
+
+
+def free_quantity(batch):
+    """Сколько партии можно продать: зарезервированное под предзаказы не трогаем."""
+    return Decimal(str(batch.quantity)) - Decimal(str(batch.reserved or 0))
+
+
+class FefoAllocator:
+    """
+    Списание по FEFO в одной транзакции для нескольких продаж подряд:
+    партии блокируются один раз, остатки после каждой продажи учитываются в памяти.
+    Изменения партий пишутся одним пакетом в apply().
+    """
+
+    def __init__(self, product_ids, today=None, products=None, skip_locked=True):
+        self.today = today or date.today()
+        product_ids = sorted({int(pid) for pid in product_ids})
+        if products is None:
+            products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()} if product_ids else {}
+        self.products = products
+
+        self.batches_by_product = defaultdict(list)
+        if product_ids:
+            for batch in _lock_batches(product_ids, self.today, skip_locked=skip_locked):
+                self.batches_by_product[batch.product_id].append(batch)
+
+        self.remaining = {}  # batch.id -> остаток после списания
+        self.stock_deltas = defaultdict(Decimal)
+
+    def _batches(self, product_id, on_date):
+        for batch in self.batches_by_product[product_id]:
+            if batch.expires_at >= on_date:
+                yield batch, self.remaining.get(batch.id, free_quantity(batch))
+
+    def available(self, product_id, on_date=None):
+        on_date = on_date or self.today
+        return sum((qty for _, qty in self._batches(product_id, on_date)), Decimal("0"))
+
+    def check(self, lines, on_date=None):
+        """Бросает InsufficientStock, если lines нельзя списать целиком; состояние не меняется."""
+        need = defaultdict(Decimal)
+        for product_id, qty in lines:
+            if product_id in self.products and qty > 0:
+                need[product_id] += qty
+        for product_id, qty in need.items():
+            available_qty = self.available(product_id, on_date)
+            if available_qty < qty:
+                raise InsufficientStock(self.products[product_id], available_qty)
+
+    def take(self, lines, on_date=None):
+        """
+        Списывает lines целиком или не списывает ничего.
+        lines: [(product_id, qty: Decimal), ...]; on_date — дата продажи (годность партий).
+        """
+        on_date = on_date or self.today
+        lines = [(int(pid), Decimal(str(qty))) for pid, qty in lines]
+        self.check(lines, on_date)
+
+        allocated = []
+        for product_id, need_qty in lines:
+            product = self.products.get(product_id)
+            if not product or need_qty <= 0:
+                continue
+
+            remains = need_qty
+            source_produced_at = None
+
+            for batch, batch_qty in self._batches(product_id, on_date):
+                if remains <= 0:
+                    break
+                if batch_qty <= 0:
+                    continue
+                if source_produced_at is None:
+                    source_produced_at = batch.produced_at
+
+                take_qty = batch_qty if batch_qty <= remains else remains
+                remains -= take_qty
+                self.remaining[batch.id] = batch_qty - take_qty
+                self.stock_deltas[(product_id, batch.expires_at)] -= take_qty
+
+            allocated.append(AllocatedLine(product, need_qty, source_produced_at))
+        return allocated
+
+    def apply(self):
+        reserved = {
+            batch.id: Decimal(str(batch.reserved or 0))
+            for batches in self.batches_by_product.values()
+            for batch in batches
+            if batch.id in self.remaining
+        }
+        _apply(self.remaining, self.stock_deltas, reserved)
+
+
+def allocate(lines, today=None):
+    """
+    Списывает остатки по FEFO для всех позиций сразу.
+    lines: [(product_id, qty: Decimal), ...]
+    Возвращает [AllocatedLine, ...]; при нехватке бросает InsufficientStock.
+    Изменения партий выполняются пакетно в текущей транзакции, commit — за вызывающим.
+
+    Сначала партии берутся с SKIP LOCKED: пока другая касса держит нужную партию, остатка
+    может «не хватить», хотя после её commit он есть. Поэтому нехватка перепроверяется один раз
+    с обычной блокировкой (ждём другую кассу); InsufficientStock уходит наружу, только если
+    остатка действительно нет. take() при нехватке ничего не меняет — повтор безопасен.
+
+    Первый проход идёт в SAVEPOINT и перед ожиданием откатывается: иначе две кассы, успевшие
+    взять по одной партии, ждали бы во втором проходе друг друга (взаимоблокировка). Второй
+    проход не держит ничего лишнего и блокирует партии в общем порядке _lock_batches.
+    """
+    lines = [(int(pid), Decimal(str(qty))) for pid, qty in lines]
+    if not lines:
+        return []
+
+    product_ids = {pid for pid, _ in lines}
+    if db.session.get_bind().dialect.name != "postgresql":
+        # SKIP LOCKED и блокировки строк есть только на Postgres — сразу один ожидающий проход
+        allocator = FefoAllocator(product_ids, today, skip_locked=False)
+        allocated = allocator.take(lines)
+    else:
+        savepoint = db.session.begin_nested()
+        allocator = FefoAllocator(product_ids, today)
+        try:
+            allocated = allocator.take(lines)
+        except InsufficientStock:
+            savepoint.rollback()  # снимает блокировки первого прохода
+            allocator = FefoAllocator(product_ids, today, products=allocator.products, skip_locked=False)
+            allocated = allocator.take(lines)
+        else:
+            savepoint.commit()
+    allocator.apply()
+    return allocated
+
+
+def _apply(remaining, stock_deltas, reserved=None):
+    # remaining — свободный остаток; в партии остаются ещё и её резервы
+    reserved = reserved or {}
+    quantities = {batch_id: qty + reserved.get(batch_id, 0) for batch_id, qty in remaining.items()}
+    delete_ids = [batch_id for batch_id, qty in quantities.items() if qty <= 0]
+    updates = [{"id": batch_id, "quantity": qty} for batch_id, qty in quantities.items() if qty > 0]
+
+    if delete_ids:
+        db.session.execute(
+            db.delete(Batch).where(Batch.id.in_(delete_ids)).execution_options(synchronize_session=False)
+        )
+        record_deleted(Batch.__tablename__, delete_ids)
+    if updates:
+        db.session.execute(db.update(Batch), updates)
+
+    for (product_id, expires_at), delta in stock_deltas.items():
+        adjust_stock(product_id, expires_at, delta)
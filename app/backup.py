@@ -0,0 +1,462 @@
+import gzip
+import json
+import os
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select, text
+
+from app import db
+from app.dbutil import dialect_insert, to_db_time
+from app.models import (
+    User, Category, Product, Batch, WriteOff, Sale, SaleItem, Preorder, PreorderItem,
+    ProductStock, DraftLine, DeletedRow, SalesDaily, StockReservation, PickupSlot
+)
+from app.stock import rebuild_stock
+from app.reservations import rebuild_reservations
+from app.pickup import refresh_slot_bookings
+from app.reports import rebuild_sales_daily, refresh_sale_totals
+from app.cache import bump_catalog_version, bump_catalog_epoch
+
+FORMAT_VERSION = 4
+YIELD_PER = 1000
+
+# Запас при выборке изменений: строки незакоммиченных на момент прошлой копии
+# транзакций могли получить метку чуть раньше водяного знака. Повтор безопасен — upsert.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Порядок секций важен для восстановления (внешние ключи).
+# Третье поле — колонка, по которой инкрементальная копия отбирает изменения.
+PLAIN_TABLES = [
+    ("users", User, "updated_at"),
+    ("categories", Category, "updated_at"),
+    ("products", Product, "updated_at"),
+    ("batches", Batch, "updated_at"),
+    ("write_offs", WriteOff, "created_at"),
+    ("pickup_slots", PickupSlot, "updated_at"),
+]
+
+# Таблицы в порядке вставки; удаление — в обратном
+RESTORE_ORDER = [
+    ("users", User),
+    ("categories", Category),
+    ("products", Product),
+    ("batches", Batch),
+    ("write_offs", WriteOff),
+    ("sales", Sale),
+    ("sale_items", SaleItem),
+    ("pickup_slots", PickupSlot),
+    ("preorders", Preorder),
+    ("preorder_items", PreorderItem),
+]
+RESTORE_TABLES = dict(RESTORE_ORDER)
+LEGACY_REQUIRED = {"categories", "products", "batches", "write_offs", "sales"}
+
+
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _row(mapping):
+    return {key: _jsonable(value) for key, value in mapping.items()}
+
+
+def _stream(stmt):
+    # yield_per => server-side cursor на Postgres, память не растёт с размером таблицы
+    return db.session.execute(stmt.execution_options(yield_per=YIELD_PER)).mappings()
+
+
+def _iter_table(model, *criteria):
+    table = model.__table__
+    for mapping in _stream(select(table).where(*criteria).order_by(table.c.id)):
+        yield _row(mapping)
+
+
+def _iter_sales(*criteria):
+    """Продажи с позициями одним join-запросом (без N+1 по s.items)."""
+    sales = Sale.__table__
+    items = SaleItem.__table__
+    stmt = (
+        select(
+            *[c.label(f"sale_{c.name}") for c in sales.c],
+            *[c.label(f"item_{c.name}") for c in items.c if c.name != "sale_id"],
+        )
+        .select_from(sales.outerjoin(items, items.c.sale_id == sales.c.id))
+        .where(*criteria)
+        .order_by(sales.c.id, items.c.id)
+    )
+
+    current = None
+    for mapping in _stream(stmt):
+        if current is None or current["id"] != mapping["sale_id"]:
+            if current is not None:
+                yield current
+            current = {
+                key[len("sale_"):]: _jsonable(value)
+                for key, value in mapping.items()
+                if key.startswith("sale_")
+            }
+            current["items"] = []
+        if mapping["item_id"] is not None:
+            current["items"].append({
+                key[len("item_"):]: _jsonable(value)
+                for key, value in mapping.items()
+                if key.startswith("item_")
+            })
+    if current is not None:
+        yield current
+
+
+def parse_watermark(value):
+    """
+    ISO-строка водяного знака -> наивное время по часам БД, как в колонках *_at и now().
+    now() Postgres отдаёт время с поясом, а --since вводят руками без него — сравнивать их напрямую нельзя.
+    """
+    return to_db_time(datetime.fromisoformat(value) if isinstance(value, str) else value)
+
+
+def current_watermark():
+    """Время БД на момент начала выгрузки — водяной знак для следующей инкрементальной копии."""
+    return db.session.execute(select(db.func.now())).scalar()
+
+
+def iter_backup_records(since=None):
+    """
+    Записи резервной копии по секциям: {"table": ..., "row": {...}}.
+    since=None — полная копия; иначе только строки, изменённые после водяного знака
+    since, плюс tombstone'ы удалённых строк (секция "deleted").
+    """
+    watermark = current_watermark()
+    yield {
+        "table": "meta",
+        "row": {
+            "created_at": datetime.utcnow().isoformat(),
+            "app": "Farmer_store",
+            "format": FORMAT_VERSION,
+            "kind": "incremental" if since else "full",
+            "since": _jsonable(since),
+            "watermark": _jsonable(watermark),
+            "tables": [name for name, _ in RESTORE_ORDER],
+        },
+    }
+
+    border = since - WATERMARK_OVERLAP if since else None
+
+    def changed(column):
+        return (column >= border,) if border else ()
+
+    for name, model, change_column in PLAIN_TABLES:
+        for row in _iter_table(model, *changed(model.__table__.c[change_column])):
+            yield {"table": name, "row": row}
+    for row in _iter_sales(*changed(Sale.__table__.c.recorded_at)):
+        yield {"table": "sales", "row": row}
+
+    preorders = Preorder.__table__
+    for row in _iter_table(Preorder, *changed(preorders.c.updated_at)):
+        yield {"table": "preorders", "row": row}
+    items_criteria = ()
+    if border:
+        items_criteria = (
+            PreorderItem.__table__.c.preorder_id.in_(select(preorders.c.id).where(preorders.c.updated_at >= border)),
+        )
+    for row in _iter_table(PreorderItem, *items_criteria):
+        yield {"table": "preorder_items", "row": row}
+
+    if border:
+        for row in _iter_table(DeletedRow, DeletedRow.__table__.c.deleted_at >= border):
+            yield {"table": "deleted", "row": {"table_name": row["table_name"], "row_id": row["row_id"]}}
+
+
+def iter_backup_gzip(records=None, flush_every=500):
+    """gzip-сжатый NDJSON кусками, пригодный для потокового ответа."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> формат gzip
+    pending = []
+    for record in records if records is not None else iter_backup_records():
+        pending.append(json.dumps(record, ensure_ascii=False))
+        pending.append("\n")
+        if len(pending) >= flush_every * 2:
+            chunk = compressor.compress("".join(pending).encode("utf-8"))
+            pending.clear()
+            if chunk:
+                yield chunk
+    if pending:
+        yield compressor.compress("".join(pending).encode("utf-8"))
+    yield compressor.flush()
+
+
+def iter_backup_file(source):
+    """
+    Потоково читает копию (FileStorage или открытый бинарный файл) и отдаёт записи {"table", "row"}.
+    Первая запись — meta со списком таблиц. Старый JSON-файл тоже понимается.
+    """
+    stream = getattr(source, "stream", source)
+    head = stream.read(2)
+    stream.seek(0)
+
+    if head == b"\x1f\x8b":
+        with gzip.open(stream, "rt", encoding="utf-8") as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    payload = json.load(stream)
+    if not LEGACY_REQUIRED.issubset(payload.keys()):
+        raise ValueError("Неверный формат резервной копии")
+
+    tables = [name for name, _ in RESTORE_ORDER if name in payload or name == "sale_items"]
+    yield {"table": "meta", "row": {**payload.get("meta", {}), "tables": tables}}
+    for name, _ in RESTORE_ORDER:
+        for row in payload.get(name, []):
+            yield {"table": name, "row": row}
+
+
+def _coerce(column, value):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is Decimal:
+        return Decimal(str(value))
+    if python_type is bool:
+        return bool(value)
+    return value
+
+
+class RestoreStats:
+    def __init__(self):
+        self.rows = {}
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self):
+        return self.total_rows / self.elapsed if self.elapsed else float(self.total_rows)
+
+
+class _ChunkedInserter:
+    """
+    Копит строки по таблицам и вставляет их пачками через executemany.
+    upsert=True — для инкрементальных копий: существующие строки обновляются по id.
+    """
+
+    def __init__(self, chunk_size, stats, progress=None, upsert=False):
+        self.chunk_size = chunk_size
+        self.stats = stats
+        self.progress = progress
+        self.upsert = upsert
+        self.buffers = {name: [] for name, _ in RESTORE_ORDER}
+
+    def add(self, name, raw_row):
+        table = RESTORE_TABLES[name].__table__
+        row = {key: _coerce(table.c[key], value) for key, value in raw_row.items() if key in table.c}
+
+        buffer = self.buffers[name]
+        # executemany требует одинаковый набор колонок в пачке
+        if buffer and buffer[0].keys() != row.keys():
+            self.flush()
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        # сбрасываем все буферы в порядке внешних ключей (sales раньше sale_items)
+        for name, model in RESTORE_ORDER:
+            buffer = self.buffers[name]
+            if not buffer:
+                continue
+            db.session.execute(self._statement(model, buffer[0].keys()), buffer)
+            self.stats.rows[name] = self.stats.rows.get(name, 0) + len(buffer)
+            buffer.clear()
+            if self.progress:
+                self.progress(name, self.stats.rows[name])
+
+
+    def _statement(self, model, keys):
+        if not self.upsert:
+            return model.__table__.insert()
+        stmt = dialect_insert(model.__table__)
+        return stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={key: stmt.excluded[key] for key in keys if key != "id"},
+        )
+
+
+def _wipe(tables):
+    db.session.execute(StockReservation.__table__.delete())
+    db.session.execute(DraftLine.__table__.delete())
+    db.session.execute(ProductStock.__table__.delete())
+    db.session.execute(SalesDaily.__table__.delete())
+    for name, model in reversed(RESTORE_ORDER):
+        if name in tables:
+            db.session.execute(model.__table__.delete())
+
+
+def _reset_sequences(tables):
+    if db.session.get_bind().dialect.name != "postgresql":
+        return
+    for name in tables:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {name}), 1), "
+            f"(SELECT MAX(id) FROM {name}) IS NOT NULL)"
+        ))
+
+
+def _apply_deletions(deleted):
+    for name, model in reversed(RESTORE_ORDER):
+        row_ids = deleted.get(name)
+        if row_ids:
+            db.session.execute(model.__table__.delete().where(model.__table__.c.id.in_(row_ids)))
+
+
+def _restore(meta, records, chunk_size, progress, stats):
+    incremental = meta.get("kind") == "incremental"
+    tables = [name for name in meta.get("tables", LEGACY_REQUIRED) if name in RESTORE_TABLES]
+    if "sales" in tables and "sale_items" not in tables:
+        tables.append("sale_items")
+
+    inserter = _ChunkedInserter(chunk_size, stats, progress, upsert=incremental)
+    deleted = {}
+    if not incremental:
+        _wipe(tables)
+
+    for record in records:
+        name = record["table"]
+        row = record["row"]
+        if name == "deleted":
+            deleted.setdefault(row["table_name"], []).append(row["row_id"])
+            continue
+        if name not in tables:
+            continue
+        if name == "sales":
+            items = row.get("items") or []
+            inserter.add("sales", {key: value for key, value in row.items() if key != "items"})
+            for item in items:
+                inserter.add("sale_items", {**item, "sale_id": row["id"]})
+        else:
+            inserter.add(name, row)
+
+    inserter.flush()
+    _apply_deletions(deleted)
+    _reset_sequences(tables)
+
+
+def _read_meta(records):
+    records = iter(records)
+    meta = next(records, None)
+    if not meta or meta.get("table") != "meta":
+        raise ValueError("Неверный формат резервной копии")
+    return meta["row"], records
+
+
+def restore_backup(records, chunk_size=1000, progress=None):
+    """
+    Восстанавливает одну копию в одной транзакции (commit — за вызывающим).
+    Полная копия заменяет данные таблиц, инкрементальная — накатывается поверх.
+    records — итератор из iter_backup_file(). progress(table, rows_done) вызывается после каждой пачки.
+    """
+    return restore_chain([records], chunk_size=chunk_size, progress=progress)
+
+
+def restore_chain(sources, chunk_size=1000, progress=None):
+    """
+    Полная копия + цепочка инкрементальных (в любом порядке загрузки).
+    Инкременты сортируются по since и должны идти без разрывов по водяным знакам.
+    """
+    chain = [_read_meta(records) for records in sources]
+    fulls = [item for item in chain if item[0].get("kind") != "incremental"]
+    increments = sorted(
+        (item for item in chain if item[0].get("kind") == "incremental"),
+        key=lambda item: parse_watermark(item[0]["since"]),
+    )
+    if len(fulls) > 1:
+        raise ValueError("В цепочке может быть только одна полная копия")
+
+    previous_watermark = fulls[0][0].get("watermark") if fulls else None
+    for meta, _ in increments:
+        if previous_watermark and parse_watermark(meta["since"]) > parse_watermark(previous_watermark):
+            raise ValueError("Разрыв в цепочке инкрементальных копий")
+        previous_watermark = meta["watermark"]
+
+    stats = RestoreStats()
+    for meta, records in fulls + increments:
+        _restore(meta, records, chunk_size, progress, stats)
+    rebuild_stock()
+    # резервы в копию не входят: активные заказы резервируются заново по восстановленным партиям
+    rebuild_reservations()
+    refresh_slot_bookings()
+    refresh_sale_totals()
+    rebuild_sales_daily()
+    bump_catalog_version()
+    bump_catalog_epoch()
+
+    stats.elapsed = time.monotonic() - stats.started
+    return stats
+
+
+# -----------------------
+# Фоновые задачи (app/jobs.py)
+# -----------------------
+def export_backup_job(reporter, out_path, since=None):
+    records = iter_backup_records(since)
+
+    def _counted():
+        for count, record in enumerate(records, start=1):
+            reporter.progress = count
+            if count % 1000 == 0:
+                reporter.report(count, f"Выгружено записей: {count}")
+            yield record
+
+    with open(out_path, "wb") as out:
+        for chunk in iter_backup_gzip(_counted()):
+            out.write(chunk)
+
+    reporter.report(message=f"Резервная копия готова: {reporter.progress} записей", force=True)
+    return out_path
+
+
+def restore_backup_job(reporter, paths, chunk_size=1000):
+    files = [open(path, "rb") for path in paths]
+    try:
+        done = {}
+
+        def _progress(table, rows_done):
+            done[table] = rows_done
+            reporter.report(sum(done.values()), f"{table}: {rows_done} строк")
+
+        stats = restore_chain(
+            [iter_backup_file(f) for f in files],
+            chunk_size=chunk_size,
+            progress=_progress,
+        )
+        db.session.commit()
+    finally:
+        for f in files:
+            f.close()
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    reporter.report(
+        stats.total_rows,
+        f"Восстановлено {stats.total_rows} строк за {stats.elapsed:.1f} с ({stats.rows_per_second:.0f} строк/с)",
+        force=True,
+    )
+    return None
@@ -0,0 +1,113 @@
+"""
+Разбор отсканированных кодов на кассе.
+
+- обычный штрихкод / артикул -> products.barcode
+- короткий числовой код (до 5 цифр) -> products.plu
+- весовой/ценовой EAN-13 от весов: PP IIIII VVVVV C
+  (PP — префикс из BARCODE_WEIGHT_PREFIXES / BARCODE_PRICE_PREFIXES, IIIII — PLU,
+  VVVVV — граммы или копейки, C — контрольная цифра)
+
+Поиск товара — один запрос по уникальным индексам barcode / plu.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from flask import current_app
+
+from app import db
+from app.models import Product
+
+QTY_STEP = Decimal("0.001")
+
+
+@dataclass
+class ScanResult:
+    code: str
+    barcode: str = None
+    plu: str = None
+    weight: Decimal = None  # кг из весового кода
+    price: Decimal = None   # сумма из ценового кода
+
+    @property
+    def is_embedded(self):
+        return self.weight is not None or self.price is not None
+
+
+def normalize_plu(value):
+    value = (value or "").strip()
+    return str(int(value)) if value.isdigit() else None
+
+
+def ean_checksum_ok(code: str) -> bool:
+    """Контрольная цифра EAN-8/EAN-13/UPC-A (веса 3/1 справа налево)."""
+    if not code.isdigit() or len(code) not in (8, 12, 13):
+        return False
+    digits = [int(ch) for ch in code]
+    body, check = digits[:-1], digits[-1]
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(body)))
+    return (10 - total % 10) % 10 == check
+
+
+def parse_code(raw: str) -> ScanResult:
+    code = "".join((raw or "").split())
+    if not code:
+        raise ValueError("Пустой код")
+
+    result = ScanResult(code=code, barcode=code)
+
+    if code.isdigit() and len(code) <= 5:
+        result.plu = normalize_plu(code)
+        return result
+
+    if code.isdigit() and len(code) == 13 and ean_checksum_ok(code):
+        prefix, item, value = code[:2], code[2:7], int(code[7:12])
+        if prefix in current_app.config["BARCODE_WEIGHT_PREFIXES"]:
+            result.plu = normalize_plu(item)
+            result.weight = (Decimal(value) / 1000).quantize(QTY_STEP)
+        elif prefix in current_app.config["BARCODE_PRICE_PREFIXES"]:
+            result.plu = normalize_plu(item)
+            result.price = (Decimal(value) / 100).quantize(Decimal("0.01"))
+
+    elif code.isdigit() and len(code) == 12 and ean_checksum_ok(code):
+        result.barcode = "0" + code  # UPC-A хранится как EAN-13
+
+    return result
+
+
+def find_product(result: ScanResult):
+    """Точное совпадение штрихкода важнее PLU (магазинный код мог быть заведён как barcode)."""
+    criteria = [Product.barcode == result.barcode]
+    if result.barcode != result.code:
+        criteria.append(Product.barcode == result.code)
+    if result.plu:
+        criteria.append(Product.plu == result.plu)
+
+    candidates = db.session.execute(
+        db.select(Product).where(db.or_(*criteria)).limit(3)
+    ).scalars().all()
+    for product in candidates:
+        if product.barcode in (result.barcode, result.code):
+            result.weight = result.price = None  # это не весовой код, а обычный штрихкод
+            return product
+    return candidates[0] if candidates else None
+
+
+def scan_quantity(product, result: ScanResult, quantity=None) -> Decimal:
+    """
+    Количество для строки продажи: вес/цена из кода, иначе quantity (по умолчанию 1).
+    ValueError — код нельзя применить к товару (весовой код у штучного, ценовой без цены).
+    """
+    if result.weight is not None:
+        if not product.is_weight_based:
+            # иначе штучный товар ушёл бы в продажу как «0.347 шт»
+            raise ValueError(f"Весовой код для штучного товара «{product.name}» — проверьте PLU на весах")
+        return result.weight
+    if result.price is not None:
+        unit_price = Decimal(str(product.price))
+        if unit_price <= 0:
+            raise ValueError("У товара не задана цена — ценовой код не разобрать")
+        qty = result.price / unit_price
+        if product.is_weight_based:
+            return qty.quantize(QTY_STEP, rounding=ROUND_HALF_UP)
+        return max(Decimal("1"), qty.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    return Decimal(str(quantity)) if quantity is not None else Decimal("1")
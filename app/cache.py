@@ -0,0 +1,250 @@
+"""
+Кэш отрисованных страниц публичного каталога.
+
+Ключ включает версию каталога (counters.catalog_version): любое изменение товаров/категорий
+через админку поднимает версию, и старые записи просто перестают читаться (и вытесняются).
+Кэшируется только содержимое страницы — шапка с current_user и flash-сообщения рисуются на каждый запрос.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app import db
+from app.dbutil import dialect_insert
+from app.models import Counter
+
+CATALOG_VERSION = "catalog_version"
+CATALOG_EPOCH = "catalog_epoch"  # меняется только при полной замене данных (восстановление из копии)
+
+
+# -----------------------
+# Версия каталога
+# -----------------------
+def catalog_version() -> int:
+    value = db.session.execute(
+        db.select(Counter.value).where(Counter.name == CATALOG_VERSION)
+    ).scalar()
+    return value or 0
+
+
+def _bump(name):
+    stmt = dialect_insert(Counter).values(name=name, value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Counter.name],
+        set_={"value": Counter.value + 1},
+    )
+    db.session.execute(stmt)
+
+
+def bump_catalog_version():
+    """Вызывать до commit — версия поднимается в той же транзакции, что и само изменение."""
+    _bump(CATALOG_VERSION)
+
+
+def bump_catalog_epoch():
+    _bump(CATALOG_EPOCH)
+
+
+# -----------------------
+# Бэкенды
+# -----------------------
+class _Stats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def to_dict(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class NullCache:
+    name = "none"
+
+    def __init__(self):
+        self.stats = _Stats()
+
+    def get(self, version, key):
+        self.stats.miss()
+        return None
+
+    def set(self, version, key, value):
+        pass
+
+    def size(self):
+        return 0
+
+
+class LRUCache:
+    """Ограниченный кэш в памяти процесса (у каждого воркера свой)."""
+
+    name = "memory"
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.stats = _Stats()
+        self._data = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, version, key):
+        with self._lock:
+            value = self._data.get((version, key))
+            if value is not None:
+                self._data.move_to_end((version, key))
+        if value is None:
+            self.stats.miss()
+        else:
+            self.stats.hit()
+        return value
+
+    def set(self, version, key, value):
+        with self._lock:
+            if self._version is not None and version < self._version:
+                # запрос начался до правки каталога — его страница уже устарела
+                return
+            if version != self._version:
+                # записи старых версий больше никогда не прочитаются
+                self._data.clear()
+                self._version = version
+            self._data[(version, key)] = value
+            self._data.move_to_end((version, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def size(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Общий для всех воркеров кэш в файле SQLite (WAL, соединение на поток)."""
+
+    name = "sqlite"
+    PRUNE_EVERY = 100
+
+    def __init__(self, path, maxsize=1000):
+        self.path = path
+        self.maxsize = maxsize
+        self.stats = _Stats()
+        self._local = threading.local()
+        self._version = None
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS page_cache ("
+                " key TEXT PRIMARY KEY, version INTEGER NOT NULL,"
+                " value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, version, key):
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM page_cache WHERE key = ? AND version = ?", (key, version)
+            ).fetchone()
+        except sqlite3.Error:
+            row = None
+        if row is None:
+            self.stats.miss()
+            return None
+        self.stats.hit()
+        return json.loads(row[0])
+
+    def set(self, version, key, value):
+        if self._version is not None and version < self._version:
+            return  # запрос начался до правки каталога — его страница уже устарела
+        try:
+            conn = self._connect()
+            # другой воркер мог уже положить страницу новой версии — старой её не затираем
+            conn.execute(
+                "INSERT INTO page_cache (key, version, value, stored_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET version = excluded.version, value = excluded.value,"
+                " stored_at = excluded.stored_at WHERE excluded.version >= page_cache.version",
+                (key, version, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+            if self._version is None or version > self._version:
+                self._version = version
+                conn.execute("DELETE FROM page_cache WHERE version < ?", (version,))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM page_cache WHERE key NOT IN"
+                    " (SELECT key FROM page_cache ORDER BY stored_at DESC LIMIT ?)",
+                    (self.maxsize,),
+                )
+        except sqlite3.Error:
+            # кэш — не источник истины: при блокировке просто не сохраняем
+            current_app.logger.warning("page cache write failed", exc_info=True)
+
+    def size(self):
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM page_cache").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+def init_page_cache(app):
+    backend = app.config["PAGE_CACHE_BACKEND"]
+    if backend == "sqlite":
+        cache = SQLiteCache(app.config["PAGE_CACHE_PATH"], maxsize=app.config["PAGE_CACHE_SIZE"])
+    elif backend == "memory":
+        cache = LRUCache(maxsize=app.config["PAGE_CACHE_SIZE"])
+    else:
+        cache = NullCache()
+    app.extensions["page_cache"] = cache
+    return cache
+
+
+def page_cache():
+    return current_app.extensions["page_cache"]
+
+
+def cached_page(key, render):
+    """
+    render() -> dict, сериализуемый в JSON (напр. {"title": ..., "html": ...}).
+    Ключ дополняется текущей версией каталога.
+    """
+    cache = page_cache()
+    version = catalog_version()
+    value = cache.get(version, key)
+    if value is None:
+        value = render()
+        cache.set(version, key, value)
+    return value
+
+
+def cache_stats():
+    cache = page_cache()
+    return {
+        "backend": cache.name,
+        "version": catalog_version(),
+        "size": cache.size(),
+        **cache.stats.to_dict(),
+    }
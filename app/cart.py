@@ -0,0 +1,126 @@
+"""
+JSON-корзина кассы поверх черновика продажи (app/drafts.py, kind="sales").
+
+Каждый ответ содержит только изменённую строку, итог по корзине и остаток по затронутому товару —
+страница продажи обновляется на месте, без полной перерисовки.
+"""
+from decimal import Decimal
+
+from app import db
+from app.allocation import allocate
+from app.drafts import (
+    add_line, clear_lines, get_lines, line_rows, remove_line, set_quantity, totals,
+)
+from app.models import Sale, SaleItem
+from app.reports import record_sale
+from app.stock import available_map
+
+KIND = "sales"
+CENT = Decimal("0.01")
+
+
+def _fmt(value):
+    return f"{Decimal(str(value)).normalize():f}"
+
+
+def line_payload(row):
+    qty = Decimal(str(row.quantity))
+    price = Decimal(str(row.price))
+    return {
+        "id": row.id,
+        "product_id": row.product_id,
+        "name": row.name,
+        "qty": _fmt(qty),
+        "unit": "кг" if row.is_weight_based else "шт",
+        "price": str(price),
+        "line_total": str((qty * price).quantize(CENT)),
+    }
+
+
+def cart_state(product_id=None, line=None, removed_id=None):
+    total, count, in_cart = totals(KIND, product_id)
+    payload = {
+        "ok": True,
+        "total": str(total.quantize(CENT)),
+        "count": count,
+    }
+    if line is not None:
+        payload["line"] = line_payload(line)
+    if removed_id is not None:
+        payload["removed_id"] = removed_id
+    if product_id is not None:
+        available = available_map([product_id]).get(product_id, Decimal("0"))
+        payload["stock"] = {
+            "product_id": product_id,
+            "available": _fmt(available),
+            "in_cart": _fmt(in_cart),
+            "remaining": _fmt(available - in_cart),
+        }
+    return payload
+
+
+def add(product_id, qty):
+    add_line(KIND, product_id, qty)
+    rows = line_rows(KIND, product_id=product_id)
+    return cart_state(product_id, line=rows[0] if rows else None)
+
+
+def update(line_id, qty):
+    if not set_quantity(KIND, line_id, qty):
+        return None
+    row = line_rows(KIND, line_id=line_id)[0]
+    return cart_state(row.product_id, line=row)
+
+
+def remove(line_id):
+    rows = line_rows(KIND, line_id=line_id)
+    if not rows or not remove_line(KIND, line_id):
+        return None
+    return cart_state(rows[0].product_id, removed_id=line_id)
+
+
+def quote():
+    rows = line_rows(KIND)
+    available = available_map({row.product_id for row in rows}) if rows else {}
+    payload = cart_state()
+    payload["lines"] = [line_payload(row) for row in rows]
+    payload["available"] = {str(pid): _fmt(qty) for pid, qty in available.items()}
+    return payload
+
+
+def confirm_sale():
+    """
+    Списывает черновик по FEFO и создаёт Sale (без commit).
+    InsufficientStock — не хватает остатка; ValueError — черновик пуст.
+    """
+    lines = get_lines(KIND)
+    if not lines:
+        raise ValueError("Список продажи пуст")
+
+    allocated = allocate([(line["product_id"], line["qty"]) for line in lines])
+
+    sale = Sale(total_amount=Decimal("0.00"), item_count=0)
+    db.session.add(sale)
+
+    for line in allocated:
+        unit_price = Decimal(str(line.product.price))
+        line_total = (unit_price * line.quantity).quantize(CENT)
+        sale.total_amount += line_total
+        sale.item_count += 1
+
+        db.session.add(SaleItem(
+            sale=sale,
+            product_id=line.product.id,
+            quantity=line.quantity,
+            unit_price=unit_price,
+            line_total=line_total,
+            source_produced_at=line.source_produced_at
+        ))
+
+    if not sale.items:
+        raise ValueError("Не удалось сформировать продажу")
+
+    db.session.flush()
+    record_sale(sale)
+    clear_lines(KIND)
+    return sale
@@ -0,0 +1,25 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Category, Product, Batch, DeletedRow
+
+# Таблицы, удаления из которых попадают в инкрементальные копии
+TRACKED_MODELS = (Category, Product, Batch)
+
+
+def record_deleted(table_name, row_ids):
+    """Для массовых DELETE в обход ORM: оставить tombstone'ы в текущей транзакции."""
+    row_ids = list(row_ids)
+    if row_ids:
+        db.session.execute(
+            DeletedRow.__table__.insert(),
+            [{"table_name": table_name, "row_id": row_id} for row_id in row_ids],
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def _track_orm_deletes(session, flush_context, instances):
+    for obj in list(session.deleted):
+        if isinstance(obj, TRACKED_MODELS) and obj.id is not None:
+            session.add(DeletedRow(table_name=obj.__tablename__, row_id=obj.id))
@@ -0,0 +1,162 @@
+import os
+from datetime import date
+
+import click
+
+from app import db
+
+
+@click.command("stock-reconcile")
+@click.option("--dry-run", is_flag=True, help="Только показать расхождения, не исправлять.")
+def stock_reconcile_command(dry_run):
+    """Пересобирает счётчики остатков из таблицы batches."""
+    from app.stock import reconcile_stock
+
+    drift = reconcile_stock(fix=not dry_run)
+    for product_id, expires_at, (was, was_reserved), (should_be, should_reserve) in drift:
+        click.echo(
+            f"product={product_id} exp={expires_at.isoformat()}: "
+            f"{was} (резерв {was_reserved}) -> {should_be} (резерв {should_reserve})"
+        )
+
+    if not drift:
+        click.echo("Расхождений нет")
+    elif dry_run:
+        db.session.rollback()
+        click.echo(f"Расхождений: {len(drift)} (не исправлено)")
+    else:
+        click.echo(f"Исправлено расхождений: {len(drift)}")
+
+
+@click.command("backup-export")
+@click.argument("out_path")
+@click.option("--since", default=None, help="Водяной знак предыдущей копии (ISO); без него — полная копия.")
+@click.option("--state", "state_path", default=None,
+              help="Файл с водяным знаком: читается как --since и перезаписывается после выгрузки.")
+def backup_export_command(out_path, since, state_path):
+    """Выгружает резервную копию (gzip NDJSON) в файл; удобно для ночного cron."""
+    from app.backup import iter_backup_records, iter_backup_gzip, parse_watermark
+
+    if not since and state_path and os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            since = f.read().strip() or None
+
+    records = iter_backup_records(parse_watermark(since) if since else None)
+    meta = next(records)
+
+    def _all_records():
+        yield meta
+        yield from records
+
+    with open(out_path, "wb") as out:
+        for chunk in iter_backup_gzip(_all_records()):
+            out.write(chunk)
+
+    watermark = meta["row"]["watermark"]
+    if state_path:
+        with open(state_path, "w", encoding="utf-8") as f:
+            f.write(watermark)
+    click.echo(f"{meta['row']['kind']}: {out_path}, водяной знак {watermark}")
+
+
+@click.command("images-rebuild")
+@click.option("--missing-only", is_flag=True, help="Только для картинок без вариантов.")
+def images_rebuild_command(missing_only):
+    """Пересобирает WebP-варианты картинок товаров и категорий."""
+    from app.models import Product, Category
+    from app.uploads import make_variants
+    from app.cache import bump_catalog_version
+
+    for model in (Category, Product):
+        query = model.query.filter(model.image_url.isnot(None))
+        if missing_only:
+            query = query.filter(model.image_variants.is_(None))
+        for obj in query.all():
+            obj.image_variants = make_variants(obj.image_url) or None
+            click.echo(f"{model.__tablename__} #{obj.id}: {len(obj.image_variants or {})} вариантов")
+        bump_catalog_version()
+        db.session.commit()
+
+
+@click.command("uploads-gc")
+@click.option("--dry-run", is_flag=True, help="Только показать, что будет удалено.")
+@click.option("--min-age", default=60, show_default=True, help="Не трогать файлы моложе N минут.")
+def uploads_gc_command(dry_run, min_age):
+    """Удаляет загруженные картинки, на которые не ссылаются товары и категории."""
+    from app.uploads import collect_garbage
+
+    removed = collect_garbage(dry_run=dry_run, min_age_seconds=min_age * 60)
+    for url in removed:
+        click.echo(url)
+    click.echo(f"{'Будет удалено' if dry_run else 'Удалено'} файлов: {len(removed)}")
+
+
+@click.command("search-reindex")
+def search_reindex_command():
+    """Создаёт недостающий поисковый индекс товаров и перестраивает его (SQLite FTS5 / Postgres tsvector + pg_trgm)."""
+    from app.search import reindex
+
+    dialect = reindex()
+    click.echo(f"Поисковый индекс перестроен ({dialect})")
+
+
+@click.command("sales-rollup")
+@click.option("--since", default=None, help="Пересобрать начиная с даты (YYYY-MM-DD); без неё — все дни.")
+def sales_rollup_command(since):
+    """Пересобирает дневные итоги продаж (sales_daily) из sale_items."""
+    from app.reports import rebuild_sales_daily
+
+    rows = rebuild_sales_daily(date.fromisoformat(since) if since else None)
+    db.session.commit()
+    click.echo(f"sales_daily: {rows} строк" + (f" с {since}" if since else ""))
+
+
+@click.command("reservations-rebuild")
+def reservations_rebuild_command():
+    """Заново резервирует остатки под все активные предзаказы (по порядку оформления)."""
+    from app.reservations import rebuild_reservations
+
+    failed = rebuild_reservations()
+    db.session.commit()
+    if failed:
+        click.echo("Не хватило остатка заказам: " + ", ".join(f"#{order_id}" for order_id in failed))
+    else:
+        click.echo("Все активные заказы зарезервированы")
+
+
+@click.command("users-phones")
+@click.option("--dry-run", is_flag=True, help="Только показать, ничего не менять.")
+def users_phones_command(dry_run):
+    """Пользователи без phone_normalized: проставляет номер, если он уже свободен, остальных выводит."""
+    from app.models import User
+    from app.routes import normalize_phone
+
+    users = User.query.filter(User.phone_normalized.is_(None)).order_by(User.id.asc()).all()
+    fixed = 0
+    for user in users:
+        phone = normalize_phone(user.phone)
+        if phone is None:
+            click.echo(f"#{user.id} {user.username}: телефон «{user.phone}» не распознан")
+        elif User.query.filter_by(phone_normalized=phone).first():
+            click.echo(f"#{user.id} {user.username}: {phone} занят другим пользователем")
+        else:
+            user.phone_normalized = phone
+            db.session.flush()  # следующий дубль того же номера увидит занятый
+            fixed += 1
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    click.echo(f"Без нормализованного телефона: {len(users)}, {'можно исправить' if dry_run else 'исправлено'}: {fixed}")
+
+
+def register_commands(app):
+    app.cli.add_command(stock_reconcile_command)
+    app.cli.add_command(backup_export_command)
+    app.cli.add_command(images_rebuild_command)
+    app.cli.add_command(uploads_gc_command)
+    app.cli.add_command(search_reindex_command)
+    app.cli.add_command(sales_rollup_command)
+    app.cli.add_command(reservations_rebuild_command)
+    app.cli.add_command(users_phones_command)
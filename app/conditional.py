@@ -0,0 +1,146 @@
+"""
+Условные GET (ETag / Last-Modified) для каталога и JSON-эндпоинтов.
+
+Валидаторы считаются одним лёгким запросом по updated_at строк — до любой отрисовки шаблона,
+поэтому повторный визит с If-None-Match / If-Modified-Since получает 304 без рендера.
+
+Last-Modified отдаётся только там, где он покрывает всё, от чего зависит ответ. HTML каталога
+зависит ещё от зрителя, версии каталога, шаблонов и удалённых строк — там только ETag,
+иначе клиент с одним If-Modified-Since получил бы устаревший 304.
+"""
+import hashlib
+import os
+from datetime import timezone
+from functools import lru_cache
+
+from flask import abort, current_app, request, session
+from flask_login import current_user
+
+from app import db
+from app.cache import catalog_version
+from app.dbutil import db_timezone
+from app.models import Category, Product
+
+
+@lru_cache(maxsize=1)
+def _templates_stamp() -> str:
+    # после деплоя с новыми шаблонами старые ETag не должны совпасть
+    newest = 0.0
+    for root, _dirs, files in os.walk(current_app.jinja_loader.searchpath[0]):
+        for name in files:
+            newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return str(int(newest))
+
+
+def _viewer() -> str:
+    # шапка страницы зависит только от этого
+    if not current_user.is_authenticated:
+        return "anon"
+    return "admin" if current_user.is_admin else "user"
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    zone = db_timezone()  # наивное updated_at — по часам БД
+    if zone is None:
+        value = value.astimezone()  # наивное -> местное время процесса
+    else:
+        value = value.replace(tzinfo=zone)
+    return value.replace(microsecond=0).astimezone(timezone.utc)
+
+
+def make_etag(*parts) -> str:
+    return hashlib.blake2b("|".join(str(p) for p in parts).encode(), digest_size=16).hexdigest()
+
+
+# -----------------------
+# Валидаторы
+# -----------------------
+def _rows_stamp(model, *criteria):
+    last_modified, count = db.session.execute(
+        db.select(db.func.max(model.updated_at), db.func.count(model.id)).where(*criteria)
+    ).one()
+    return last_modified, count
+
+
+def catalog_validators(page, obj_id=None):
+    """
+    page: products | category | product. Возвращает (etag, None) — без Last-Modified, см. выше —
+    или None, если объекта нет (маршрут сам ответит 404).
+    """
+    if page == "products":
+        last_modified, count = _rows_stamp(Category)
+        parts = [count]
+    elif page == "category":
+        category_stamp = db.session.execute(
+            db.select(Category.updated_at).where(Category.id == obj_id)
+        ).scalar()
+        if category_stamp is None:
+            return None
+        products_stamp, count = _rows_stamp(Product, Product.category_id == obj_id)
+        last_modified = max(filter(None, (category_stamp, products_stamp)))
+        parts = [count]
+    elif page == "product":
+        last_modified = db.session.execute(
+            db.select(Product.updated_at).where(Product.id == obj_id)
+        ).scalar()
+        if last_modified is None:
+            return None
+        parts = []
+    else:
+        raise ValueError(page)
+
+    etag = make_etag(
+        page, obj_id, catalog_version(), last_modified.isoformat() if last_modified else "-",
+        *parts, _viewer(), _templates_stamp(),
+    )
+    return etag, None
+
+
+def products_meta_validators(product_ids):
+    last_modified, count = _rows_stamp(Product, Product.id.in_(product_ids))
+    etag = make_etag("products-meta", ",".join(map(str, product_ids)),
+                     last_modified.isoformat() if last_modified else "-", count)
+    # ответ зависит только от строк товаров из URL; если какой-то удалён, max(updated_at) этого не покажет
+    return etag, _as_utc(last_modified) if count == len(product_ids) else None
+
+
+# -----------------------
+# Ответы
+# -----------------------
+def is_not_modified(etag, last_modified) -> bool:
+    if "_flashes" in session:
+        return False  # страница должна показать flash-сообщение
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)  # If-Modified-Since при этом не смотрим (RFC 9110)
+    if last_modified and request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def not_modified_response(etag, last_modified, private=True):
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag, last_modified, private)
+
+
+def with_validators(response, etag, last_modified, private=True):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # браузер и прокси обязаны переспрашивать сервер, но могут переиспользовать тело по 304
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    return response
+
+
+def conditional_response(validators, build, private=True):
+    """validators — (etag, last_modified) или None (-> 404); build() вызывается только без 304."""
+    if validators is None:
+        abort(404)
+    etag, last_modified = validators
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified, private)
+    response = current_app.make_response(build())
+    return with_validators(response, etag, last_modified, private)
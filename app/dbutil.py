@@ -0,0 +1,51 @@
+from datetime import timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+
+
+def dialect_insert(model):
+    """INSERT с поддержкой on_conflict_do_update для текущего бэкенда (Postgres/SQLite)."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+
+def datetime_param(value, inclusive_end=False):
+    """
+    Граница диапазона по DateTime-колонке, сравнимая напрямую с колонкой (индекс работает).
+    SQLite хранит DateTime текстом: server_default пишет 'YYYY-MM-DD HH:MM:SS', ORM — с '.ffffff'.
+    Нижняя граница без долей секунды не больше обоих видов, inclusive_end (<=) — с долями, не меньше обоих.
+    """
+    if db.session.get_bind().dialect.name != "sqlite":
+        return value
+    fmt = "%Y-%m-%d %H:%M:%S.%f" if inclusive_end or value.microsecond else "%Y-%m-%d %H:%M:%S"
+    return db.literal(value.strftime(fmt), db.String)
+
+
+@lru_cache(maxsize=4)
+def _db_timezone(url):
+    # наивное now() базы: Postgres пишет его в поясе сессии, SQLite (CURRENT_TIMESTAMP) — в UTC
+    if db.engine.dialect.name == "sqlite":
+        return timezone.utc
+    try:
+        return ZoneInfo(db.session.execute(db.text("SELECT current_setting('TimeZone')")).scalar())
+    except (ZoneInfoNotFoundError, ValueError):
+        return None  # пояс в POSIX-записи — считаем, что он совпадает с поясом сервера приложения
+
+
+def db_timezone():
+    """Пояс наивных *_at и now() текущей БД; None — пояс процесса приложения."""
+    return _db_timezone(str(db.engine.url))
+
+
+def to_db_time(value):
+    """Время с поясом -> наивное время по часам БД (как в колонках *_at); наивное не меняется."""
+    if value is None or value.tzinfo is None:
+        return value
+    zone = db_timezone()
+    return (value.astimezone(zone) if zone else value.astimezone()).replace(tzinfo=None)
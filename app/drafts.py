@@ -0,0 +1,121 @@
+import re
+from decimal import Decimal
+
+from flask import session
+from flask_login import current_user
+
+from app import db
+from app.dbutil import dialect_insert
+from app.models import DraftLine, Product
+
+DEFAULT_TERMINAL = "main"
+
+
+def current_terminal():
+    return session.get("terminal") or DEFAULT_TERMINAL
+
+
+def set_terminal(name):
+    name = re.sub(r"[^\w-]", "", (name or "").strip())[:32] or DEFAULT_TERMINAL
+    session["terminal"] = name
+    return name
+
+
+def _scope(kind):
+    return (
+        DraftLine.user_id == current_user.id,
+        DraftLine.terminal == current_terminal(),
+        DraftLine.kind == kind,
+    )
+
+
+def _line_key(product_id, produced_at):
+    return f"{int(product_id)}:{produced_at.isoformat() if produced_at else ''}"
+
+
+def get_lines(kind):
+    """
+    Черновик текущего пользователя/терминала.
+    list[dict]: {id, product_id:int, qty:str, produced_at:str|None}
+    """
+    rows = DraftLine.query.filter(*_scope(kind)).order_by(DraftLine.id.asc()).all()
+    return [
+        {
+            "id": row.id,
+            "product_id": row.product_id,
+            "qty": f"{Decimal(str(row.quantity)).normalize():f}",
+            "produced_at": row.produced_at.isoformat() if row.produced_at else None,
+        }
+        for row in rows
+    ]
+
+
+def add_line(kind, product_id, qty, produced_at=None):
+    """Добавляет количество к позиции (товар + дата изготовления) одним upsert'ом."""
+    stmt = dialect_insert(DraftLine).values(
+        user_id=current_user.id,
+        terminal=current_terminal(),
+        kind=kind,
+        line_key=_line_key(product_id, produced_at),
+        product_id=int(product_id),
+        quantity=Decimal(str(qty)),
+        produced_at=produced_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DraftLine.user_id, DraftLine.terminal, DraftLine.kind, DraftLine.line_key],
+        set_={"quantity": DraftLine.quantity + stmt.excluded.quantity},
+    )
+    db.session.execute(stmt)
+
+
+def set_quantity(kind, line_id, qty):
+    result = db.session.execute(
+        db.update(DraftLine)
+        .where(DraftLine.id == line_id, *_scope(kind))
+        .values(quantity=Decimal(str(qty)))
+    )
+    return result.rowcount > 0
+
+
+def line_rows(kind, line_id=None, product_id=None, produced_at=None):
+    """Строки черновика вместе с названием/ценой товара — один запрос с JOIN."""
+    criteria = list(_scope(kind))
+    if line_id is not None:
+        criteria.append(DraftLine.id == line_id)
+    if product_id is not None:
+        criteria.append(DraftLine.line_key == _line_key(product_id, produced_at))
+    return db.session.execute(
+        db.select(
+            DraftLine.id, DraftLine.product_id, DraftLine.quantity,
+            Product.name, Product.price, Product.is_weight_based,
+        )
+        .join(Product, Product.id == DraftLine.product_id)
+        .where(*criteria)
+        .order_by(DraftLine.id.asc())
+    ).all()
+
+
+def totals(kind, product_id=None):
+    """(сумма по ценам товаров, число позиций, количество товара product_id в черновике)."""
+    in_cart = db.func.sum(db.case((DraftLine.product_id == product_id, DraftLine.quantity), else_=0))
+    total, count, product_qty = db.session.execute(
+        db.select(
+            db.func.coalesce(db.func.sum(DraftLine.quantity * Product.price), 0),
+            db.func.count(DraftLine.id),
+            db.func.coalesce(in_cart, 0),
+        )
+        .join(Product, Product.id == DraftLine.product_id)
+        .where(*_scope(kind))
+    ).one()
+    return Decimal(str(total)), count, Decimal(str(product_qty))
+
+
+def remove_line(kind, line_id):
+    result = db.session.execute(
+        db.delete(DraftLine).where(DraftLine.id == line_id, *_scope(kind))
+    )
+    return result.rowcount > 0
+
+
+def clear_lines(kind):
+    db.session.execute(db.delete(DraftLine).where(*_scope(kind)))
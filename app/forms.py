@@ -6,7 +6,7 @@ from wtforms import (
     StringField, PasswordField, SubmitField, TextAreaField,
     DecimalField, IntegerField, SelectField, FileField, BooleanField, DateField
 )
-from wtforms.validators import DataRequired, EqualTo, Length, Optional, NumberRange
+from wtforms.validators import DataRequired, EqualTo, Length, Optional, NumberRange, Regexp
 
 
 class RegistrationForm(FlaskForm):
@@ -40,6 +40,12 @@ class ProductForm(FlaskForm):
 
     category_id = SelectField("Категория", coerce=int, validators=[Optional()])
 
+    barcode = StringField("Штрихкод / артикул", validators=[Optional(), Length(max=32)])
+    plu = StringField("PLU (код на весах)", validators=[
+        Optional(),
+        Regexp(r"^\d{1,5}$", message="PLU — от 1 до 5 цифр")
+    ])
+
     # ✅ новое поле под твою модель
     shelf_life_days = IntegerField(
         "Срок годности (дней)",
@@ -0,0 +1,237 @@
+"""
+Пакетная выгрузка продаж с кассы, работавшей офлайн.
+
+Каждая продажа несёт ключ идемпотентности (генерирует касса) и время продажи.
+Весь пакет проводится одной транзакцией:
+  1. заголовки продаж вставляются одним INSERT ... ON CONFLICT (client_key) DO NOTHING —
+     повтор того же пакета (или параллельная выгрузка) не создаёт дублей;
+  2. партии всех товаров пакета блокируются один раз, списание по FEFO
+     (produced_at, id) идёт в хронологическом порядке продаж;
+  3. продажа, которой не хватило остатка, отклоняется целиком — остальные проводятся.
+Результат — по строке на каждую продажу: created / duplicate / rejected.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from app import db
+from app.allocation import FefoAllocator, InsufficientStock
+from app.barcodes import find_product, parse_code, scan_quantity
+from app.dbutil import datetime_param, dialect_insert
+from app.models import Product, Sale, SaleItem
+from app.reports import record_sales
+
+MAX_SALES = 500
+MAX_LINES = 200
+CLOCK_SKEW = timedelta(minutes=5)
+CENT = Decimal("0.01")
+KEY_RE = re.compile(r"^[A-Za-z0-9._:-]{8,64}$")
+
+CREATED = "created"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+
+
+@dataclass
+class IncomingSale:
+    key: str
+    sold_at: datetime = None
+    lines: list = field(default_factory=list)  # [(product_id, qty: Decimal)]
+    result: dict = None
+
+    def reject(self, message, **extra):
+        self.result = {"key": self.key, "status": REJECTED, "error": message, **extra}
+
+
+def _parse_sold_at(raw):
+    try:
+        value = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        raise ValueError("Некорректное время продажи")
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)  # в БД — локальное время без зоны
+    if value > datetime.now() + CLOCK_SKEW:
+        raise ValueError("Время продажи в будущем")
+    return value.replace(microsecond=0)
+
+
+def _parse_qty(raw):
+    try:
+        qty = Decimal(str(raw))
+    except (InvalidOperation, ValueError):
+        raise ValueError("Некорректное количество")
+    if not qty.is_finite() or qty <= 0:
+        raise ValueError("Количество должно быть больше 0")
+    return qty
+
+
+def _parse_line(item, products, scans):
+    if not isinstance(item, dict):
+        raise ValueError("Некорректная позиция")
+
+    code = item.get("code")
+    if code:
+        # один и тот же код в пакете разбирается один раз
+        if code not in scans:
+            scan = parse_code(code)
+            scans[code] = (scan, find_product(scan))
+        scan, product = scans[code]
+        if product is None:
+            raise ValueError(f"Товар с кодом {code} не найден")
+        products[product.id] = product
+        qty = item.get("qty")
+        return product.id, scan_quantity(product, scan, _parse_qty(qty) if qty is not None else None)
+
+    try:
+        product_id = int(item.get("product_id"))
+    except (TypeError, ValueError):
+        raise ValueError("Не указан товар")
+    return product_id, _parse_qty(item.get("qty", 1))
+
+
+def parse_sales(payload):
+    """
+    payload: {"sales": [{"key": "...", "sold_at": "ISO-8601",
+                         "items": [{"product_id": 1, "qty": "0.5"} | {"code": "2000123005002"}]}]}
+    ValueError — некорректен весь пакет; ошибки отдельных продаж — в IncomingSale.result.
+    """
+    sales = payload.get("sales") if isinstance(payload, dict) else None
+    if not isinstance(sales, list) or not sales:
+        raise ValueError("Пустой пакет продаж")
+    if len(sales) > MAX_SALES:
+        raise ValueError(f"Не больше {MAX_SALES} продаж за один запрос")
+
+    products, scans = {}, {}
+    parsed, seen = [], set()
+
+    for raw in sales:
+        raw = raw if isinstance(raw, dict) else {}
+        key = str(raw.get("key") or "").strip()
+        sale = IncomingSale(key=key)
+        parsed.append(sale)
+
+        if not KEY_RE.match(key):
+            sale.reject("Некорректный ключ продажи")
+            continue
+        if key in seen:
+            sale.result = {"key": key, "status": DUPLICATE}
+            continue
+        seen.add(key)
+
+        items = raw.get("items")
+        if not isinstance(items, list) or not items:
+            sale.reject("Продажа без позиций")
+            continue
+        if len(items) > MAX_LINES:
+            sale.reject(f"Не больше {MAX_LINES} позиций в продаже")
+            continue
+
+        try:
+            sale.sold_at = _parse_sold_at(raw.get("sold_at"))
+            sale.lines = [_parse_line(item, products, scans) for item in items]
+        except ValueError as e:
+            sale.reject(str(e))
+
+    # товары по product_id — одним запросом
+    missing = {pid for s in parsed if s.result is None for pid, _ in s.lines} - products.keys()
+    if missing:
+        products.update({p.id: p for p in Product.query.filter(Product.id.in_(missing)).all()})
+    for sale in parsed:
+        if sale.result is None:
+            unknown = next((pid for pid, _ in sale.lines if pid not in products), None)
+            if unknown is not None:
+                sale.reject(f"Товар #{unknown} не найден", product_id=unknown)
+
+    return parsed, products
+
+
+def _insert_headers(sales):
+    """Вставляет заголовки продаж; возвращает {key: id} только для реально созданных."""
+    stmt = (
+        dialect_insert(Sale)
+        .values([{"client_key": s.key, "created_at": datetime_param(s.sold_at)} for s in sales])
+        .on_conflict_do_nothing(index_elements=[Sale.client_key])
+        .returning(Sale.client_key, Sale.id)
+    )
+    return dict(db.session.execute(stmt).all())
+
+
+def ingest_sales(payload):
+    """
+    Проводит пакет продаж в текущей транзакции (commit — за вызывающим).
+    Возвращает список результатов в порядке продаж в запросе.
+    """
+    parsed, products = parse_sales(payload)
+    pending = sorted((s for s in parsed if s.result is None), key=lambda s: (s.sold_at, s.key))
+
+    if pending:
+        existing = dict(db.session.execute(
+            db.select(Sale.client_key, Sale.id).where(Sale.client_key.in_([s.key for s in pending]))
+        ).all())
+        for sale in pending:
+            if sale.key in existing:
+                sale.result = {"key": sale.key, "status": DUPLICATE, "sale_id": existing[sale.key]}
+        pending = [s for s in pending if s.result is None]
+
+    if pending:
+        created = _insert_headers(pending)
+        # не вставилось — тот же ключ только что провела параллельная выгрузка
+        for sale in pending:
+            if sale.key not in created:
+                sale.result = {"key": sale.key, "status": DUPLICATE}
+        pending = [s for s in pending if s.result is None]
+
+        allocator = FefoAllocator(
+            {pid for s in pending for pid, _ in s.lines},
+            today=min((s.sold_at.date() for s in pending), default=None),
+            products=products,
+            skip_locked=False,  # пакет не отклоняет продажи из-за партии, занятой кассой, — ждёт её
+        )
+        item_rows, header_rows, rejected_ids, rollup = [], [], [], []
+
+        for sale in pending:
+            sale_id = created[sale.key]
+            try:
+                allocated = allocator.take(sale.lines, on_date=sale.sold_at.date())
+            except InsufficientStock as e:
+                rejected_ids.append(sale_id)
+                sale.reject(str(e), product_id=e.product.id)
+                continue
+
+            total = Decimal("0.00")
+            for line in allocated:
+                unit_price = Decimal(str(line.product.price))
+                line_total = (unit_price * line.quantity).quantize(CENT)
+                total += line_total
+                rollup.append((sale.sold_at.date(), sale_id, line.product.id, line.quantity, line_total))
+                item_rows.append({
+                    "sale_id": sale_id,
+                    "product_id": line.product.id,
+                    "quantity": line.quantity,
+                    "unit_price": unit_price,
+                    "line_total": line_total,
+                    "source_produced_at": line.source_produced_at,
+                })
+            header_rows.append({"id": sale_id, "total_amount": total, "item_count": len(allocated)})
+            sale.result = {"key": sale.key, "status": CREATED, "sale_id": sale_id, "total": str(total)}
+
+        if rejected_ids:
+            # заголовки ещё не закоммичены — ключ освобождается для повторной выгрузки
+            db.session.execute(
+                db.delete(Sale).where(Sale.id.in_(rejected_ids)).execution_options(synchronize_session=False)
+            )
+        if item_rows:
+            db.session.execute(db.insert(SaleItem), item_rows)
+            db.session.execute(db.update(Sale), header_rows)  # итоги — пакетный UPDATE по id
+        allocator.apply()
+        record_sales(rollup)
+
+    return [sale.result for sale in parsed]
+
+
+def summarize(results):
+    counts = {CREATED: 0, DUPLICATE: 0, REJECTED: 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return counts
@@ -0,0 +1,101 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Job
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config["JOB_WORKERS"],
+                thread_name_prefix="farmer-jobs",
+            )
+    return _executor
+
+
+def _update_job(job_id, lock_timeout_ms=None, **values):
+    # Отдельное соединение: статус виден сразу, даже пока задача держит свою транзакцию
+    with db.engine.begin() as conn:
+        if lock_timeout_ms and conn.dialect.name == "postgresql":
+            conn.exec_driver_sql(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+        conn.execute(db.update(Job).where(Job.id == job_id).values(**values))
+
+
+class JobReporter:
+    """Передаётся в функцию задачи: report() пишет прогресс в jobs не чаще раза в interval секунд."""
+
+    def __init__(self, job_id, interval=1.0):
+        self.job_id = job_id
+        self.interval = interval
+        self.progress = 0
+        self.message = None
+        self._last_write = 0.0
+        # SQLite держит один писатель на всю БД: промежуточный прогресс ждал бы конца
+        # транзакции задачи, поэтому там пишем только итог
+        self.live = db.engine.dialect.name != "sqlite"
+
+    def report(self, progress=None, message=None, force=False):
+        if progress is not None:
+            self.progress = int(progress)
+        if message is not None:
+            self.message = message
+
+        now = time.monotonic()
+        if not force and (not self.live or now - self._last_write < self.interval):
+            return
+        self._last_write = now
+        try:
+            # строку задачи может держать транзакция самой задачи (восстановление из копии
+            # обнуляет jobs.user_id при удалении пользователей) — не ждём её, иначе задача ждёт сама себя
+            _update_job(self.job_id, lock_timeout_ms=200, progress=self.progress, message=self.message)
+        except OperationalError:
+            # SQLite блокирует запись на время транзакции задачи — прогресс не критичен
+            pass
+
+
+def _run(app, job_id, func, args, kwargs):
+    with app.app_context():
+        _update_job(job_id, status="running", started_at=datetime.utcnow())
+        reporter = JobReporter(job_id)
+        try:
+            result_path = func(reporter, *args, **kwargs)
+        except Exception as e:
+            app.logger.exception("Job %s failed", job_id)
+            db.session.remove()  # откат и освобождение соединения до записи статуса
+            _update_job(job_id, status="failed", error=str(e) or e.__class__.__name__, finished_at=datetime.utcnow())
+            return
+
+        db.session.remove()
+        _update_job(
+            job_id,
+            status="done",
+            progress=reporter.progress,
+            message=reporter.message,
+            result_path=result_path,
+            finished_at=datetime.utcnow(),
+        )
+
+
+def enqueue(kind, func, *args, user_id=None, **kwargs):
+    """
+    Создаёт запись в jobs и запускает func(reporter, *args, **kwargs) в пуле потоков.
+    func может вернуть путь к файлу-результату (для скачивания).
+    """
+    job = Job(kind=kind, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    _get_executor(app).submit(_run, app, job.id, func, args, kwargs)
+    return job
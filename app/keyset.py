@@ -0,0 +1,50 @@
+"""
+Keyset-пагинация по (время, id): страница N стоит столько же, сколько первая —
+без OFFSET, который перебирает и выбрасывает все предыдущие строки.
+
+Курсор — строка "<iso-время>~<id>" последней строки страницы, передаётся в ?after=.
+"""
+from datetime import datetime
+
+from app import db
+from app.dbutil import datetime_param
+
+SEP = "~"
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    return f"{ts.isoformat()}{SEP}{row_id}"
+
+
+def decode_cursor(raw):
+    """None для пустого или испорченного курсора (тогда — первая страница)."""
+    ts_raw, sep, id_raw = (raw or "").strip().rpartition(SEP)
+    if not sep or not id_raw.isdigit():
+        return None
+    try:
+        return datetime.fromisoformat(ts_raw), int(id_raw)
+    except ValueError:
+        return None
+
+
+def seek_before(ts_column, id_column, cursor):
+    """Условие "строго раньше курсора" для ORDER BY ts DESC, id DESC — диапазоны по индексу ts."""
+    ts, row_id = cursor
+    return db.or_(
+        ts_column < datetime_param(ts),
+        db.and_(ts_column <= datetime_param(ts, inclusive_end=True), id_column < row_id),
+    )
+
+
+def fetch_page(query, ts_column, id_column, cursor, per_page, key):
+    """
+    query — уже отфильтрованный запрос; добавляет seek, порядок и LIMIT per_page + 1.
+    key(row) -> (ts, id) строки. Возвращает (rows, next_cursor | None).
+    """
+    if cursor is not None:
+        query = query.filter(seek_before(ts_column, id_column, cursor))
+    rows = query.order_by(ts_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, encode_cursor(*key(rows[-1]))
@@ -0,0 +1,122 @@
+"""
+Снимок показателей главной страницы админки.
+
+Все счётчики — один агрегирующий запрос (скалярные подзапросы), последние продажи — второй,
+без обращения к sale_items: сумма и число позиций хранятся в самой продаже.
+Снимок живёт в памяти процесса до SNAPSHOT_TTL секунд и сбрасывается раньше, если изменился
+отпечаток данных: последняя продажа, последнее списание, партии (поставка, правка, удаление).
+Отпечаток — один запрос по индексам, без записей в общий счётчик (кассы не ждут друг друга).
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+
+from flask import current_app
+
+from app import db
+from app.models import Batch, Sale, SalesDaily, WriteOff
+from app.reports import created_between
+
+SNAPSHOT_TTL = 60.0
+RECENT_SALES = 7
+EXPIRING_DAYS = 3
+
+
+@dataclass
+class DashboardMetrics:
+    today_sales: int = 0
+    today_revenue: Decimal = Decimal("0.00")
+    month_sales: int = 0
+    month_revenue: Decimal = Decimal("0.00")
+    expired_batches: int = 0
+    expiring_batches: int = 0
+    stock_products: int = 0
+    recent_sales: list = field(default_factory=list)
+
+
+@dataclass
+class RecentSale:
+    id: int
+    created_at: object
+    item_count: int
+    total_amount: Decimal
+
+
+class _Snapshot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key = None
+        self.taken_at = 0.0
+        self.metrics = None
+
+
+def _fingerprint():
+    return tuple(db.session.execute(
+        db.select(
+            db.select(db.func.max(Sale.id)).scalar_subquery(),
+            db.select(db.func.max(WriteOff.id)).scalar_subquery(),
+            db.select(db.func.max(Batch.updated_at)).scalar_subquery(),
+            db.select(db.func.count(Batch.id)).scalar_subquery(),
+        )
+    ).one())
+
+
+def _count(model, *criteria):
+    return db.select(db.func.count(model.id)).where(*criteria).scalar_subquery()
+
+
+def _sum(column, *criteria):
+    return db.select(db.func.coalesce(db.func.sum(column), 0)).where(*criteria).scalar_subquery()
+
+
+def collect(today=None):
+    today = today or date.today()
+    yesterday = today - timedelta(days=1)
+    month_start = today - timedelta(days=29)
+    today_range = created_between(Sale.created_at, today, today)
+    past_range = created_between(Sale.created_at, month_start, yesterday)
+
+    row = db.session.execute(
+        db.select(
+            _count(Sale, *today_range),
+            _sum(Sale.total_amount, *today_range),
+            _count(Sale, *past_range),
+            _sum(SalesDaily.revenue, SalesDaily.day >= month_start, SalesDaily.day <= yesterday),
+            _count(Batch, Batch.expires_at < today),
+            _count(Batch, Batch.expires_at >= today, Batch.expires_at <= today + timedelta(days=EXPIRING_DAYS)),
+            db.select(db.func.count(db.distinct(Batch.product_id))).scalar_subquery(),
+        )
+    ).one()
+
+    today_revenue = Decimal(str(row[1])).quantize(Decimal("0.01"))
+    recent = db.session.execute(
+        db.select(Sale.id, Sale.created_at, Sale.item_count, Sale.total_amount)
+        .order_by(Sale.created_at.desc(), Sale.id.desc())
+        .limit(RECENT_SALES)
+    ).all()
+
+    return DashboardMetrics(
+        today_sales=row[0],
+        today_revenue=today_revenue,
+        month_sales=row[2] + row[0],
+        month_revenue=(Decimal(str(row[3])) + today_revenue).quantize(Decimal("0.01")),
+        expired_batches=row[4],
+        expiring_batches=row[5],
+        stock_products=row[6],
+        recent_sales=[RecentSale(*r) for r in recent],
+    )
+
+
+def dashboard_metrics():
+    snapshot = current_app.extensions.setdefault("dashboard_metrics", _Snapshot())
+    key = (date.today(), _fingerprint())
+    with snapshot.lock:
+        if snapshot.key == key and time.monotonic() - snapshot.taken_at < SNAPSHOT_TTL:
+            return snapshot.metrics
+
+    metrics = collect(key[0])
+    with snapshot.lock:
+        snapshot.key, snapshot.taken_at, snapshot.metrics = key, time.monotonic(), metrics
+    return metrics
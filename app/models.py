@@ -9,13 +9,24 @@ class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     phone = db.Column(db.String(20), unique=True, nullable=False)
+    # NULL — номер из старых данных не распознан или занят (см. find_user_by_phone)
+    phone_normalized = db.Column(db.String(20), unique=True, nullable=True, index=True)
     password_hash = db.Column(db.String(256), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False, index=True)
 
 
 class Preorder(db.Model):
     __tablename__ = "preorders"
+    __table_args__ = (
+        # ✅ доска заказов: WHERE status = ... ORDER BY created_at DESC
+        db.Index("ix_preorders_status_created_at", "status", "created_at"),
+        # ✅ история заказов покупателя: WHERE user_id = ... ORDER BY created_at DESC, id DESC
+        db.Index("ix_preorders_user_created_at", "user_id", db.text("created_at DESC"), db.text("id DESC")),
+        # ✅ лист сборки: WHERE pickup_date = ... AND status = 'active'
+        db.Index("ix_preorders_pickup_date_status", "pickup_date", "status"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
@@ -24,11 +35,14 @@ class Preorder(db.Model):
     comment = db.Column(db.Text, nullable=True)
     pickup_time = db.Column(db.String(5), nullable=True)
     pickup_date = db.Column(db.Date, nullable=False, default=date.today)
+    # ✅ слот самовывоза (app/pickup.py); pickup_time дублирует его начало для вывода
+    pickup_slot_id = db.Column(db.Integer, db.ForeignKey("pickup_slots.id"), nullable=True, index=True)
     status = db.Column(db.String(20), nullable=False, default="active", index=True)
     cancel_reason = db.Column(db.Text, nullable=True)
     completed_at = db.Column(db.DateTime, nullable=True)
     cancelled_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False, index=True)
 
     items = db.relationship(
         "PreorderItem",
@@ -75,8 +89,13 @@ class Product(db.Model):
     supplier_name = db.Column(db.String(120), nullable=True)
 
     image_url = db.Column(db.String(250), nullable=True)
+    image_variants = db.Column(db.JSON, nullable=True)  # {"320": "/static/uploads/...webp", ...}
     tags = db.Column(db.String(250), nullable=True)
 
+    # ✅ Штрихкод (EAN/UPC) или артикул и PLU весовых товаров (код на весах)
+    barcode = db.Column(db.String(32), unique=True, nullable=True, index=True)
+    plu = db.Column(db.String(5), unique=True, nullable=True, index=True)
+
     # ✅ Срок годности как "N дней"
     shelf_life_days = db.Column(db.Integer, nullable=False, default=7)
     db.CheckConstraint('shelf_life_days > 0', name='ck_products_shelf_life_days_pos')
@@ -84,6 +103,8 @@ class Product(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
     category = db.relationship('Category', backref=db.backref('products', lazy=True))
 
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False, index=True)
+
     def __repr__(self):
         return f"<Product {self.name}>"
 
@@ -94,6 +115,8 @@ class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False, unique=True)
     image_url = db.Column(db.String(250), nullable=True)
+    image_variants = db.Column(db.JSON, nullable=True)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False, index=True)
 
     def __repr__(self):
         return f"<Category {self.name}>"
@@ -111,10 +134,13 @@ class Batch(db.Model):
 
     quantity = db.Column(db.Numeric(10, 3), nullable=False)  # и для кг, и для штук (просто число)
     db.CheckConstraint('quantity > 0', name='ck_batches_quantity_pos')
+    # ✅ Из quantity зарезервировано под предзаказы (app/reservations.py); продавать можно quantity - reserved
+    reserved = db.Column(db.Numeric(10, 3), nullable=False, default=0, server_default="0")
     produced_at = db.Column(db.Date, nullable=False, default=date.today)
     expires_at = db.Column(db.Date, nullable=False)
 
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False, index=True)
 
     def __repr__(self):
         return f"<Batch {self.id} product={self.product_id} qty={self.quantity} exp={self.expires_at}>"
@@ -124,6 +150,79 @@ class Batch(db.Model):
         return produced_at + timedelta(days=int(shelf_life_days))
 
 
+# ✅ Слоты самовывоза: вместимость и счётчик броней; строка появляется при первой брони
+class PickupSlot(db.Model):
+    __tablename__ = "pickup_slots"
+    __table_args__ = (
+        db.UniqueConstraint("day", "starts_at", name="uq_pickup_slots_day_start"),
+        db.CheckConstraint("booked >= 0 AND booked <= capacity", name="ck_pickup_slots_booked"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    starts_at = db.Column(db.String(5), nullable=False)  # "HH:MM"
+    capacity = db.Column(db.Integer, nullable=False)
+    booked = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<PickupSlot {self.day} {self.starts_at} {self.booked}/{self.capacity}>"
+
+
+# ✅ Счётчики остатков: сумма партий по (товар, срок годности)
+class ProductStock(db.Model):
+    __tablename__ = "product_stock"
+
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), primary_key=True)
+    expires_at = db.Column(db.Date, primary_key=True)
+    product = db.relationship("Product", backref=db.backref("stock_levels", lazy=True, cascade="all, delete-orphan"))
+
+    quantity = db.Column(db.Numeric(12, 3), nullable=False, default=0)
+    reserved = db.Column(db.Numeric(12, 3), nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"<ProductStock product={self.product_id} exp={self.expires_at} qty={self.quantity} reserved={self.reserved}>"
+
+
+# ✅ Резервы под предзаказы: сколько какой партии обещано какому заказу
+class StockReservation(db.Model):
+    __tablename__ = "stock_reservations"
+
+    id = db.Column(db.Integer, primary_key=True)
+    preorder_id = db.Column(db.Integer, db.ForeignKey("preorders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False, index=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey("batches.id", ondelete="CASCADE"), nullable=False, index=True)
+    expires_at = db.Column(db.Date, nullable=False)
+    quantity = db.Column(db.Numeric(10, 3), nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<StockReservation preorder={self.preorder_id} batch={self.batch_id} qty={self.quantity}>"
+
+
+# ✅ Черновики поставки/продажи (вместо cookie-сессии)
+class DraftLine(db.Model):
+    __tablename__ = "draft_lines"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "terminal", "kind", "line_key", name="uq_draft_lines_key"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    terminal = db.Column(db.String(32), nullable=False, default="main")
+    kind = db.Column(db.String(10), nullable=False)  # "supply" | "sales"
+    line_key = db.Column(db.String(40), nullable=False)
+
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
+    product = db.relationship("Product", backref=db.backref("draft_lines", lazy=True, cascade="all, delete-orphan"))
+
+    quantity = db.Column(db.Numeric(10, 3), nullable=False)
+    produced_at = db.Column(db.Date, nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<DraftLine {self.id} {self.kind} product={self.product_id} qty={self.quantity}>"
+
 
 class WriteOff(db.Model):
     __tablename__ = "write_offs"
@@ -141,9 +240,19 @@ class WriteOff(db.Model):
 
 class Sale(db.Model):
     __tablename__ = "sales"
+    # created_at (server_default) нужен сразу после flush — для дневных итогов (sales_daily)
+    __mapper_args__ = {"eager_defaults": True}
 
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False, index=True)
+    # ✅ Когда продажа попала в БД (created_at у офлайн-продаж — время на кассе, может быть в прошлом)
+    recorded_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False, index=True)
+    # ✅ Ключ идемпотентности от кассы (пакетная выгрузка офлайн-продаж)
+    client_key = db.Column(db.String(64), unique=True, nullable=True, index=True)
+
+    # ✅ Итоги пишутся при проведении — списки продаж не загружают позиции
+    total_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default="0")
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     items = db.relationship(
         "SaleItem",
@@ -152,10 +261,6 @@ class Sale(db.Model):
         cascade="all, delete-orphan"
     )
 
-    @property
-    def total_amount(self):
-        return sum((Decimal(str(item.line_total)) for item in self.items), Decimal("0.00"))
-
 
 class SaleItem(db.Model):
     __tablename__ = "sale_items"
@@ -173,3 +278,79 @@ class SaleItem(db.Model):
 
     def __repr__(self):
         return f"<SaleItem {self.id} sale={self.sale_id} product={self.product_id} qty={self.quantity}>"
+
+
+# ✅ Дневные итоги продаж по товарам: отчёты за период читают дни, а не позиции продаж
+class SalesDaily(db.Model):
+    __tablename__ = "sales_daily"
+
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), primary_key=True, index=True)
+
+    quantity = db.Column(db.Numeric(14, 3), nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    sales_count = db.Column(db.Integer, nullable=False, default=0)  # продаж с этим товаром за день
+
+    def __repr__(self):
+        return f"<SalesDaily {self.day} product={self.product_id} qty={self.quantity} revenue={self.revenue}>"
+
+
+# ✅ Журнал удалений для инкрементальных резервных копий
+class DeletedRow(db.Model):
+    __tablename__ = "deleted_rows"
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<DeletedRow {self.table_name}#{self.row_id}>"
+
+
+# ✅ Фоновые задачи (резервные копии и пр.)
+class Job(db.Model):
+    __tablename__ = "jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)  # queued/running/done/failed
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    result_path = db.Column(db.String(500), nullable=True)
+
+    # полное восстановление из копии удаляет пользователей — в том числе того, кто его запустил
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": self.error,
+            "has_result": bool(self.result_path),
+        }
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+
+# ✅ Именованные счётчики (версия каталога для кэша страниц и т.п.)
+class Counter(db.Model):
+    __tablename__ = "counters"
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<Counter {self.name}={self.value}>"
@@ -0,0 +1,142 @@
+"""
+Лист сборки на день получения.
+
+Позиции активных заказов на pickup_date складываются одним GROUP BY (время получения, товар)
+по индексу (pickup_date, status); итоги по товарам считаются из той же выборки.
+Сверка с остатком — ещё два агрегата: сколько уже зарезервировано под заказы этого дня
+и сколько свободно в партиях, годных на этот день (счётчики product_stock).
+"""
+import csv
+import io
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from app import db
+from app.models import Preorder, PreorderItem, Product, ProductStock, StockReservation
+
+ACTIVE = "active"
+NO_TIME = ""
+
+
+@dataclass
+class PickLine:
+    product_id: int
+    name: str
+    is_weight_based: bool
+    quantity: Decimal = Decimal("0")
+    orders: int = 0
+    reserved: Decimal = Decimal("0")
+    free: Decimal = Decimal("0")
+
+    @property
+    def shortfall(self):
+        return max(self.quantity - self.reserved - self.free, Decimal("0"))
+
+    @property
+    def unit(self):
+        return "кг" if self.is_weight_based else "шт"
+
+    def display(self, value):
+        return f"{format_qty(value, self.is_weight_based)} {self.unit}"
+
+
+@dataclass
+class PickList:
+    day: object
+    products: list = field(default_factory=list)  # [PickLine] по названию
+    slots: list = field(default_factory=list)  # [(время, [PickLine])] по времени
+
+    @property
+    def shortages(self):
+        return [line for line in self.products if line.shortfall > 0]
+
+
+def format_qty(value, is_weight_based):
+    value = Decimal(str(value))
+    if is_weight_based:
+        return format(value.normalize(), "f") if value else "0"
+    return str(int(value))
+
+
+def _day_orders(day):
+    return db.and_(Preorder.pickup_date == day, Preorder.status == ACTIVE)
+
+
+def pick_list(day):
+    rows = db.session.execute(
+        db.select(
+            Preorder.pickup_time,
+            PreorderItem.product_id,
+            Product.name,
+            Product.is_weight_based,
+            db.func.sum(PreorderItem.quantity),
+            db.func.count(db.distinct(Preorder.id)),
+        )
+        .join(Preorder, Preorder.id == PreorderItem.preorder_id)
+        .join(Product, Product.id == PreorderItem.product_id)
+        .where(_day_orders(day))
+        .group_by(Preorder.pickup_time, PreorderItem.product_id, Product.name, Product.is_weight_based)
+        .order_by(Preorder.pickup_time, Product.name)
+    ).all()
+
+    result = PickList(day=day)
+    if not rows:
+        return result
+
+    totals = {}
+    slots = defaultdict(list)
+    for pickup_time, product_id, name, is_weight_based, qty, orders in rows:
+        qty = Decimal(str(qty))
+        slots[pickup_time or NO_TIME].append(PickLine(product_id, name, is_weight_based, qty, orders))
+        line = totals.setdefault(product_id, PickLine(product_id, name, is_weight_based))
+        line.quantity += qty
+        line.orders += orders  # у заказа одно время получения — заказы по слотам не пересекаются
+
+    product_ids = list(totals)
+    reserved = db.session.execute(
+        db.select(StockReservation.product_id, db.func.sum(StockReservation.quantity))
+        .join(Preorder, Preorder.id == StockReservation.preorder_id)
+        .where(_day_orders(day), StockReservation.product_id.in_(product_ids))
+        .group_by(StockReservation.product_id)
+    ).all()
+    for product_id, qty in reserved:
+        totals[product_id].reserved = Decimal(str(qty))
+
+    free = db.session.execute(
+        db.select(ProductStock.product_id, db.func.sum(ProductStock.quantity - ProductStock.reserved))
+        .where(ProductStock.product_id.in_(product_ids), ProductStock.expires_at >= day)
+        .group_by(ProductStock.product_id)
+    ).all()
+    for product_id, qty in free:
+        totals[product_id].free = max(Decimal(str(qty)), Decimal("0"))
+
+    result.products = sorted(totals.values(), key=lambda line: line.name.lower())
+    result.slots = sorted(slots.items())
+    return result
+
+
+def pick_list_csv(pick, by_slot=False):
+    """CSV (разделитель «;», как ждёт русский Excel) с BOM для корректной кириллицы."""
+    out = io.StringIO()
+    out.write("\ufeff")
+    writer = csv.writer(out, delimiter=";")
+    if by_slot:
+        writer.writerow(["Время", "Товар", "Ед.", "Количество", "Заказов"])
+        for pickup_time, lines in pick.slots:
+            for line in lines:
+                writer.writerow([
+                    pickup_time or "—", line.name, line.unit,
+                    format_qty(line.quantity, line.is_weight_based), line.orders,
+                ])
+    else:
+        writer.writerow(["Товар", "Ед.", "Заказано", "Заказов", "В резерве", "Свободно", "Не хватает"])
+        for line in pick.products:
+            writer.writerow([
+                line.name, line.unit,
+                format_qty(line.quantity, line.is_weight_based), line.orders,
+                format_qty(line.reserved, line.is_weight_based),
+                format_qty(line.free, line.is_weight_based),
+                format_qty(line.shortfall, line.is_weight_based),
+            ])
+    return out.getvalue()
@@ -0,0 +1,164 @@
+"""
+Слоты самовывоза.
+
+Сетка слотов задаётся конфигом (PICKUP_OPEN..PICKUP_CLOSE с шагом PICKUP_SLOT_MINUTES), строка
+в pickup_slots появляется при первой брони или когда админ меняет вместимость слота.
+Бронь — один атомарный UPSERT:
+    INSERT ... ON CONFLICT (day, starts_at) DO UPDATE SET booked = booked + 1 WHERE booked < capacity
+Если слот заполнен, ни одна строка не возвращается — гонок между параллельными заказами нет,
+блокировок сверх одной строки тоже. Свободные слоты на N дней — один SELECT по (day, starts_at).
+"""
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.dbutil import dialect_insert
+from app.models import PickupSlot, Preorder
+
+
+class SlotUnavailable(ValueError):
+    pass
+
+
+def _minutes(raw):
+    hours, minutes = raw.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def slot_times():
+    """Начала слотов одного дня: ["09:00", "09:15", ...]."""
+    config = current_app.config
+    step = config["PICKUP_SLOT_MINUTES"]
+    start, end = _minutes(config["PICKUP_OPEN"]), _minutes(config["PICKUP_CLOSE"])
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in range(start, end - step + 1, step)]
+
+
+def booking_window(today=None):
+    today = today or date.today()
+    return today, today + timedelta(days=current_app.config["PICKUP_DAYS_AHEAD"] - 1)
+
+
+def _is_past(day, starts_at, now):
+    return (day, starts_at) <= (now.date(), now.strftime("%H:%M"))
+
+
+def open_slots(days=None, now=None):
+    """
+    Свободные слоты на days дней начиная с сегодня (одним запросом).
+    -> [{"date": "YYYY-MM-DD", "slots": [{"time": "HH:MM", "free": n}, ...]}, ...]
+    """
+    now = now or datetime.now()
+    first, last = booking_window(now.date())
+    if days is not None:
+        last = min(last, first + timedelta(days=max(days, 1) - 1))
+
+    taken = {
+        (day, starts_at): (capacity, booked)
+        for day, starts_at, capacity, booked in db.session.execute(
+            db.select(PickupSlot.day, PickupSlot.starts_at, PickupSlot.capacity, PickupSlot.booked)
+            .where(PickupSlot.day >= first, PickupSlot.day <= last)
+        ).all()
+    }
+
+    default_capacity = current_app.config["PICKUP_SLOT_CAPACITY"]
+    times = slot_times()
+    result = []
+    day = first
+    while day <= last:
+        slots = []
+        for starts_at in times:
+            if _is_past(day, starts_at, now):
+                continue
+            capacity, booked = taken.get((day, starts_at), (default_capacity, 0))
+            if booked < capacity:
+                slots.append({"time": starts_at, "free": capacity - booked})
+        result.append({"date": day.isoformat(), "slots": slots})
+        day += timedelta(days=1)
+    return result
+
+
+def book(day, starts_at, now=None):
+    """Занимает место в слоте (без commit). -> PickupSlot.id; SlotUnavailable — слот закрыт или заполнен."""
+    now = now or datetime.now()
+    first, last = booking_window(now.date())
+    if starts_at not in slot_times():
+        raise SlotUnavailable("Выберите время получения из списка")
+    if not first <= day <= last or _is_past(day, starts_at, now):
+        raise SlotUnavailable("Это время получения уже недоступно")
+
+    default_capacity = current_app.config["PICKUP_SLOT_CAPACITY"]
+    if default_capacity < 1:
+        # новую строку с booked=1 не вставить — бронь возможна только в слот с заданной вместимостью
+        slot_id = db.session.execute(
+            db.update(PickupSlot)
+            .where(PickupSlot.day == day, PickupSlot.starts_at == starts_at, PickupSlot.booked < PickupSlot.capacity)
+            .values(booked=PickupSlot.booked + 1)
+            .returning(PickupSlot.id)
+        ).scalar()
+    else:
+        stmt = dialect_insert(PickupSlot).values(day=day, starts_at=starts_at, capacity=default_capacity, booked=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PickupSlot.day, PickupSlot.starts_at],
+            set_={"booked": PickupSlot.booked + 1, "updated_at": db.func.now()},
+            where=PickupSlot.booked < PickupSlot.capacity,
+        ).returning(PickupSlot.id)
+        slot_id = db.session.execute(stmt).scalar()
+
+    if slot_id is None:
+        raise SlotUnavailable(f"На {day.strftime('%d.%m')} в {starts_at} мест нет — выберите другое время")
+    return slot_id
+
+
+def release(slot_id):
+    """Освобождает место (отмена заказа)."""
+    if slot_id is None:
+        return
+    db.session.execute(
+        db.update(PickupSlot)
+        .where(PickupSlot.id == slot_id, PickupSlot.booked > 0)
+        .values(booked=PickupSlot.booked - 1)
+    )
+
+
+def day_slots(day):
+    """Все слоты дня для админки: [(starts_at, capacity, booked)]."""
+    rows = {
+        slot.starts_at: slot
+        for slot in PickupSlot.query.filter(PickupSlot.day == day).all()
+    }
+    default_capacity = current_app.config["PICKUP_SLOT_CAPACITY"]
+    times = slot_times()
+    # слоты вне текущей сетки (после смены часов работы), если на них уже есть брони
+    times += sorted(t for t in rows if t not in times)
+    return [
+        (t, rows[t].capacity if t in rows else default_capacity, rows[t].booked if t in rows else 0)
+        for t in times
+    ]
+
+
+def set_capacity(day, starts_at, capacity):
+    """Меняет вместимость слота (без commit). ValueError — меньше уже принятых броней."""
+    if capacity < 0:
+        raise ValueError("Вместимость не может быть отрицательной")
+    stmt = dialect_insert(PickupSlot).values(day=day, starts_at=starts_at, capacity=capacity, booked=0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PickupSlot.day, PickupSlot.starts_at],
+        set_={"capacity": capacity, "updated_at": db.func.now()},
+        where=PickupSlot.booked <= capacity,
+    ).returning(PickupSlot.id)
+    if db.session.execute(stmt).scalar() is None:
+        raise ValueError(f"На {starts_at} уже больше {capacity} заказов")
+
+
+def refresh_slot_bookings():
+    """Пересчитывает pickup_slots.booked по неотменённым заказам (после восстановления из копии)."""
+    slots = PickupSlot.__table__
+    preorders = Preorder.__table__
+    db.session.execute(
+        slots.update().values(
+            booked=db.select(db.func.count())
+            .where(preorders.c.pickup_slot_id == slots.c.id, preorders.c.status != "cancelled")
+            .scalar_subquery()
+        )
+    )
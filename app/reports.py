@@ -0,0 +1,237 @@
+"""
+История продаж: фильтры по периоду, итоги и постраничный вывод.
+
+Период — полуоткрытый интервал [начало дня, начало следующего дня) прямо по sales.created_at,
+без func.date(...) — так условие идёт по индексу. Строки выводятся keyset-страницами (app/keyset.py).
+
+Итоги за прошедшие дни читаются из sales_daily (строка на день и товар — O(дней), а не O(позиций));
+текущий день — из sale_items. sales_daily пополняется в той же транзакции, что и продажа
+(record_sales), и пересобирается командой `flask sales-rollup`.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy.orm import contains_eager
+
+from app import db
+from app.dbutil import datetime_param, dialect_insert
+from app.keyset import decode_cursor, fetch_page
+from app.models import Product, Sale, SaleItem, SalesDaily
+
+HISTORY_PER_PAGE = 50
+
+
+def period_dates(period, start_raw="", end_raw="", today=None):
+    """period из формы истории -> (start_date | None, end_date | None), обе границы включительно."""
+    today = today or date.today()
+    if period == "today":
+        return today, today
+    if period == "yesterday":
+        day = today - timedelta(days=1)
+        return day, day
+    if period == "week":
+        return today - timedelta(days=6), today
+    if period == "month":
+        return today - timedelta(days=29), today
+    if period == "custom":
+        return _parse_date(start_raw), _parse_date(end_raw)
+    return None, None
+
+
+def _parse_date(raw):
+    try:
+        return date.fromisoformat(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def day_bounds(start_date=None, end_date=None):
+    """Дни включительно -> [start, end) по времени; None — граница не задана."""
+    start = datetime.combine(start_date, time.min) if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), time.min) if end_date else None
+    return start, end
+
+
+def created_between(column, start_date=None, end_date=None):
+    """Условия для WHERE: column >= начало первого дня и column < начало дня после последнего."""
+    start, end = day_bounds(start_date, end_date)
+    criteria = []
+    if start is not None:
+        criteria.append(column >= datetime_param(start))
+    if end is not None:
+        criteria.append(column < datetime_param(end))
+    return criteria
+
+
+# -----------------------
+# sales_daily
+# -----------------------
+def record_sales(entries):
+    """
+    Добавляет проведённые продажи в sales_daily (без commit).
+    entries: [(day, sale_id, product_id, quantity, line_total), ...]
+    """
+    totals = defaultdict(lambda: [Decimal("0"), Decimal("0"), set()])
+    for day, sale_id, product_id, qty, line_total in entries:
+        row = totals[(day, product_id)]
+        row[0] += Decimal(str(qty))
+        row[1] += Decimal(str(line_total))
+        row[2].add(sale_id)
+    if not totals:
+        return
+
+    stmt = dialect_insert(SalesDaily).values([
+        {"day": day, "product_id": product_id, "quantity": qty, "revenue": revenue, "sales_count": len(sale_ids)}
+        for (day, product_id), (qty, revenue, sale_ids) in sorted(totals.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SalesDaily.day, SalesDaily.product_id],
+        set_={
+            "quantity": SalesDaily.quantity + stmt.excluded.quantity,
+            "revenue": SalesDaily.revenue + stmt.excluded.revenue,
+            "sales_count": SalesDaily.sales_count + stmt.excluded.sales_count,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def record_sale(sale):
+    """Продажа из ORM (после flush: нужны sale.id и sale.created_at)."""
+    day = sale.created_at.date()
+    record_sales((day, sale.id, item.product_id, item.quantity, item.line_total) for item in sale.items)
+
+
+def rebuild_sales_daily(start_date=None):
+    """Пересобирает sales_daily из sale_items (все дни или начиная с start_date), без commit."""
+    delete = db.delete(SalesDaily)
+    if start_date:
+        delete = delete.where(SalesDaily.day >= start_date)
+    db.session.execute(delete.execution_options(synchronize_session=False))
+
+    day = db.func.date(Sale.created_at)
+    grouped = (
+        db.select(
+            day,
+            SaleItem.product_id,
+            db.func.sum(SaleItem.quantity),
+            db.func.sum(SaleItem.line_total),
+            db.func.count(db.distinct(SaleItem.sale_id)),
+        )
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .where(*created_between(Sale.created_at, start_date))
+        .group_by(day, SaleItem.product_id)
+    )
+    result = db.session.execute(
+        db.insert(SalesDaily).from_select(
+            ["day", "product_id", "quantity", "revenue", "sales_count"], grouped
+        )
+    )
+    return result.rowcount
+
+
+def refresh_sale_totals():
+    """Пересчитывает sales.total_amount / item_count из sale_items (после восстановления из копии)."""
+    items = SaleItem.__table__
+    sales = Sale.__table__
+    db.session.execute(
+        sales.update().values(
+            total_amount=db.func.coalesce(
+                db.select(db.func.sum(items.c.line_total)).where(items.c.sale_id == sales.c.id).scalar_subquery(), 0
+            ),
+            item_count=db.select(db.func.count()).where(items.c.sale_id == sales.c.id).scalar_subquery(),
+        )
+    )
+
+
+# -----------------------
+# Итоги за период
+# -----------------------
+@dataclass
+class HistoryTotals:
+    amount: Decimal = Decimal("0.00")
+    quantity: Decimal = Decimal("0")
+    sales: int = 0
+
+    def add(self, amount, quantity, sales):
+        self.amount = (self.amount + Decimal(str(amount or 0))).quantize(Decimal("0.01"))
+        self.quantity += Decimal(str(quantity or 0))
+        self.sales += sales or 0
+
+    @property
+    def quantity_display(self):
+        return format(self.quantity.normalize(), "f") if self.quantity else "0"
+
+
+def _history_criteria(start_date, end_date, product_id):
+    criteria = created_between(Sale.created_at, start_date, end_date)
+    if product_id:
+        criteria.append(SaleItem.product_id == product_id)
+    return criteria
+
+
+def _split_period(start_date, end_date, today):
+    """-> (прошедшие дни для sales_daily | None, нужен ли сегодняшний день из sale_items)."""
+    past_end = min(end_date, today - timedelta(days=1)) if end_date else today - timedelta(days=1)
+    past = (start_date, past_end) if start_date is None or start_date <= past_end else None
+    with_today = (end_date is None or end_date >= today) and (start_date is None or start_date <= today)
+    return past, with_today
+
+
+def history_totals(start_date=None, end_date=None, product_id=None, today=None):
+    today = today or date.today()
+    totals = HistoryTotals()
+    past, with_today = _split_period(start_date, end_date, today)
+
+    if past:
+        criteria = [SalesDaily.day <= past[1]]
+        if past[0]:
+            criteria.append(SalesDaily.day >= past[0])
+        if product_id:
+            criteria.append(SalesDaily.product_id == product_id)
+        amount, qty, sales = db.session.execute(
+            db.select(
+                db.func.sum(SalesDaily.revenue),
+                db.func.sum(SalesDaily.quantity),
+                db.func.sum(SalesDaily.sales_count),
+            ).where(*criteria)
+        ).one()
+        # без фильтра по товару продажа с несколькими товарами посчиталась бы несколько раз —
+        # число продаж берём из индекса sales.created_at
+        totals.add(amount, qty, sales if product_id else sales_count(past[0], past[1]))
+
+    if with_today:
+        amount, qty, sales = db.session.execute(
+            db.select(
+                db.func.sum(SaleItem.line_total),
+                db.func.sum(SaleItem.quantity),
+                db.func.count(db.distinct(SaleItem.sale_id)),
+            )
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .where(*_history_criteria(today, today, product_id))
+        ).one()
+        totals.add(amount, qty, sales)
+
+    return totals
+
+
+def history_page(start_date=None, end_date=None, product_id=None, after=None, per_page=HISTORY_PER_PAGE):
+    """Строки продаж, новые сверху. after — курсор из предыдущей страницы. -> (items, next_cursor)."""
+    query = (
+        SaleItem.query
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .join(Product, Product.id == SaleItem.product_id)
+        .options(contains_eager(SaleItem.sale), contains_eager(SaleItem.product))
+        .filter(*_history_criteria(start_date, end_date, product_id))
+    )
+    return fetch_page(
+        query, Sale.created_at, SaleItem.id, decode_cursor(after), per_page,
+        key=lambda item: (item.sale.created_at, item.id),
+    )
+
+
+def sales_count(start_date=None, end_date=None):
+    return db.session.execute(
+        db.select(db.func.count(Sale.id)).where(*created_between(Sale.created_at, start_date, end_date))
+    ).scalar()
@@ -0,0 +1,219 @@
+"""
+Резервы остатков под предзаказы.
+
+При подтверждении предзаказа количество резервируется за конкретными партиями по FEFO
+(produced_at, id) — только из тех, что будут годны в день получения. Свободный остаток партии —
+quantity - reserved; касса (app/allocation.py) продаёт только его.
+Партии блокируются FOR UPDATE в том же порядке, что и на кассе, поэтому два параллельных
+заказа не могут пообещать один и тот же остаток. Счётчики product_stock.reserved меняются
+в той же транзакции — «доступно к продаже» остаётся одним индексным запросом (app/stock.py).
+
+Отмена заказа снимает резерв, выдача списывает зарезервированное из партий.
+Commit — за вызывающим.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.allocation import InsufficientStock, _lock_batches, allocate, free_quantity
+from app.models import Batch, Preorder, Product, ProductStock, StockReservation
+from app.stock import adjust_reserved, adjust_stock
+
+
+def _need_by_product(lines):
+    need = defaultdict(Decimal)
+    for product_id, qty in lines:
+        qty = Decimal(str(qty))
+        if qty > 0:
+            need[int(product_id)] += qty
+    return need
+
+
+def reserve(preorder, lines=None):
+    """
+    Резервирует lines ([(product_id, qty)], по умолчанию — позиции заказа) за партиями,
+    годными на preorder.pickup_date. Всё или ничего: при нехватке — InsufficientStock.
+    """
+    if lines is None:
+        lines = [(item.product_id, item.quantity) for item in preorder.items]
+    need = _need_by_product(lines)
+    if not need:
+        return []
+
+    if preorder.id is None:
+        db.session.flush()
+
+    product_ids = sorted(need)
+    on_date = max(preorder.pickup_date or date.today(), date.today())
+    # без SKIP LOCKED: резерв дождётся кассы, а не сочтёт занятую партию пустой
+    batches = _lock_batches(product_ids, on_date, skip_locked=False)
+    by_product = defaultdict(list)
+    for batch in batches:
+        by_product[batch.product_id].append(batch)
+
+    for product_id in product_ids:
+        available = sum((max(free_quantity(b), Decimal("0")) for b in by_product[product_id]), Decimal("0"))
+        if available < need[product_id]:
+            product = db.session.get(Product, product_id)
+            raise InsufficientStock(product, available)
+
+    reservations = []
+    for product_id in product_ids:
+        remains = need[product_id]
+        for batch in by_product[product_id]:
+            if remains <= 0:
+                break
+            free = free_quantity(batch)
+            if free <= 0:
+                continue
+            take_qty = free if free <= remains else remains
+            remains -= take_qty
+
+            batch.reserved = Decimal(str(batch.reserved or 0)) + take_qty
+            adjust_reserved(product_id, batch.expires_at, take_qty)
+            reservations.append(StockReservation(
+                preorder_id=preorder.id,
+                product_id=product_id,
+                batch_id=batch.id,
+                expires_at=batch.expires_at,
+                quantity=take_qty,
+            ))
+
+    db.session.add_all(reservations)
+    return reservations
+
+
+def _locked_reservations(*criteria):
+    """Резервы и их партии (заблокированные в порядке кассы) -> [(reservation, batch)]."""
+    reservations = StockReservation.query.filter(*criteria).all()
+    if not reservations:
+        return []
+    batch_ids = {r.batch_id for r in reservations}
+    batches = {
+        batch.id: batch
+        for batch in (
+            Batch.query
+            .filter(Batch.id.in_(batch_ids))
+            .order_by(Batch.product_id.asc(), Batch.produced_at.asc(), Batch.id.asc())
+            .with_for_update()
+            .all()
+        )
+    }
+    return [(r, batches.get(r.batch_id)) for r in reservations]
+
+
+def release(preorder_id):
+    """Снимает все резервы заказа (отмена)."""
+    for reservation, batch in _locked_reservations(StockReservation.preorder_id == preorder_id):
+        qty = Decimal(str(reservation.quantity))
+        if batch is not None:
+            batch.reserved = max(Decimal(str(batch.reserved or 0)) - qty, Decimal("0"))
+            adjust_reserved(reservation.product_id, reservation.expires_at, -qty)
+        db.session.delete(reservation)
+
+
+def consume(preorder):
+    """
+    Выдача заказа: зарезервированное списывается из партий, резервы удаляются.
+    Позиции без резерва (заказы, оформленные до появления резервов) списываются по FEFO
+    из свободного остатка; при нехватке — InsufficientStock.
+    """
+    reserved = defaultdict(Decimal)
+    emptied = []
+    for reservation, batch in _locked_reservations(StockReservation.preorder_id == preorder.id):
+        qty = Decimal(str(reservation.quantity))
+        if batch is not None:
+            reserved[reservation.product_id] += qty
+            batch.quantity = Decimal(str(batch.quantity)) - qty
+            batch.reserved = max(Decimal(str(batch.reserved or 0)) - qty, Decimal("0"))
+            adjust_reserved(reservation.product_id, reservation.expires_at, -qty)
+            adjust_stock(reservation.product_id, reservation.expires_at, -qty)
+            if batch.quantity <= 0:
+                emptied.append(batch)
+        db.session.delete(reservation)
+
+    for batch in emptied:
+        db.session.delete(batch)
+    db.session.flush()
+
+    need = _need_by_product((item.product_id, item.quantity) for item in preorder.items)
+    missing = [(pid, qty - reserved[pid]) for pid, qty in sorted(need.items()) if qty > reserved[pid]]
+    if missing:
+        allocate(missing)
+
+
+def release_batch(batch):
+    """
+    Перед списанием партии: снимает её резервы.
+    Возвращает [(preorder_id, product_id, qty)] — их нужно перенести на другие партии (rereserve).
+    """
+    moved = []
+    for reservation in StockReservation.query.filter_by(batch_id=batch.id).all():
+        qty = Decimal(str(reservation.quantity))
+        moved.append((reservation.preorder_id, reservation.product_id, qty))
+        adjust_reserved(reservation.product_id, reservation.expires_at, -qty)
+        db.session.delete(reservation)
+    batch.reserved = 0
+    return moved
+
+
+def rereserve(moved):
+    """Переносит снятые резервы на оставшиеся партии. Возвращает id заказов, которым не хватило."""
+    if not moved:
+        return []
+    db.session.flush()
+
+    lines = defaultdict(list)
+    for preorder_id, product_id, qty in moved:
+        lines[preorder_id].append((product_id, qty))
+
+    failed = []
+    preorders = (
+        Preorder.query
+        .filter(Preorder.id.in_(lines), Preorder.status == "active")
+        .order_by(Preorder.pickup_date.asc(), Preorder.id.asc())
+        .all()
+    )
+    for preorder in preorders:
+        try:
+            reserve(preorder, lines[preorder.id])
+        except InsufficientStock:
+            failed.append(preorder.id)
+    return failed
+
+
+def rebuild_reservations():
+    """
+    Заново резервирует все активные заказы (в порядке оформления).
+    Для восстановления из копии и для заказов, оформленных до появления резервов.
+    Возвращает id заказов, которым не хватило остатка.
+    """
+    db.session.execute(db.delete(StockReservation).execution_options(synchronize_session=False))
+    db.session.execute(
+        db.update(Batch).where(Batch.reserved != 0).values(reserved=0)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.update(ProductStock).where(ProductStock.reserved != 0).values(reserved=0)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire_all()
+
+    failed = []
+    preorders = (
+        Preorder.query
+        .options(selectinload(Preorder.items))
+        .filter(Preorder.status == "active")
+        .order_by(Preorder.created_at.asc(), Preorder.id.asc())
+        .all()
+    )
+    for preorder in preorders:
+        try:
+            reserve(preorder)
+        except InsufficientStock:
+            failed.append(preorder.id)
+    return failed
+
@@ -1,13 +1,14 @@
 from functools import wraps
-from datetime import date, timedelta
+import hmac
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+import os
 import re
-from io import BytesIO
-import json
+from uuid import uuid4
 
 from flask import (
     Blueprint, render_template, redirect, url_for, flash,
-    request, abort, session, jsonify, send_file
+    request, abort, jsonify, Response, stream_with_context, current_app, send_file
 )
 from flask_login import login_user, logout_user, login_required, current_user
 from sqlalchemy.orm import load_only
@@ -19,8 +20,33 @@ from app.forms import (
     SupplySearchForm, SupplyAddLineForm,
     SalesAddLineForm, SalesHistoryFilterForm
 )
-from app.models import User, Product, Category, Batch, WriteOff, Sale, SaleItem, Preorder, PreorderItem
-from app.uploads import save_product_image, save_category_image
+from app.models import (
+    User, Product, Category, Batch, WriteOff, Sale, SaleItem, Preorder, PreorderItem, Job
+)
+from app.uploads import save_product_image, save_category_image, enqueue_variants, send_upload, image_src
+from app.cache import cached_page, bump_catalog_version, cache_stats
+from app.search import search_products, search_filter as product_search_filter, PER_PAGE as SEARCH_PER_PAGE
+from app.typeahead import search as typeahead_search
+from app import cart, pickup
+from app.cart import confirm_sale
+from app.reports import period_dates, history_page, history_totals
+from app.metrics import dashboard_metrics
+from app.orders import customer_orders, orders_page, active_filter, archived_filter, user_order_stats
+from app.ingest import ingest_sales, summarize as summarize_ingest
+from app.barcodes import parse_code, find_product, scan_quantity, normalize_plu
+from app.conditional import conditional_response, catalog_validators, products_meta_validators
+from app.allocation import allocate, InsufficientStock
+from app.reservations import reserve, release, consume, release_batch, rereserve
+from app.picklist import pick_list, pick_list_csv
+from app.backup import (
+    iter_backup_gzip, iter_backup_records, export_backup_job, parse_watermark, restore_backup_job,
+)
+from app.jobs import enqueue
+from app.drafts import (
+    get_lines as get_draft_lines, add_line as add_draft_line,
+    remove_line as remove_draft_line, clear_lines as clear_draft_lines, set_terminal
+)
+from app.stock import adjust_stock, available_map as stock_available_map
 
 
 # -----------------------
@@ -43,34 +69,43 @@ def admin_required(view):
     return wrapped
 
 
-# -----------------------
-# Supply helpers (session draft)
-# -----------------------
-def _supply_lines():
-    # list[dict]: {product_id:int, qty:str, produced_at:str(YYYY-MM-DD)}
-    return session.get("supply_lines", [])
-
-def _save_supply_lines(lines):
-    session["supply_lines"] = lines
-    session.modified = True
-
-def _clear_supply_lines():
-    session.pop("supply_lines", None)
-    session.modified = True
+def json_csrf_exempt(view):
+    """
+    Кассы и сканеры шлют JSON без токена страницы. Чужой сайт не может отправить
+    application/json без CORS-preflight, поэтому JSON-запросы CSRF не проверяют; формы — проверяют.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not request.is_json and current_app.config["WTF_CSRF_ENABLED"]:
+            csrf.protect()
+        return view(*args, **kwargs)
+    return csrf.exempt(wrapped)
 
-def _sales_lines():
-    # list[dict]: {product_id:int, qty:str}
-    return session.get("sales_lines", [])
 
+def till_key_or_admin_required(view):
+    """
+    Касса, копившая продажи без сети, может прийти с истёкшей сессией: её пускает ключ
+    из TILL_API_KEYS в заголовке X-Till-Key. Без заголовка — как admin_required.
+    """
+    admin_view = admin_required(view)
 
-def _save_sales_lines(lines):
-    session["sales_lines"] = lines
-    session.modified = True
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        key = request.headers.get("X-Till-Key")
+        if key is None:
+            return admin_view(*args, **kwargs)
+        if not any(hmac.compare_digest(key, known) for known in current_app.config["TILL_API_KEYS"]):
+            return jsonify({"ok": False, "error": "Неизвестный ключ кассы"}), 403
+        return view(*args, **kwargs)
+    return wrapped
 
 
-def _clear_sales_lines():
-    session.pop("sales_lines", None)
-    session.modified = True
+# -----------------------
+# Supply/sales helpers (server-side draft, см. app/drafts.py)
+# -----------------------
+def _supply_lines():
+    # list[dict]: {id, product_id:int, qty:str, produced_at:str(YYYY-MM-DD)}
+    return get_draft_lines("supply")
 
 
 def normalize_phone(phone_raw):
@@ -89,18 +124,17 @@ def find_user_by_phone(phone_raw):
     if not normalized:
         return None
 
-    users = User.query.all()
-    for user in users:
-        if normalize_phone(user.phone) == normalized:
-            return user
-    return None
-
+    user = User.query.filter_by(phone_normalized=normalized).first()
+    if user:
+        return user
 
-def format_preorder_qty(item):
-    qty = Decimal(str(item.quantity))
-    if item.product.is_weight_based:
-        return f"{format(qty.normalize(), 'f').rstrip('0').rstrip('.')} кг"
-    return f"{int(qty)} шт"
+    # пользователи, чей номер миграция не смогла нормализовать (дубль или мусор): сравниваем
+    # как раньше, но только среди них — таких строк единицы, пока админ не исправит номера
+    for legacy in User.query.filter(User.phone_normalized.is_(None)).all():
+        if normalize_phone(legacy.phone) == normalized:
+            current_app.logger.warning("Вход по ненормализованному телефону: пользователь #%s", legacy.id)
+            return legacy
+    return None
 
 
 # -----------------------
@@ -133,6 +167,7 @@ def register():
         user = User(
             username=form.username.data.strip(),
             phone=normalized_phone,
+            phone_normalized=normalized_phone,
             password_hash=hashed_pw
         )
         db.session.add(user)
@@ -173,16 +208,19 @@ def logout():
 @main_bp.route("/profile")
 @login_required
 def profile():
-    orders = (
-        Preorder.query
-        .filter_by(user_id=current_user.id)
-        .order_by(Preorder.created_at.desc(), Preorder.id.desc())
-        .all()
+    after = (request.args.get("after") or "").strip()
+    active_after = (request.args.get("active_after") or "").strip()
+    active_orders, active_next, history_orders, next_cursor = customer_orders(
+        current_user.id, after=after, active_after=active_after
+    )
+    return render_template(
+        "profile.html",
+        active_orders=active_orders,
+        active_next=active_next,
+        history_orders=history_orders,
+        next_cursor=next_cursor,
+        allow_cancel=False,
     )
-    for order in orders:
-        for item in order.items:
-            item._qty_display = format_preorder_qty(item)
-    return render_template("profile.html", orders=orders)
 
 
 @main_bp.route("/favorites")
@@ -194,16 +232,42 @@ def favorites():
 @main_bp.route("/preorder")
 @login_required
 def preorder():
-    orders = (
-        Preorder.query
-        .filter_by(user_id=current_user.id)
-        .order_by(Preorder.created_at.desc(), Preorder.id.desc())
-        .all()
+    after = (request.args.get("after") or "").strip()
+    active_after = (request.args.get("active_after") or "").strip()
+    active_orders, active_next, history_orders, next_cursor = customer_orders(
+        current_user.id, after=after, active_after=active_after
     )
-    for order in orders:
-        for item in order.items:
-            item._qty_display = format_preorder_qty(item)
-    return render_template("preorder.html", orders=orders, today=date.today())
+    return render_template(
+        "preorder.html",
+        active_orders=active_orders,
+        active_next=active_next,
+        history_orders=history_orders,
+        next_cursor=next_cursor,
+        allow_cancel=True,
+        today=date.today(),
+        last_pickup_date=pickup.booking_window()[1],
+    )
+
+
+# ✅ Свободные слоты самовывоза на ближайшие дни (один запрос)
+@main_bp.route("/preorder/slots")
+@login_required
+def preorder_slots():
+    days = request.args.get("days", type=int)
+    return jsonify({"ok": True, "days": pickup.open_slots(days)})
+
+
+# ✅ Следующая страница истории заказов (подгрузка при прокрутке)
+@main_bp.route("/orders/history")
+@login_required
+def order_history():
+    after = (request.args.get("after") or "").strip()
+    _, _, orders, next_cursor = customer_orders(current_user.id, after=after or None)
+    return jsonify({
+        "ok": True,
+        "html": render_template("orders/_history_cards.html", orders=orders, allow_cancel=False),
+        "next": next_cursor,
+    })
 
 
 @main_bp.route("/preorder/products-meta")
@@ -214,14 +278,17 @@ def preorder_products_meta():
     if not product_ids:
         return jsonify({"ok": True, "products": {}})
 
-    products = Product.query.filter(Product.id.in_(product_ids)).all()
-    payload = {
-        str(product.id): {
-            "is_weight_based": bool(product.is_weight_based),
+    def _build():
+        products = Product.query.filter(Product.id.in_(product_ids)).all()
+        payload = {
+            str(product.id): {
+                "is_weight_based": bool(product.is_weight_based),
+            }
+            for product in products
         }
-        for product in products
-    }
-    return jsonify({"ok": True, "products": payload})
+        return jsonify({"ok": True, "products": payload})
+
+    return conditional_response(products_meta_validators(product_ids), _build)
 
 
 @main_bp.route("/preorder/confirm", methods=["POST"])
@@ -239,6 +306,11 @@ def preorder_confirm():
         pickup_date = date.fromisoformat(pickup_date_raw) if pickup_date_raw else date.today()
     except ValueError:
         return jsonify({"ok": False, "error": "Некорректная дата получения"}), 400
+    if pickup_date < date.today():
+        return jsonify({"ok": False, "error": "Дата получения уже прошла"}), 400
+    pickup_time = (payload.get("time") or "").strip()
+    if not pickup_time:
+        return jsonify({"ok": False, "error": "Выберите время получения"}), 400
 
     product_ids = [int(item.get("id")) for item in raw_items if str(item.get("id", "")).isdigit()]
     products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
@@ -246,7 +318,7 @@ def preorder_confirm():
     preorder = Preorder(
         user_id=current_user.id,
         comment=(payload.get("comment") or "").strip() or None,
-        pickup_time=(payload.get("time") or "").strip() or None,
+        pickup_time=pickup_time,
         pickup_date=pickup_date,
     )
     db.session.add(preorder)
@@ -276,6 +348,20 @@ def preorder_confirm():
         db.session.rollback()
         return jsonify({"ok": False, "error": "Некорректные позиции предзаказа"}), 400
 
+    # ✅ резерв за партиями по FEFO: обещаем только то, что есть на полке к дню получения
+    try:
+        reserve(preorder)
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": str(e), "product_id": e.product.id}), 409
+
+    # ✅ место в слоте — атомарный UPSERT последним, чтобы строка слота была занята как можно меньше
+    try:
+        preorder.pickup_slot_id = pickup.book(pickup_date, pickup_time)
+    except pickup.SlotUnavailable as e:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": str(e), "slot_full": True}), 409
+
     db.session.commit()
     return jsonify({"ok": True})
 
@@ -304,25 +390,16 @@ def admin_users():
 @admin_required
 def admin_user_orders(user_id):
     user = User.query.get_or_404(user_id)
-    orders = (
-        Preorder.query
-        .filter_by(user_id=user.id)
-        .order_by(Preorder.created_at.desc(), Preorder.id.desc())
-        .all()
-    )
-
-    for order in orders:
-        for item in order.items:
-            item._qty_display = format_preorder_qty(item)
-
-    total_orders = len(orders)
-    cancelled_orders = sum(1 for order in orders if order.status == "cancelled")
-    first_order_at = min((order.created_at for order in orders), default=None)
+    after = (request.args.get("after") or "").strip()
+    orders, next_cursor = orders_page(Preorder.user_id == user.id, after=after)
+    total_orders, cancelled_orders, first_order_at = user_order_stats(user.id)
 
     return render_template(
         "admin/users/orders.html",
         user=user,
         orders=orders,
+        next_cursor=next_cursor,
+        is_first_page=not after,
         total_orders=total_orders,
         cancelled_orders=cancelled_orders,
         first_order_at=first_order_at,
@@ -341,54 +418,123 @@ def preorder_cancel(order_id):
         return redirect(url_for("main.preorder"))
 
     reason = (request.form.get("reason") or "").strip() or "Отменено пользователем"
+    release(order.id)
+    pickup.release(order.pickup_slot_id)
     order.mark_cancelled(reason)
     db.session.commit()
     flash("Заказ отменён", "info")
     return redirect(url_for("main.preorder"))
 
 
+@main_bp.route("/static/uploads/<path:filename>")
+def uploaded_file(filename):
+    return send_upload(filename)
+
+
 @main_bp.route("/products")
 def products():
-    categories = Category.query.order_by(Category.name.asc()).all()
-    return render_template("products.html", categories=categories)
+    def _render():
+        categories = Category.query.order_by(Category.name.asc()).all()
+        return {"title": "Каталог", "html": render_template("catalog/products.html", categories=categories)}
+
+    return conditional_response(
+        catalog_validators("products"),
+        lambda: render_template("products.html", page=cached_page("products", _render)),
+        private=current_user.is_authenticated,
+    )
 
 
 @main_bp.route("/product/<int:product_id>")
 def product_detail(product_id):
-    product = Product.query.options(
-        load_only(
-            Product.id,
-            Product.name,
-            Product.description,
-            Product.details,
-            Product.is_weight_based,
-            Product.price,
-            Product.is_frozen,
-            Product.is_discounted,
-            Product.supplier_name,
-            Product.image_url,
-            Product.tags,
-            Product.category_id,
-        )
-    ).get_or_404(product_id)
-    return render_template("product_detail.html", product=product)
+    def _render():
+        product = Product.query.options(
+            load_only(
+                Product.id,
+                Product.name,
+                Product.description,
+                Product.details,
+                Product.is_weight_based,
+                Product.price,
+                Product.is_frozen,
+                Product.is_discounted,
+                Product.supplier_name,
+                Product.image_url,
+                Product.image_variants,
+                Product.tags,
+                Product.category_id,
+            )
+        ).get_or_404(product_id)
+        return {"title": product.name, "html": render_template("catalog/product_detail.html", product=product)}
+
+    return conditional_response(
+        catalog_validators("product", product_id),
+        lambda: render_template("product_detail.html", page=cached_page(f"product:{product_id}", _render)),
+        private=current_user.is_authenticated,
+    )
 
 
 @main_bp.route("/category/<int:category_id>")
 def category_view(category_id):
-    category = Category.query.get_or_404(category_id)
-    products = Product.query.options(
-        load_only(
-            Product.id,
-            Product.name,
-            Product.price,
-            Product.supplier_name,
-            Product.image_url,
-            Product.category_id,
-            Product.is_weight_based,
-        )
-    ).filter_by(category_id=category.id).all()
-    return render_template("category.html", category=category, products=products)
+    def _render():
+        category = Category.query.get_or_404(category_id)
+        products = Product.query.options(
+            load_only(
+                Product.id,
+                Product.name,
+                Product.price,
+                Product.supplier_name,
+                Product.image_url,
+                Product.image_variants,
+                Product.category_id,
+                Product.is_weight_based,
+            )
+        ).filter_by(category_id=category.id).all()
+        return {
+            "title": category.name,
+            "html": render_template("catalog/category.html", category=category, products=products),
+        }
+
+    return conditional_response(
+        catalog_validators("category", category_id),
+        lambda: render_template("category.html", page=cached_page(f"category:{category_id}", _render)),
+        private=current_user.is_authenticated,
+    )
+
+
+@main_bp.route("/search")
+def search():
+    q = (request.args.get("q") or "").strip()
+    page = request.args.get("page", 1, type=int)
+    results = search_products(q, page=page)
+    return render_template("search.html", results=results, q=q)
+
+
+@main_bp.route("/search.json")
+def search_json():
+    q = (request.args.get("q") or "").strip()
+    page = request.args.get("page", 1, type=int)
+    per_page = min(request.args.get("per_page", SEARCH_PER_PAGE, type=int), 100)
+    results = search_products(q, page=page, per_page=max(1, per_page))
+    return jsonify({
+        "ok": True,
+        "q": results.q,
+        "page": results.page,
+        "pages": results.pages,
+        "total": results.total,
+        "products": [
+            {
+                "id": product.id,
+                "name": product.name,
+                "price": str(product.price),
+                "supplier_name": product.supplier_name,
+                "image_url": image_src(product, 320) or None,
+                "category_id": product.category_id,
+                "is_weight_based": bool(product.is_weight_based),
+                "url": url_for("main.product_detail", product_id=product.id),
+            }
+            for product in results.items
+        ],
+    })
 
 
 # -----------------------
@@ -397,207 +543,114 @@ def category_view(category_id):
 @admin_bp.route("/")
 @admin_required
 def dashboard():
-    today = date.today()
-    soon_border = today + timedelta(days=3)
+    metrics = dashboard_metrics()
+    return render_template("admin/dashboard.html", metrics=metrics, recent_sales=metrics.recent_sales)
 
-    expired_batches = Batch.query.filter(Batch.expires_at < today).count()
-    expiring_batches = Batch.query.filter(Batch.expires_at >= today, Batch.expires_at <= soon_border).count()
-    stock_products = db.session.query(Batch.product_id).distinct().count()
-    today_sales = Sale.query.filter(db.func.date(Sale.created_at) == today).count()
 
-    recent_sales = (
-        Sale.query
-        .order_by(Sale.created_at.desc())
-        .limit(7)
+@admin_bp.route("/backup", methods=["GET"])
+@admin_required
+def admin_backup_page():
+    jobs = (
+        Job.query
+        .filter(Job.kind.in_(["backup_export", "backup_restore"]))
+        .order_by(Job.created_at.desc(), Job.id.desc())
+        .limit(10)
         .all()
     )
+    return render_template("admin/backup.html", jobs=jobs)
 
-    return render_template(
-        "admin/dashboard.html",
-        today_sales=today_sales,
-        expired_batches=expired_batches,
-        expiring_batches=expiring_batches,
-        stock_products=stock_products,
-        recent_sales=recent_sales,
-    )
 
-
-@admin_bp.route("/backup", methods=["GET"])
-@admin_required
-def admin_backup_page():
-    return render_template("admin/backup.html")
+def _parse_since(since_raw):
+    since_raw = (since_raw or "").strip()
+    return parse_watermark(since_raw) if since_raw else None
 
 
 @admin_bp.route("/backup/download", methods=["GET"])
 @admin_required
 def admin_backup_download():
-    backup_data = {
-        "meta": {
-            "created_at": date.today().isoformat(),
-            "app": "Farmer_store"
-        },
-        "categories": [
-            {"id": c.id, "name": c.name, "image_url": c.image_url}
-            for c in Category.query.order_by(Category.id.asc()).all()
-        ],
-        "products": [
-            {
-                "id": p.id,
-                "name": p.name,
-                "description": p.description,
-                "details": p.details,
-                "is_weight_based": p.is_weight_based,
-                "price": str(p.price),
-                "is_frozen": p.is_frozen,
-                "is_discounted": p.is_discounted,
-                "supplier_name": p.supplier_name,
-                "image_url": p.image_url,
-                "tags": p.tags,
-                "shelf_life_days": p.shelf_life_days,
-                "category_id": p.category_id,
-            }
-            for p in Product.query.order_by(Product.id.asc()).all()
-        ],
-        "batches": [
-            {
-                "id": b.id,
-                "product_id": b.product_id,
-                "quantity": str(b.quantity),
-                "produced_at": b.produced_at.isoformat(),
-                "expires_at": b.expires_at.isoformat(),
-            }
-            for b in Batch.query.order_by(Batch.id.asc()).all()
-        ],
-        "write_offs": [
-            {
-                "id": w.id,
-                "product_id": w.product_id,
-                "quantity": str(w.quantity),
-                "reason": w.reason,
-                "created_at": w.created_at.isoformat() if w.created_at else None,
-            }
-            for w in WriteOff.query.order_by(WriteOff.id.asc()).all()
-        ],
-        "sales": [
-            {
-                "id": s.id,
-                "created_at": s.created_at.isoformat() if s.created_at else None,
-                "items": [
-                    {
-                        "id": i.id,
-                        "product_id": i.product_id,
-                        "quantity": str(i.quantity),
-                        "unit_price": str(i.unit_price),
-                        "line_total": str(i.line_total),
-                        "source_produced_at": i.source_produced_at.isoformat() if i.source_produced_at else None,
-                    }
-                    for i in s.items
-                ]
-            }
-            for s in Sale.query.order_by(Sale.id.asc()).all()
-        ]
-    }
+    # потоковая выгрузка прямо в ответ (для скриптов); из интерфейса — через фоновую задачу
+    try:
+        since = _parse_since(request.args.get("since"))
+    except ValueError:
+        flash("Некорректный водяной знак для инкрементальной копии", "danger")
+        return redirect(url_for("admin.admin_backup_page"))
 
-    payload = json.dumps(backup_data, ensure_ascii=False, indent=2)
-    buffer = BytesIO(payload.encode("utf-8"))
-    filename = f"farmer_store_backup_{date.today().strftime('%Y%m%d')}.json"
+    kind = "incremental" if since else "full"
+    filename = f"farmer_store_backup_{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
+    return Response(
+        stream_with_context(iter_backup_gzip(iter_backup_records(since))),
+        mimetype="application/gzip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=filename,
-        mimetype="application/json",
+
+@admin_bp.route("/backup/export", methods=["POST"])
+@admin_required
+def admin_backup_export():
+    try:
+        since = _parse_since(request.form.get("since"))
+    except ValueError:
+        flash("Некорректный водяной знак для инкрементальной копии", "danger")
+        return redirect(url_for("admin.admin_backup_page"))
+
+    kind = "incremental" if since else "full"
+    folder = current_app.config["JOBS_FOLDER"]
+    os.makedirs(folder, exist_ok=True)
+    out_path = os.path.join(
+        folder, f"farmer_store_backup_{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
     )
 
+    job = enqueue("backup_export", export_backup_job, out_path, since, user_id=current_user.id)
+    flash(f"Выгрузка поставлена в очередь (задача #{job.id})", "info")
+    return redirect(url_for("admin.admin_backup_page"))
+
 
 @admin_bp.route("/backup/upload", methods=["POST"])
 @admin_required
 def admin_backup_upload():
-    file = request.files.get("backup_file")
-    if not file or not getattr(file, "filename", ""):
-        flash("Выберите JSON-файл для восстановления", "warning")
+    files = [f for f in request.files.getlist("backup_file") if getattr(f, "filename", "")]
+    if not files:
+        flash("Выберите файл резервной копии для восстановления", "warning")
         return redirect(url_for("admin.admin_backup_page"))
 
-    try:
-        payload = json.load(file)
-    except Exception:
-        flash("Не удалось прочитать JSON-файл", "danger")
-        return redirect(url_for("admin.admin_backup_page"))
+    # загрузки сохраняем на диск: поток запроса закроется раньше, чем задача дойдёт до них
+    folder = os.path.join(current_app.config["JOBS_FOLDER"], "uploads")
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for f in files:
+        path = os.path.join(folder, f"{uuid4().hex}.backup")
+        f.save(path)
+        paths.append(path)
+
+    job = enqueue(
+        "backup_restore", restore_backup_job, paths,
+        chunk_size=current_app.config["BACKUP_RESTORE_CHUNK"],
+        user_id=current_user.id,
+    )
+    flash(f"Восстановление поставлено в очередь (задача #{job.id})", "info")
+    return redirect(url_for("admin.admin_backup_page"))
 
-    required_keys = {"categories", "products", "batches", "write_offs", "sales"}
-    if not required_keys.issubset(set(payload.keys())):
-        flash("Неверный формат резервной копии", "danger")
-        return redirect(url_for("admin.admin_backup_page"))
 
-    try:
-        SaleItem.query.delete()
-        Sale.query.delete()
-        WriteOff.query.delete()
-        Batch.query.delete()
-        Product.query.delete()
-        Category.query.delete()
-
-        for c in payload["categories"]:
-            db.session.add(Category(id=c["id"], name=c["name"], image_url=c.get("image_url")))
-
-        for p in payload["products"]:
-            db.session.add(Product(
-                id=p["id"],
-                name=p["name"],
-                description=p.get("description"),
-                details=p.get("details"),
-                is_weight_based=bool(p.get("is_weight_based", False)),
-                price=Decimal(str(p["price"])),
-                is_frozen=bool(p.get("is_frozen", False)),
-                is_discounted=bool(p.get("is_discounted", False)),
-                supplier_name=p.get("supplier_name"),
-                image_url=p.get("image_url"),
-                tags=p.get("tags"),
-                shelf_life_days=int(p.get("shelf_life_days", 7)),
-                category_id=p.get("category_id"),
-            ))
-
-        for b in payload["batches"]:
-            db.session.add(Batch(
-                id=b["id"],
-                product_id=b["product_id"],
-                quantity=Decimal(str(b["quantity"])),
-                produced_at=date.fromisoformat(b["produced_at"]),
-                expires_at=date.fromisoformat(b["expires_at"]),
-            ))
-
-        for w in payload["write_offs"]:
-            db.session.add(WriteOff(
-                id=w["id"],
-                product_id=w["product_id"],
-                quantity=Decimal(str(w["quantity"])),
-                reason=w["reason"],
-            ))
-
-        for s in payload["sales"]:
-            sale = Sale(id=s["id"])
-            db.session.add(sale)
-            db.session.flush()
-
-            for i in s.get("items", []):
-                db.session.add(SaleItem(
-                    id=i["id"],
-                    sale_id=sale.id,
-                    product_id=i["product_id"],
-                    quantity=Decimal(str(i["quantity"])),
-                    unit_price=Decimal(str(i["unit_price"])),
-                    line_total=Decimal(str(i["line_total"])),
-                    source_produced_at=date.fromisoformat(i["source_produced_at"]) if i.get("source_produced_at") else None,
-                ))
+@admin_bp.route("/jobs/<int:job_id>")
+@admin_required
+def admin_job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    return jsonify({"ok": True, "job": job.to_dict()})
 
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        flash("Ошибка восстановления. Проверьте корректность файла.", "danger")
-        return redirect(url_for("admin.admin_backup_page"))
 
-    flash("Резервная копия успешно восстановлена", "success")
-    return redirect(url_for("admin.dashboard"))
+@admin_bp.route("/jobs/<int:job_id>/download")
+@admin_required
+def admin_job_download(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.status != "done" or not job.result_path or not os.path.exists(job.result_path):
+        abort(404)
+    return send_file(job.result_path, as_attachment=True, download_name=os.path.basename(job.result_path))
+
+
+@admin_bp.route("/cache-stats")
+@admin_required
+def admin_cache_stats():
+    return jsonify({"ok": True, "page_cache": cache_stats()})
 
 
 # ---- Products CRUD ----
@@ -609,7 +662,7 @@ def admin_products():
 
     query = Product.query
     if q:
-        query = query.filter(Product.name.ilike(f"%{q}%"))
+        query = query.filter(product_search_filter(q))
     if category_id.isdigit():
         query = query.filter(Product.category_id == int(category_id))
 
@@ -625,6 +678,30 @@ def admin_products():
     )
 
 
+def _product_codes(form, product_id=None):
+    """(barcode, plu) из формы или сообщение об ошибке, если код уже занят другим товаром."""
+    barcode = "".join((form.barcode.data or "").split()) or None
+    plu = normalize_plu(form.plu.data)
+
+    if barcode:
+        taken = Product.query.filter(Product.barcode == barcode, Product.id != product_id).first()
+        if taken:
+            return None, None, f"Штрихкод уже у товара «{taken.name}»"
+    if plu:
+        taken = Product.query.filter(Product.plu == plu, Product.id != product_id).first()
+        if taken:
+            return None, None, f"PLU уже у товара «{taken.name}»"
+    return barcode, plu, None
+
+
+@admin_bp.route("/products/typeahead")
+@admin_required
+def admin_products_typeahead():
+    q = (request.args.get("q") or "").strip()
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 50)
+    return jsonify({"ok": True, "q": q, "products": [e.to_dict() for e in typeahead_search(q, limit=limit)]})
+
+
 @admin_bp.route("/products/new", methods=["GET", "POST"])
 @admin_required
 def product_create():
@@ -634,6 +711,11 @@ def product_create():
     form.category_id.choices = [(0, "— Без категории —")] + [(c.id, c.name) for c in categories]
 
     if form.validate_on_submit():
+        barcode, plu, error = _product_codes(form)
+        if error:
+            flash(error, "warning")
+            return render_template("admin/products/form.html", form=form, mode="create")
+
         image_url = ""
 
         if form.image.data and getattr(form.image.data, "filename", ""):
@@ -649,19 +731,21 @@ def product_create():
             details=form.details.data,
             is_weight_based=form.is_weight_based.data,
             price=form.price.data,
-            min_weight=form.min_weight.data,
-            max_weight=form.max_weight.data,
             is_frozen=form.is_frozen.data,
             is_discounted=form.is_discounted.data,
             supplier_name=form.supplier_name.data,
             tags=form.tags.data,
             category_id=None if form.category_id.data == 0 else form.category_id.data,
+            barcode=barcode,
+            plu=plu,
             image_url=image_url or None,
             # ✅ новое поле
             shelf_life_days=form.shelf_life_days.data
         )
         db.session.add(product)
+        bump_catalog_version()
         db.session.commit()
+        enqueue_variants(product)
         flash("Товар создан", "success")
         return redirect(url_for("admin.admin_products"))
 
@@ -688,6 +772,11 @@ def product_edit(product_id):
         form.category_id.data = product.category_id or 0
 
     if form.validate_on_submit():
+        barcode, plu, error = _product_codes(form, product.id)
+        if error:
+            flash(error, "warning")
+            return render_template("admin/products/form.html", form=form, mode="edit", product=product)
+
         product.name = form.name.data
         product.description = form.description.data
         product.details = form.details.data
@@ -698,17 +787,25 @@ def product_edit(product_id):
         product.supplier_name = form.supplier_name.data
         product.tags = form.tags.data
         product.category_id = None if form.category_id.data == 0 else form.category_id.data
+        product.barcode = barcode
+        product.plu = plu
         # ✅ новое поле
         product.shelf_life_days = form.shelf_life_days.data
 
+        image_changed = False
         if form.image.data and getattr(form.image.data, "filename", ""):
             try:
                 product.image_url = save_product_image(form.image.data)
+                product.image_variants = None
+                image_changed = True
             except ValueError as e:
                 flash(str(e), "danger")
                 return render_template("admin/products/form.html", form=form, mode="edit", product=product)
 
+        bump_catalog_version()
         db.session.commit()
+        if image_changed:
+            enqueue_variants(product)
         flash("Товар обновлён", "success")
         return redirect(url_for("admin.product_view", product_id=product.id))
 
@@ -720,6 +817,7 @@ def product_edit(product_id):
 def product_delete(product_id):
     product = Product.query.get_or_404(product_id)
     db.session.delete(product)
+    bump_catalog_version()
     db.session.commit()
     flash("Товар удалён", "info")
     return redirect(url_for("admin.admin_products"))
@@ -756,7 +854,9 @@ def category_create():
 
         c = Category(name=name, image_url=image_url or None)
         db.session.add(c)
+        bump_catalog_version()
         db.session.commit()
+        enqueue_variants(c)
         flash("Категория создана", "success")
         return redirect(url_for("admin.admin_categories"))
 
@@ -779,14 +879,20 @@ def category_edit(category_id):
 
         category.name = name
 
+        image_changed = False
         if form.image.data and getattr(form.image.data, "filename", ""):
             try:
                 category.image_url = save_category_image(form.image.data)
+                category.image_variants = None
+                image_changed = True
             except ValueError as e:
                 flash(str(e), "danger")
                 return render_template("admin/categories/form.html", form=form, mode="edit", category=category)
 
+        bump_catalog_version()
         db.session.commit()
+        if image_changed:
+            enqueue_variants(category)
         flash("Категория обновлена", "success")
         return redirect(url_for("admin.admin_categories"))
 
@@ -804,6 +910,7 @@ def category_delete(category_id):
         return redirect(url_for("admin.admin_categories"))
 
     db.session.delete(category)
+    bump_catalog_version()
     db.session.commit()
     flash("Категория удалена", "info")
     return redirect(url_for("admin.admin_categories"))
@@ -814,16 +921,21 @@ def category_delete(category_id):
 @admin_bp.route("/orders")
 @admin_required
 def admin_orders():
-    orders = Preorder.query.order_by(Preorder.created_at.desc(), Preorder.id.desc()).all()
-
-    for order in orders:
-        for item in order.items:
-            item._qty_display = format_preorder_qty(item)
+    active_after = (request.args.get("active_after") or "").strip()
+    archived_after = (request.args.get("after") or "").strip()
 
-    active_orders = [o for o in orders if o.status == "active"]
-    archived_orders = [o for o in orders if o.status != "active"]
+    active_orders, active_next = orders_page(active_filter(), after=active_after, with_user=True)
+    archived_orders, archived_next = orders_page(archived_filter(), after=archived_after, with_user=True)
 
-    return render_template("admin/orders/index.html", active_orders=active_orders, archived_orders=archived_orders)
+    return render_template(
+        "admin/orders/index.html",
+        active_orders=active_orders,
+        archived_orders=archived_orders,
+        active_after=active_after,
+        active_next=active_next,
+        archived_after=archived_after,
+        archived_next=archived_next,
+    )
 
 
 @admin_bp.route("/orders/<int:order_id>/complete", methods=["POST"])
@@ -834,6 +946,13 @@ def admin_order_complete(order_id):
         flash("Выдать можно только активный заказ", "warning")
         return redirect(url_for("admin.admin_orders"))
 
+    try:
+        consume(order)
+    except InsufficientStock as e:
+        db.session.rollback()
+        flash(f"Заказ #{order_id} не выдан: {e}", "danger")
+        return redirect(url_for("admin.admin_orders"))
+
     order.mark_completed()
     db.session.commit()
     flash(f"Заказ #{order.id} выдан", "success")
@@ -853,15 +972,98 @@ def admin_order_cancel(order_id):
         flash("Укажите причину отмены", "danger")
         return redirect(url_for("admin.admin_orders"))
 
+    release(order.id)
+    pickup.release(order.pickup_slot_id)
     order.mark_cancelled(reason)
     db.session.commit()
     flash(f"Заказ #{order.id} отменён", "info")
     return redirect(url_for("admin.admin_orders"))
 
 
+# ✅ Лист сборки: сколько чего собрать к дню получения и чего не хватает
+def _pick_list_day():
+    try:
+        return date.fromisoformat(request.args.get("day") or "")
+    except ValueError:
+        return date.today()
+
+
+@admin_bp.route("/pick-list")
+@admin_required
+def admin_pick_list():
+    day = _pick_list_day()
+    by_slot = request.args.get("by_slot") == "1"
+    return render_template("admin/orders/pick_list.html", pick=pick_list(day), day=day, by_slot=by_slot)
+
+
+@admin_bp.route("/pick-list.csv")
+@admin_required
+def admin_pick_list_csv():
+    day = _pick_list_day()
+    by_slot = request.args.get("by_slot") == "1"
+    filename = f"pick_list_{day.isoformat()}{'_by_slot' if by_slot else ''}.csv"
+    return Response(
+        pick_list_csv(pick_list(day), by_slot=by_slot),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+# ✅ Слоты самовывоза: занятость и вместимость по дню
+@admin_bp.route("/pickup-slots")
+@admin_required
+def admin_pickup_slots():
+    first, last = pickup.booking_window()
+    try:
+        day = date.fromisoformat(request.args.get("day") or "")
+    except ValueError:
+        day = first
+
+    return render_template(
+        "admin/pickup/slots.html",
+        day=day,
+        slots=pickup.day_slots(day),
+        days=[first + timedelta(days=i) for i in range((last - first).days + 1)],
+    )
+
+
+@admin_bp.route("/pickup-slots/capacity", methods=["POST"])
+@admin_required
+def admin_pickup_slot_capacity():
+    try:
+        day = date.fromisoformat(request.form.get("day") or "")
+        capacity = int(request.form.get("capacity") or "")
+    except ValueError:
+        flash("Некорректные данные слота", "danger")
+        return redirect(url_for("admin.admin_pickup_slots"))
+
+    starts_at = (request.form.get("starts_at") or "").strip()
+    if starts_at not in pickup.slot_times():
+        flash("Такого слота нет в расписании", "danger")
+        return redirect(url_for("admin.admin_pickup_slots", day=day.isoformat()))
+
+    try:
+        pickup.set_capacity(day, starts_at, capacity)
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), "danger")
+    else:
+        db.session.commit()
+        flash(f"Слот {starts_at}: вместимость {capacity}", "success")
+    return redirect(url_for("admin.admin_pickup_slots", day=day.isoformat()))
+
+
 # -----------------------
 # ✅ Supply (Поставка)
 # -----------------------
+@admin_bp.route("/terminal", methods=["POST"])
+@admin_required
+def admin_set_terminal():
+    name = set_terminal(request.form.get("terminal"))
+    flash(f"Терминал: {name}", "info")
+    return redirect(request.referrer or url_for("admin.admin_sales"))
+
+
 @admin_bp.route("/supply", methods=["GET"])
 @admin_required
 def admin_supply():
@@ -869,13 +1071,7 @@ def admin_supply():
     products = []
 
     if q:
-        products = (
-            Product.query
-            .filter(Product.name.ilike(f"%{q}%"))
-            .order_by(Product.name.asc())
-            .limit(25)
-            .all()
-        )
+        products = search_products(q, per_page=25).items
 
     lines = _supply_lines()
 
@@ -926,38 +1122,18 @@ def admin_supply_add():
         flash("Количество должно быть больше 0", "danger")
         return redirect(url_for("admin.admin_supply"))
 
-    lines = _supply_lines()
-
     # если уже есть такая же позиция (тот же товар + та же дата изготовления) — просто суммируем
-    key_prod = int(product.id)
-    key_date = produced_at.isoformat()
-
-    merged = False
-    for line in lines:
-        if int(line["product_id"]) == key_prod and line.get("produced_at") == key_date:
-            line["qty"] = str(Decimal(line["qty"]) + qty)
-            merged = True
-            break
-
-    if not merged:
-        lines.append({
-            "product_id": key_prod,
-            "qty": str(qty),
-            "produced_at": key_date
-        })
-
-    _save_supply_lines(lines)
+    add_draft_line("supply", product.id, qty, produced_at)
+    db.session.commit()
     flash(f"Добавлено в поставку: {product.name}", "success")
     return redirect(url_for("admin.admin_supply", q=request.form.get("q", "")))
 
 
-@admin_bp.route("/supply/remove/<int:idx>", methods=["POST"])
+@admin_bp.route("/supply/remove/<int:line_id>", methods=["POST"])
 @admin_required
-def admin_supply_remove(idx):
-    lines = _supply_lines()
-    if 0 <= idx < len(lines):
-        lines.pop(idx)
-        _save_supply_lines(lines)
+def admin_supply_remove(line_id):
+    if remove_draft_line("supply", line_id):
+        db.session.commit()
         flash("Позиция удалена из поставки", "info")
     return redirect(url_for("admin.admin_supply"))
 
@@ -965,7 +1141,8 @@ def admin_supply_remove(idx):
 @admin_bp.route("/supply/clear", methods=["POST"])
 @admin_required
 def admin_supply_clear():
-    _clear_supply_lines()
+    clear_draft_lines("supply")
+    db.session.commit()
     flash("Список поставки очищен", "info")
     return redirect(url_for("admin.admin_supply"))
 
@@ -995,9 +1172,10 @@ def admin_supply_confirm():
             expires_at=expires_at
         )
         db.session.add(b)
+        adjust_stock(product.id, expires_at, qty)
 
+    clear_draft_lines("supply")
     db.session.commit()
-    _clear_supply_lines()
     flash("Поставка подтверждена: партии добавлены на склад", "success")
     return redirect(url_for("admin.admin_batches"))
 
@@ -1023,7 +1201,7 @@ def admin_batches():
     query = Batch.query.join(Product)
 
     if q:
-        query = query.filter(Product.name.ilike(f"%{q}%"))
+        query = query.filter(product_search_filter(q))
 
 
     if status == "expired":
@@ -1044,10 +1222,13 @@ def admin_batches():
             batch._status = "active"
 
         qty = Decimal(str(batch.quantity))
+        reserved = Decimal(str(batch.reserved or 0))
         if batch.product.is_weight_based:
             batch._qty_display = format(qty.normalize(), "f").rstrip("0").rstrip(".")
+            batch._reserved_display = format(reserved.normalize(), "f").rstrip("0").rstrip(".") if reserved else ""
         else:
             batch._qty_display = str(int(qty))
+            batch._reserved_display = str(int(reserved)) if reserved else ""
 
 
     return render_template(
@@ -1077,10 +1258,18 @@ def admin_batch_writeoff(batch_id):
     )
 
     db.session.add(entry)
+    moved = release_batch(batch)
+    adjust_stock(batch.product_id, batch.expires_at, -Decimal(str(batch.quantity)))
     db.session.delete(batch)
+    unreserved = rereserve(moved)
     db.session.commit()
 
     flash("Партия списана и сохранена в журнале списаний", "success")
+    if unreserved:
+        flash(
+            "Не хватает остатка под заказы: " + ", ".join(f"#{order_id}" for order_id in unreserved),
+            "warning",
+        )
     return redirect(url_for("admin.admin_batches"))
 
 
@@ -1094,51 +1283,21 @@ def admin_sales():
     products = []
 
     if q:
-        products = (
-            Product.query
-            .filter(Product.name.ilike(f"%{q}%"))
-            .order_by(Product.name.asc())
-            .limit(25)
-            .all()
-        )
+        products = search_products(q, per_page=25).items
 
-    lines = _sales_lines()
-    product_map = {}
-    available_map = {}
-
-    if lines:
-        ids = [int(x["product_id"]) for x in lines]
-        product_map = {p.id: p for p in Product.query.filter(Product.id.in_(ids)).all()}
-
-    today = date.today()
-    all_products = Product.query.all()
-    for product in all_products:
-        available_qty = (
-            db.session.query(db.func.coalesce(db.func.sum(Batch.quantity), 0))
-            .filter(Batch.product_id == product.id, Batch.expires_at >= today)
-            .scalar()
-        )
-        available_map[product.id] = Decimal(str(available_qty or 0))
+    # строки черновика с товарами — один JOIN; остатки — один запрос к счётчикам
+    cart_state = cart.quote()
+    available_map = stock_available_map()
 
     add_form = SalesAddLineForm()
 
-    line_total_sum = Decimal("0.00")
-    for line in lines:
-        product = product_map.get(int(line["product_id"]))
-        if not product:
-            continue
-        qty = Decimal(line["qty"])
-        line_total_sum += qty * Decimal(str(product.price))
-
     return render_template(
         "admin/sales/index.html",
         q=q,
         products=products,
-        lines=lines,
-        product_map=product_map,
+        cart=cart_state,
         available_map=available_map,
         add_form=add_form,
-        line_total_sum=line_total_sum
     )
 
 
@@ -1167,118 +1326,184 @@ def admin_sales_add():
         flash("Количество должно быть больше 0", "danger")
         return redirect(url_for("admin.admin_sales"))
 
-    lines = _sales_lines()
-    key_prod = int(product.id)
-
-    merged = False
-    for line in lines:
-        if int(line["product_id"]) == key_prod:
-            line["qty"] = str(Decimal(line["qty"]) + qty)
-            merged = True
-            break
-
-    if not merged:
-        lines.append({
-            "product_id": key_prod,
-            "qty": str(qty)
-        })
-
-    _save_sales_lines(lines)
+    add_draft_line("sales", product.id, qty)
+    db.session.commit()
     flash(f"Добавлено в продажу: {product.name}", "success")
     return redirect(url_for("admin.admin_sales", q=request.form.get("q", "")))
 
 
-@admin_bp.route("/sales/remove/<int:idx>", methods=["POST"])
+@admin_bp.route("/sales/scan", methods=["POST"])
 @admin_required
-def admin_sales_remove(idx):
-    lines = _sales_lines()
-    if 0 <= idx < len(lines):
-        lines.pop(idx)
-        _save_sales_lines(lines)
-        flash("Позиция удалена из продажи", "info")
+@json_csrf_exempt
+def admin_sales_scan():
+    """Штрихкод/PLU/весовой EAN-13 -> строка черновика продажи за один запрос."""
+    payload = request.get_json(silent=True) or request.form
+    wants_json = request.is_json or request.accept_mimetypes.best == "application/json"
+
+    def _fail(message, status=400):
+        if wants_json:
+            return jsonify({"ok": False, "error": message}), status
+        flash(message, "danger")
+        return redirect(url_for("admin.admin_sales"))
+
+    try:
+        scan = parse_code(payload.get("code"))
+        quantity = payload.get("quantity") or None
+        if quantity is not None:
+            quantity = Decimal(str(quantity).replace(",", "."))
+    except (ValueError, ArithmeticError) as e:
+        return _fail(str(e) if isinstance(e, ValueError) else "Некорректное количество")
+
+    product = find_product(scan)
+    if not product:
+        return _fail(f"Товар с кодом {scan.code} не найден", 404)
+
+    try:
+        qty = scan_quantity(product, scan, quantity)
+    except ValueError as e:
+        return _fail(str(e))
+    if qty <= 0:
+        return _fail("Количество должно быть больше 0")
+
+    state = cart.add(product.id, qty)
+    db.session.commit()
+
+    if wants_json:
+        state.update({
+            "product": {"id": product.id, "name": product.name, "price": str(product.price)},
+            "quantity": str(qty),
+            "embedded": scan.is_embedded,
+        })
+        return jsonify(state)
+    flash(f"Добавлено в продажу: {product.name} × {qty}", "success")
     return redirect(url_for("admin.admin_sales"))
 
 
-@admin_bp.route("/sales/clear", methods=["POST"])
+# ---- JSON-корзина кассы (страница продажи обновляется без перерисовки) ----
+def _cart_qty(payload):
+    try:
+        qty = Decimal(str(payload.get("quantity", "")).replace(",", "."))
+    except ArithmeticError:
+        return None
+    return qty if qty.is_finite() and qty > 0 else None
+
+
+@admin_bp.route("/sales/cart", methods=["GET"])
 @admin_required
-def admin_sales_clear():
-    _clear_sales_lines()
-    flash("Список продажи очищен", "info")
-    return redirect(url_for("admin.admin_sales"))
+def admin_cart_quote():
+    return jsonify(cart.quote())
 
 
-@admin_bp.route("/sales/confirm", methods=["POST"])
+@admin_bp.route("/sales/cart/lines", methods=["POST"])
 @admin_required
-def admin_sales_confirm():
-    lines = _sales_lines()
-    if not lines:
-        flash("Список продажи пуст", "warning")
-        return redirect(url_for("admin.admin_sales"))
+def admin_cart_add():
+    payload = request.get_json(silent=True) or {}
+    product = db.session.get(Product, payload.get("product_id")) if str(payload.get("product_id", "")).isdigit() else None
+    if not product:
+        return jsonify({"ok": False, "error": "Сначала выбери товар"}), 400
+    qty = _cart_qty(payload)
+    if qty is None:
+        return jsonify({"ok": False, "error": "Количество должно быть больше 0"}), 400
+
+    state = cart.add(product.id, qty)
+    db.session.commit()
+    return jsonify(state)
 
-    today = date.today()
-    sale = Sale()
-    db.session.add(sale)
 
-    for line in lines:
-        product = Product.query.get(int(line["product_id"]))
-        if not product:
-            continue
+@admin_bp.route("/sales/cart/lines/<int:line_id>", methods=["PATCH"])
+@admin_required
+def admin_cart_update(line_id):
+    qty = _cart_qty(request.get_json(silent=True) or {})
+    if qty is None:
+        return jsonify({"ok": False, "error": "Количество должно быть больше 0"}), 400
+
+    state = cart.update(line_id, qty)
+    if state is None:
+        return jsonify({"ok": False, "error": "Позиция не найдена"}), 404
+    db.session.commit()
+    return jsonify(state)
 
-        need_qty = Decimal(line["qty"])
-        if need_qty <= 0:
-            continue
 
-        batches = (
-            Batch.query
-            .filter(Batch.product_id == product.id, Batch.expires_at >= today)
-            .order_by(Batch.produced_at.asc(), Batch.id.asc())
-            .all()
-        )
+@admin_bp.route("/sales/cart/lines/<int:line_id>", methods=["DELETE"])
+@admin_required
+def admin_cart_remove(line_id):
+    state = cart.remove(line_id)
+    if state is None:
+        return jsonify({"ok": False, "error": "Позиция не найдена"}), 404
+    db.session.commit()
+    return jsonify(state)
 
-        available_qty = sum((Decimal(str(b.quantity)) for b in batches), Decimal("0"))
-        if available_qty < need_qty:
-            db.session.rollback()
-            flash(f"Недостаточно остатков для товара '{product.name}'. Доступно: {available_qty}", "danger")
-            return redirect(url_for("admin.admin_sales"))
 
-        remains = need_qty
-        source_produced_at = batches[0].produced_at if batches else None
+@admin_bp.route("/sales/cart/confirm", methods=["POST"])
+@admin_required
+def admin_cart_confirm():
+    try:
+        sale = confirm_sale()
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": str(e), "product_id": e.product.id}), 409
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": str(e)}), 400
 
-        for batch in batches:
-            if remains <= 0:
-                break
+    db.session.commit()
+    return jsonify({
+        "ok": True,
+        "sale_id": sale.id,
+        "total": str(sale.total_amount),
+        "redirect": url_for("admin.admin_sales_history"),
+    })
+
+
+# ✅ Пакетная выгрузка продаж с кассы, работавшей без сети
+@admin_bp.route("/sales/ingest", methods=["POST"])
+@till_key_or_admin_required
+@json_csrf_exempt
+def admin_sales_ingest():
+    payload = request.get_json(silent=True)
+    try:
+        results = ingest_sales(payload)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": str(e)}), 400
 
-            batch_qty = Decimal(str(batch.quantity))
-            take_qty = batch_qty if batch_qty <= remains else remains
+    db.session.commit()
+    return jsonify({"ok": True, "summary": summarize_ingest(results), "results": results})
 
-            remains -= take_qty
-            new_qty = batch_qty - take_qty
 
-            if new_qty <= 0:
-                db.session.delete(batch)
-            else:
-                batch.quantity = new_qty
+@admin_bp.route("/sales/remove/<int:line_id>", methods=["POST"])
+@admin_required
+def admin_sales_remove(line_id):
+    if remove_draft_line("sales", line_id):
+        db.session.commit()
+        flash("Позиция удалена из продажи", "info")
+    return redirect(url_for("admin.admin_sales"))
 
-        unit_price = Decimal(str(product.price))
-        line_total = (unit_price * need_qty).quantize(Decimal("0.01"))
 
-        item = SaleItem(
-            sale=sale,
-            product_id=product.id,
-            quantity=need_qty,
-            unit_price=unit_price,
-            line_total=line_total,
-            source_produced_at=source_produced_at
-        )
-        db.session.add(item)
+@admin_bp.route("/sales/clear", methods=["POST"])
+@admin_required
+def admin_sales_clear():
+    clear_draft_lines("sales")
+    db.session.commit()
+    flash("Список продажи очищен", "info")
+    return redirect(url_for("admin.admin_sales"))
+
 
-    if not sale.items:
+@admin_bp.route("/sales/confirm", methods=["POST"])
+@admin_required
+def admin_sales_confirm():
+    try:
+        sale = confirm_sale()
+    except InsufficientStock as e:
+        db.session.rollback()
+        flash(str(e), "danger")
+        return redirect(url_for("admin.admin_sales"))
+    except ValueError as e:
         db.session.rollback()
-        flash("Не удалось сформировать продажу", "danger")
+        flash(str(e), "warning")
         return redirect(url_for("admin.admin_sales"))
 
     db.session.commit()
-    _clear_sales_lines()
     flash(f"Продажа №{sale.id} подтверждена", "success")
     return redirect(url_for("admin.admin_sales_history"))
 
@@ -1294,52 +1519,20 @@ def admin_sales_history():
     filter_form = SalesHistoryFilterForm(request.args)
 
     product_choices = [(0, "— Все товары —")] + [
-        (p.id, p.name) for p in Product.query.order_by(Product.name.asc()).all()
+        (pid, name) for pid, name in db.session.execute(
+            db.select(Product.id, Product.name).order_by(Product.name.asc())
+        ).all()
     ]
     filter_form.product_id.choices = product_choices
 
     selected_product_id = int(product_id_raw) if product_id_raw.isdigit() else 0
     filter_form.product_id.data = selected_product_id
 
-    start_date = None
-    end_date = None
-    today = date.today()
-
-    if period == "today":
-        start_date = today
-        end_date = today
-    elif period == "yesterday":
-        start_date = today - timedelta(days=1)
-        end_date = start_date
-    elif period == "week":
-        start_date = today - timedelta(days=6)
-        end_date = today
-    elif period == "month":
-        start_date = today - timedelta(days=29)
-        end_date = today
-    elif period == "custom":
-        try:
-            start_date = date.fromisoformat(start_date_raw) if start_date_raw else None
-        except ValueError:
-            start_date = None
-        try:
-            end_date = date.fromisoformat(end_date_raw) if end_date_raw else None
-        except ValueError:
-            end_date = None
-
-    query = SaleItem.query.join(Sale).join(Product)
-
-    if start_date:
-        query = query.filter(db.func.date(Sale.created_at) >= start_date)
-    if end_date:
-        query = query.filter(db.func.date(Sale.created_at) <= end_date)
-
-    if selected_product_id:
-        query = query.filter(SaleItem.product_id == selected_product_id)
-
-    items = query.order_by(Sale.created_at.desc(), SaleItem.id.desc()).all()
+    start_date, end_date = period_dates(period, start_date_raw, end_date_raw)
+    after = (request.args.get("after") or "").strip()
 
-    total_sum = sum((Decimal(str(item.line_total)) for item in items), Decimal("0.00"))
+    items, next_cursor = history_page(start_date, end_date, selected_product_id, after=after)
+    totals = history_totals(start_date, end_date, selected_product_id)
 
     for item in items:
         qty = Decimal(str(item.quantity))
@@ -1351,7 +1544,10 @@ def admin_sales_history():
     return render_template(
         "admin/sales/history.html",
         items=items,
-        total_sum=total_sum,
+        total_sum=totals.amount,
+        totals=totals,
+        next_cursor=next_cursor,
+        is_first_page=not after,
         period=period,
         start_date=start_date_raw,
         end_date=end_date_raw,
@@ -0,0 +1,236 @@
+"""
+Полнотекстовый поиск товаров (название, описание, теги, поставщик).
+
+Postgres: генерируемая колонка products.search_vector (tsvector, словарь russian) + GIN,
+плюс триграммный GIN по name (pg_trgm) — опечатки и подстроки ("%q%") тоже идут по индексу.
+SQLite: внешняя FTS5-таблица products_fts, синхронизируется триггерами.
+Обе схемы создаёт миграция; в БД, созданной через create_all, их создаёт `flask search-reindex`
+(повторный запуск безопасен). Пока индекса нет, поиск работает через ILIKE по названию.
+"""
+import re
+from dataclasses import dataclass, field
+
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Product
+
+MAX_TERMS = 8
+PER_PAGE = 20
+
+_SEARCH_VECTOR = db.literal_column("products.search_vector")
+
+SQLITE_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, tags, supplier_name, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, tags, supplier_name, description)
+        VALUES (new.id, new.name, new.tags, new.supplier_name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, tags, supplier_name, description)
+        VALUES ('delete', old.id, old.name, old.tags, old.supplier_name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, tags, supplier_name, description)
+        VALUES ('delete', old.id, old.name, old.tags, old.supplier_name, old.description);
+        INSERT INTO products_fts(rowid, name, tags, supplier_name, description)
+        VALUES (new.id, new.name, new.tags, new.supplier_name, new.description);
+    END
+    """,
+)
+
+# то же, что в миграции e2f3a4b5c6d7, но идемпотентно — для reindex()
+PG_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # генерируемая колонка: вес A — название, B — теги, C — поставщик, D — описание
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(supplier_name, '')), 'C') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+)
+
+PG_SEARCH_READY = """
+    SELECT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'products' AND column_name = 'search_vector'
+    ) AND EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+"""
+
+
+@dataclass
+class SearchPage:
+    q: str
+    page: int
+    per_page: int
+    total: int = 0
+    items: list = field(default_factory=list)
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+
+def _terms(q: str):
+    return re.findall(r"[^\W_]+", q or "")[:MAX_TERMS]
+
+
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+# -----------------------
+# Postgres
+# -----------------------
+def _pg_tsquery(terms):
+    # префиксный поиск по каждому слову: "мол сыр" -> мол:* & сыр:*
+    return db.func.to_tsquery(db.literal_column("'russian'"), " & ".join(f"{t}:*" for t in terms))
+
+
+def _pg_clause(q, terms):
+    return db.or_(
+        _SEARCH_VECTOR.op("@@")(_pg_tsquery(terms)),
+        Product.name.op("%")(q),                           # опечатки (similarity >= pg_trgm.similarity_threshold)
+        Product.name.ilike(_like_pattern(q), escape="\\"),  # подстрока — тот же trgm-индекс
+    )
+
+
+def _pg_rank(q, terms):
+    return db.func.ts_rank_cd(_SEARCH_VECTOR, _pg_tsquery(terms)) + db.func.similarity(Product.name, q)
+
+
+# -----------------------
+# SQLite FTS5
+# -----------------------
+def _fts_match(terms):
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def _sqlite_ids_subquery(terms):
+    return db.text("SELECT rowid FROM products_fts WHERE products_fts MATCH :fts_q").bindparams(
+        fts_q=_fts_match(terms)
+    )
+
+
+def _sqlite_ranked(terms):
+    # один проход по FTS: id и bm25 всех совпадений (меньше — лучше; веса name, tags, supplier_name,
+    # description). Коррелированный подзапрос с MATCH на каждую строку products стоил бы O(совпадений²)
+    return db.text(
+        "SELECT rowid AS id, bm25(products_fts, 10.0, 4.0, 2.0, 1.0) AS rank"
+        " FROM products_fts WHERE products_fts MATCH :fts_rank_q"
+    ).bindparams(fts_rank_q=_fts_match(terms)).columns(id=db.Integer, rank=db.Float).subquery("fts")
+
+
+def ensure_sqlite_index(rebuild=True):
+    for ddl in SQLITE_FTS_DDL:
+        db.session.execute(db.text(ddl))
+    if rebuild:
+        db.session.execute(db.text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+
+
+# -----------------------
+# Публичное API
+# -----------------------
+def search_filter(q):
+    """WHERE-условие для уже существующего запроса по Product (порядок остаётся за вызывающим)."""
+    terms = _terms(q)
+    if not terms:
+        return db.false()
+    dialect = _dialect()
+    if dialect == "postgresql" and _index_ready(dialect):
+        return _pg_clause(q.strip(), terms)
+    if dialect == "sqlite" and _index_ready(dialect):
+        return Product.id.in_(_sqlite_ids_subquery(terms))
+    return db.or_(*(Product.name.ilike(_like_pattern(t), escape="\\") for t in terms))
+
+
+def _ranked_query(q, terms):
+    dialect = _dialect()
+    if dialect == "sqlite" and _index_ready(dialect):
+        fts = _sqlite_ranked(terms)
+        return Product.query.join(fts, fts.c.id == Product.id).order_by(fts.c.rank, Product.id.desc())
+    query = Product.query.filter(search_filter(q))
+    if dialect == "postgresql" and _index_ready(dialect):
+        return query.order_by(_pg_rank(q.strip(), terms).desc(), Product.id.desc())
+    return query.order_by(Product.name.asc())
+
+
+def search_products(q, page=1, per_page=PER_PAGE, category_id=None):
+    """Ранжированная страница результатов."""
+    result = SearchPage(q=(q or "").strip(), page=max(1, page), per_page=per_page)
+    terms = _terms(q)
+    if not terms:
+        return result
+
+    query = _ranked_query(q, terms)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+
+    result.total = query.order_by(None).count()
+    result.items = query.offset((result.page - 1) * per_page).limit(per_page).all()
+    return result
+
+
+def _index_ready(dialect):
+    """Есть ли поисковая схема (FTS5 / search_vector + pg_trgm); проверяется раз на процесс."""
+    cache = current_app.extensions.setdefault("search", {})
+    if dialect not in cache:
+        try:
+            if dialect == "postgresql":
+                cache[dialect] = bool(db.session.execute(db.text(PG_SEARCH_READY)).scalar())
+            else:
+                db.session.execute(db.text("SELECT 1 FROM products_fts LIMIT 1"))
+                cache[dialect] = True
+        except OperationalError:
+            db.session.rollback()
+            cache[dialect] = False
+        if not cache[dialect]:
+            current_app.logger.warning("поисковый индекс не найден: поиск через ILIKE, выполните `flask search-reindex`")
+    return cache[dialect]
+
+
+def reindex():
+    """Создаёт недостающую поисковую схему и перестраивает индекс (SQLite — FTS5, Postgres — REINDEX)."""
+    dialect = _dialect()
+    if dialect == "sqlite":
+        ensure_sqlite_index(rebuild=True)
+    elif dialect == "postgresql":
+        for ddl in PG_SEARCH_DDL:
+            db.session.execute(db.text(ddl))
+        db.session.execute(db.text("REINDEX INDEX ix_products_search_vector"))
+        db.session.execute(db.text("REINDEX INDEX ix_products_name_trgm"))
+    db.session.commit()
+    if dialect in ("sqlite", "postgresql"):
+        current_app.extensions.setdefault("search", {})[dialect] = True
+    return dialect
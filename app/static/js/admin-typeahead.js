@@ -0,0 +1,64 @@
+// Подсказки товаров на экранах поставки/продажи: input[data-typeahead-url] -> список кнопок .js-product-pick.
+// Выбор кнопки обрабатывает сама страница (делегированный click по .js-product-pick).
+(function () {
+  const escapeHtml = (value) => String(value ?? "").replace(/[&<>"']/g, (ch) => ({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;",
+  }[ch]));
+
+  const renderItem = (product) => `
+    <button type="button"
+            class="list-group-item list-group-item-action js-product-pick"
+            data-product-id="${product.id}"
+            data-product-name="${escapeHtml(product.name)}"
+            data-product-price="${escapeHtml(product.price)}"
+            data-is-weight="${product.is_weight_based ? 1 : 0}"
+            data-shelf-life="${product.shelf_life_days}">
+      <div class="fw-semibold">${escapeHtml(product.name)}</div>
+      <div class="small text-muted">
+        ${product.category ? `${escapeHtml(product.category)} · ` : ""}${product.is_weight_based ? "весовой" : "штучный"}
+        · цена: ${escapeHtml(product.price)} ₽ · срок: ${product.shelf_life_days} дн.
+      </div>
+    </button>`;
+
+  document.querySelectorAll("input[data-typeahead-url]").forEach((input) => {
+    const target = document.getElementById(input.dataset.typeaheadTarget);
+    if (!target) return;
+
+    let timer = null;
+    let seq = 0;
+
+    const run = () => {
+      const q = input.value.trim();
+      const current = ++seq;
+      if (!q) {
+        target.innerHTML = "";
+        return;
+      }
+      fetch(`${input.dataset.typeaheadUrl}?q=${encodeURIComponent(q)}`, { headers: { Accept: "application/json" } })
+        .then((resp) => resp.json())
+        .then((data) => {
+          if (current !== seq) return;  // ответ на устаревший ввод
+          const products = data.products || [];
+          target.innerHTML = products.length
+            ? `<div class="list-group">${products.map(renderItem).join("")}</div>`
+            : '<div class="alert alert-light border mb-0">Ничего не найдено.</div>';
+        })
+        .catch(() => {});
+    };
+
+    input.addEventListener("input", () => {
+      clearTimeout(timer);
+      timer = setTimeout(run, 60);
+    });
+
+    input.addEventListener("keydown", (e) => {
+      if (e.key === "ArrowDown") {
+        const first = target.querySelector(".js-product-pick");
+        if (first) {
+          e.preventDefault();
+          first.focus();
+        }
+      }
+    });
+  });
+})();
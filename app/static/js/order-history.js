@@ -0,0 +1,38 @@
+// Подгрузка истории заказов при прокрутке (keyset-курсор в data-next).
+(function () {
+  const list = document.getElementById('orderHistory');
+  const more = document.getElementById('orderHistoryMore');
+  if (!list || !more || !('IntersectionObserver' in window)) return;
+
+  let loading = false;
+
+  async function loadNext() {
+    const cursor = list.dataset.next;
+    if (loading || !cursor) return;
+    loading = true;
+    try {
+      const url = new URL(list.dataset.historyUrl, window.location.origin);
+      url.searchParams.set('after', cursor);
+      const res = await fetch(url, { headers: { 'Accept': 'application/json' } });
+      const data = await res.json();
+      if (!res.ok || !data.ok) throw new Error(data.error || 'Ошибка загрузки');
+
+      list.insertAdjacentHTML('beforeend', data.html);
+      list.dataset.next = data.next || '';
+      if (!data.next) {
+        observer.disconnect();
+        more.remove();
+      }
+    } catch (e) {
+      observer.disconnect();  // остаётся обычная ссылка «Показать ещё»
+    } finally {
+      loading = false;
+    }
+  }
+
+  const observer = new IntersectionObserver((entries) => {
+    if (entries.some((entry) => entry.isIntersecting)) loadNext();
+  }, { rootMargin: '400px' });
+
+  observer.observe(more);
+})();
@@ -0,0 +1,41 @@
+// Свободные слоты самовывоза: один запрос на все дни, список времени — по выбранной дате.
+(function () {
+  const select = document.getElementById('preorderTime');
+  const dateInput = document.getElementById('preorderDate');
+  if (!select || !dateInput || !select.dataset.slotsUrl) return;
+
+  let days = {};
+
+  function render() {
+    const current = select.value;
+    const slots = days[dateInput.value] || [];
+    select.innerHTML = '';
+
+    if (!slots.length) {
+      select.add(new Option('Нет свободного времени на эту дату', ''));
+      select.disabled = true;
+      return;
+    }
+    select.disabled = false;
+    select.add(new Option('Выберите время', ''));
+    slots.forEach((slot) => {
+      select.add(new Option(`${slot.time} (свободно: ${slot.free})`, slot.time, false, slot.time === current));
+    });
+  }
+
+  async function load() {
+    try {
+      const res = await fetch(select.dataset.slotsUrl, { headers: { 'Accept': 'application/json' } });
+      const data = await res.json();
+      if (!res.ok || !data.ok) throw new Error('Ошибка загрузки');
+      days = Object.fromEntries(data.days.map((day) => [day.date, day.slots]));
+    } catch (e) {
+      days = {};
+    }
+    render();
+  }
+
+  dateInput.addEventListener('change', render);
+  document.addEventListener('preorder:slots-stale', load);
+  load();
+})();
@@ -300,6 +300,7 @@
       });
 
       const data = await resp.json();
+      document.dispatchEvent(new CustomEvent("preorder:slots-stale"));
       if (!resp.ok || !data.ok) {
         showTopAlert({ category: "danger", message: data.error || "Не удалось оформить предзаказ" });
         return;
@@ -0,0 +1,139 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app import db
+from app.dbutil import dialect_insert
+from app.models import Batch, ProductStock
+
+EXPIRING_DAYS = 3
+
+
+def adjust_stock(product_id, expires_at, delta):
+    """
+    Меняет счётчик остатка (товар, срок годности) на delta в текущей транзакции.
+    Вызывать рядом с каждым изменением Batch.quantity, до commit.
+    """
+    delta = Decimal(str(delta))
+    if delta == 0:
+        return
+
+    stmt = dialect_insert(ProductStock).values(product_id=product_id, expires_at=expires_at, quantity=delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductStock.product_id, ProductStock.expires_at],
+        set_={"quantity": ProductStock.quantity + stmt.excluded.quantity},
+    )
+    db.session.execute(stmt)
+
+    if delta < 0:
+        db.session.execute(
+            db.delete(ProductStock).where(
+                ProductStock.product_id == product_id,
+                ProductStock.expires_at == expires_at,
+                ProductStock.quantity <= 0,
+            )
+        )
+
+
+def adjust_reserved(product_id, expires_at, delta):
+    """Меняет зарезервированную часть счётчика (товар, срок годности); строка счётчика уже есть."""
+    delta = Decimal(str(delta))
+    if delta == 0:
+        return
+    db.session.execute(
+        db.update(ProductStock)
+        .where(ProductStock.product_id == product_id, ProductStock.expires_at == expires_at)
+        .values(reserved=ProductStock.reserved + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def stock_summary(product_ids=None, today=None, expiring_days=EXPIRING_DAYS):
+    """
+    Один запрос: {product_id: {"available", "reserved", "expiring", "expired"}}.
+    available — свободное для продажи (не просрочено, за вычетом резервов под предзаказы).
+    """
+    today = today or date.today()
+    soon_border = today + timedelta(days=expiring_days)
+    free = ProductStock.quantity - ProductStock.reserved
+
+    def _sum_when(condition, value=ProductStock.quantity):
+        return db.func.coalesce(db.func.sum(db.case((condition, value), else_=0)), 0)
+
+    query = db.session.query(
+        ProductStock.product_id,
+        _sum_when(ProductStock.expires_at >= today, free),
+        _sum_when(ProductStock.expires_at >= today, ProductStock.reserved),
+        _sum_when(db.and_(ProductStock.expires_at >= today, ProductStock.expires_at <= soon_border)),
+        _sum_when(ProductStock.expires_at < today),
+    ).group_by(ProductStock.product_id)
+
+    if product_ids is not None:
+        query = query.filter(ProductStock.product_id.in_(list(product_ids)))
+
+    return {
+        product_id: {
+            "available": Decimal(str(available)),
+            "reserved": Decimal(str(reserved)),
+            "expiring": Decimal(str(expiring)),
+            "expired": Decimal(str(expired)),
+        }
+        for product_id, available, reserved, expiring, expired in query.all()
+    }
+
+
+def available_map(product_ids=None, today=None):
+    return {pid: row["available"] for pid, row in stock_summary(product_ids, today=today).items()}
+
+
+def _expected_stock():
+    """{(товар, срок): (количество, резерв)} по партиям."""
+    return {
+        (product_id, expires_at): (Decimal(str(qty)), Decimal(str(reserved)))
+        for product_id, expires_at, qty, reserved in (
+            db.session.query(
+                Batch.product_id, Batch.expires_at, db.func.sum(Batch.quantity), db.func.sum(Batch.reserved)
+            )
+            .group_by(Batch.product_id, Batch.expires_at)
+            .all()
+        )
+    }
+
+
+def rebuild_stock(expected=None):
+    """Заново заполняет product_stock из batches в текущей транзакции (без commit)."""
+    if expected is None:
+        expected = _expected_stock()
+
+    ProductStock.query.delete()
+    db.session.add_all(
+        ProductStock(product_id=product_id, expires_at=expires_at, quantity=qty, reserved=reserved)
+        for (product_id, expires_at), (qty, reserved) in expected.items()
+        if qty > 0
+    )
+
+
+def reconcile_stock(fix=True):
+    """
+    Сверяет счётчики с batches и при fix=True пересобирает их.
+    Возвращает список расхождений: (product_id, expires_at, было, должно быть),
+    где было/должно быть — пары (количество, резерв).
+    """
+    expected = _expected_stock()
+    actual = {
+        (row.product_id, row.expires_at): (Decimal(str(row.quantity)), Decimal(str(row.reserved)))
+        for row in ProductStock.query.all()
+    }
+
+    zero = (Decimal("0"), Decimal("0"))
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        was = actual.get(key, zero)
+        should_be = expected.get(key, zero)
+        if was != should_be:
+            drift.append((key[0], key[1], was, should_be))
+
+    if fix and drift:
+        rebuild_stock(expected)
+        db.session.commit()
+
+    return drift
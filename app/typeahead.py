@@ -0,0 +1,328 @@
+"""
+Индекс товаров в памяти процесса для подсказок на экранах поставки и продажи.
+
+Префиксы слов (отсортированный список + bisect) и триграммы (опечатки) по названию.
+Запрос с клавиатуры обслуживается без обращения к БД; индекс досинхронизируется
+инкрементально: сразу после своих коммитов (слушатель сессии) и не чаще раза
+в SYNC_INTERVAL секунд по версии каталога — для изменений из других воркеров.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from dataclasses import dataclass
+from datetime import timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.cache import CATALOG_EPOCH, CATALOG_VERSION
+from app.models import Category, Counter, DeletedRow, Product
+
+SYNC_INTERVAL = 5.0
+SYNC_OVERLAP = timedelta(seconds=5)
+TRGM_MIN_SCORE = 0.3
+DEFAULT_LIMIT = 10
+MAX_CANDIDATES = 500  # дальше пользователь уточнит запрос
+
+
+@dataclass
+class Entry:
+    id: int
+    name: str
+    price: str
+    is_weight_based: bool
+    shelf_life_days: int
+    category: str = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "price": self.price,
+            "is_weight_based": self.is_weight_based,
+            "shelf_life_days": self.shelf_life_days,
+            "category": self.category,
+        }
+
+
+def _normalize(text: str) -> str:
+    return (text or "").lower().replace("ё", "е")
+
+
+def _words(text: str):
+    return re.findall(r"[^\W_]+", _normalize(text))
+
+
+def _trigrams(text: str):
+    padded = f"  {_normalize(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._words = {}       # id -> слова названия
+        self._tokens = []      # отсортированные (слово, id)
+        self._grams = {}       # триграмма -> {id}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, entries):
+        tokens, grams = [], {}
+        by_id, words = {}, {}
+        for entry in entries:
+            by_id[entry.id] = entry
+            words[entry.id] = tuple(set(_words(entry.name)))
+            tokens.extend((word, entry.id) for word in words[entry.id])
+            for gram in _trigrams(entry.name):
+                grams.setdefault(gram, set()).add(entry.id)
+        tokens.sort()
+        with self._lock:
+            self._entries, self._words, self._tokens, self._grams = by_id, words, tokens, grams
+
+    def _unlink(self, entry):
+        for word in self._words.pop(entry.id, ()):
+            pos = bisect_left(self._tokens, (word, entry.id))
+            if pos < len(self._tokens) and self._tokens[pos] == (word, entry.id):
+                del self._tokens[pos]
+        for gram in _trigrams(entry.name):
+            ids = self._grams.get(gram)
+            if ids:
+                ids.discard(entry.id)
+                if not ids:
+                    del self._grams[gram]
+
+    def upsert(self, entry):
+        with self._lock:
+            old = self._entries.get(entry.id)
+            if old is not None:
+                if old.name != entry.name:
+                    self._unlink(old)
+                else:
+                    self._entries[entry.id] = entry
+                    return
+            self._entries[entry.id] = entry
+            self._words[entry.id] = tuple(set(_words(entry.name)))
+            for word in self._words[entry.id]:
+                insort(self._tokens, (word, entry.id))
+            for gram in _trigrams(entry.name):
+                self._grams.setdefault(gram, set()).add(entry.id)
+
+    def remove(self, product_id):
+        with self._lock:
+            old = self._entries.pop(product_id, None)
+            if old is not None:
+                self._unlink(old)
+
+    def _range(self, word):
+        # все слова с префиксом word лежат в [word, word + максимальный символ)
+        return bisect_left(self._tokens, (word,)), bisect_left(self._tokens, (word + "\U0010ffff",))
+
+    def _prefix_candidates(self, words):
+        # ведущее — самое редкое слово запроса, остальные проверяются по словам товара
+        ranges = sorted(((self._range(word), word) for word in words), key=lambda item: item[0][1] - item[0][0])
+        lo, hi = ranges[0][0]
+        rest = [word for _, word in ranges[1:]]
+
+        ids = []
+        seen = set()
+        for pos in range(lo, hi):
+            product_id = self._tokens[pos][1]
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            product_words = self._words[product_id]
+            if all(any(pw.startswith(word) for pw in product_words) for word in rest):
+                ids.append(product_id)
+                if len(ids) >= MAX_CANDIDATES:
+                    break
+        return ids
+
+    def search(self, q, limit=DEFAULT_LIMIT):
+        q_norm = _normalize(q).strip()
+        words = _words(q_norm)
+        if not words:
+            return []
+
+        with self._lock:
+            found = []
+            if q_norm.isdigit() and int(q_norm) in self._entries:
+                found.append(self._entries[int(q_norm)])
+
+            # сначала те, чьё название начинается с запроса, затем короткие названия
+            prefix_hits = nsmallest(
+                limit,
+                (self._entries[i] for i in self._prefix_candidates(words)),
+                key=lambda e: (not _normalize(e.name).startswith(q_norm), len(e.name), e.name),
+            )
+            found.extend(e for e in prefix_hits if e not in found)
+
+            if len(found) < limit and len(q_norm) >= 3:
+                q_grams = _trigrams(q_norm)
+                scores = {}
+                for gram in q_grams:
+                    for product_id in self._grams.get(gram, ()):
+                        scores[product_id] = scores.get(product_id, 0) + 1
+                seen = {e.id for e in found}
+                fuzzy = [
+                    (count / len(q_grams), self._entries[pid])
+                    for pid, count in scores.items()
+                    if pid not in seen and count / len(q_grams) >= TRGM_MIN_SCORE
+                ]
+                fuzzy.sort(key=lambda item: (-item[0], item[1].name))
+                found.extend(entry for _, entry in fuzzy)
+
+            return found[:limit]
+
+
+# -----------------------
+# Синхронизация с БД
+# -----------------------
+class _State:
+    def __init__(self):
+        self.index = ProductIndex()
+        self.lock = threading.Lock()
+        self.built = False
+        self.dirty = False
+        self.version = None
+        self.epoch = None
+        self.synced_at = None   # время БД последней синхронизации
+        self.checked_at = 0.0   # time.monotonic() последней проверки версии
+
+
+def _state():
+    return current_app.extensions["typeahead"]
+
+
+def _load_entries(*criteria):
+    rows = db.session.execute(
+        db.select(
+            Product.id, Product.name, Product.price, Product.is_weight_based,
+            Product.shelf_life_days, Category.name,
+        )
+        .outerjoin(Category, Category.id == Product.category_id)
+        .where(*criteria)
+    ).all()
+    return [
+        Entry(
+            id=row[0],
+            name=row[1],
+            price=str(row[2]),
+            is_weight_based=bool(row[3]),
+            shelf_life_days=row[4],
+            category=row[5],
+        )
+        for row in rows
+    ]
+
+
+def _read_stamps():
+    counters = dict(db.session.execute(
+        db.select(Counter.name, Counter.value).where(Counter.name.in_((CATALOG_VERSION, CATALOG_EPOCH)))
+    ).all())
+    now = db.session.execute(db.select(db.func.now())).scalar()
+    return counters.get(CATALOG_VERSION, 0), counters.get(CATALOG_EPOCH, 0), now
+
+
+def rebuild(state=None):
+    state = state or _state()
+    version, epoch, now = _read_stamps()
+    state.index.build(_load_entries())
+    state.version, state.epoch, state.synced_at = version, epoch, now
+    state.built, state.dirty = True, False
+    state.checked_at = time.monotonic()
+
+
+def _sync_incremental(state, version, now):
+    since = state.synced_at - SYNC_OVERLAP
+    for entry in _load_entries(db.or_(Product.updated_at >= since, Category.updated_at >= since)):
+        state.index.upsert(entry)
+    deleted_ids = db.session.execute(
+        db.select(DeletedRow.row_id).where(
+            DeletedRow.table_name == Product.__tablename__,
+            DeletedRow.deleted_at >= since,
+        )
+    ).scalars()
+    for product_id in deleted_ids:
+        state.index.remove(product_id)
+    state.version, state.synced_at = version, now
+
+
+def ensure_fresh():
+    state = _state()
+    if state.built and not state.dirty and time.monotonic() - state.checked_at < SYNC_INTERVAL:
+        return state.index
+
+    with state.lock:
+        if not state.built:
+            rebuild(state)
+            return state.index
+        if not state.dirty and time.monotonic() - state.checked_at < SYNC_INTERVAL:
+            return state.index
+
+        version, epoch, now = _read_stamps()
+        if epoch != state.epoch:
+            rebuild(state)  # восстановление из копии — строки заменены целиком
+        elif version != state.version or state.dirty:
+            state.dirty = False
+            _sync_incremental(state, version, now)
+        state.checked_at = time.monotonic()
+    return state.index
+
+
+def search(q, limit=DEFAULT_LIMIT):
+    return ensure_fresh().search(q, limit=limit)
+
+
+def _warm(app):
+    with app.app_context():
+        try:
+            with _state().lock:
+                if not _state().built:
+                    rebuild()
+        except Exception:
+            app.logger.warning("typeahead: не удалось построить индекс при старте", exc_info=True)
+        finally:
+            db.session.remove()
+
+
+def init_typeahead(app):
+    app.extensions["typeahead"] = _State()
+    started = threading.Event()
+
+    @app.before_request
+    def _warm_typeahead_index():
+        # строим в фоне при первом запросе к серверу (не при flask db upgrade и прочих CLI)
+        if not started.is_set():
+            started.set()
+            threading.Thread(target=_warm, args=(app,), daemon=True, name="typeahead-warm").start()
+
+
+# -----------------------
+# Свои коммиты — применяем сразу при следующем запросе подсказки
+# -----------------------
+@event.listens_for(Session, "after_flush")
+def _note_catalog_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Product, Category)):
+            session.info["typeahead_dirty"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_index_dirty(session):
+    if session.info.pop("typeahead_dirty", False) and has_app_context():
+        state = current_app.extensions.get("typeahead")
+        if state is not None:
+            state.dirty = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_catalog_changes(session):
+    session.info.pop("typeahead_dirty", None)
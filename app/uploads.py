@@ -1,15 +1,32 @@
+import hashlib
+import mimetypes
 import os
-from uuid import uuid4
-from flask import current_app
+import time
+from flask import current_app, abort, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен — варианты просто не создаются
+    Image = None
 
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp"}
 
+# ширины вариантов для srcset: карточки (~220px по высоте), средние и крупные экраны
+VARIANT_WIDTHS = (320, 640, 1280)
+WEBP_QUALITY = 80
+
 def _allowed(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
 def save_image(file_storage, subdir: str) -> str:
     """
-    Сохраняет файл в: <UPLOAD_FOLDER>/<subdir>/...
+    Сохраняет файл в: <UPLOAD_FOLDER>/<subdir>/<blake2b содержимого>.<ext>
+    Одинаковые файлы не дублируются; имя меняется только вместе с содержимым,
+    поэтому URL можно кэшировать навсегда.
     Возвращает путь для БД: /static/uploads/<subdir>/xxx.webp
     """
     if not file_storage or not getattr(file_storage, "filename", ""):
@@ -20,14 +37,19 @@ def save_image(file_storage, subdir: str) -> str:
         raise ValueError("Недопустимый формат файла (jpg, jpeg, png, webp)")
 
     ext = original_filename.rsplit(".", 1)[1].lower()
-    new_name = f"{uuid4().hex}.{ext}"
+    data = file_storage.read()
+    new_name = f"{content_hash(data)}.{ext}"
 
     base_folder = current_app.config["UPLOAD_FOLDER"]  # например: app/static/uploads
     folder = os.path.join(base_folder, subdir)
     os.makedirs(folder, exist_ok=True)
 
     abs_path = os.path.join(folder, new_name)
-    file_storage.save(abs_path)
+    if not os.path.exists(abs_path):
+        tmp_path = f"{abs_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(data)
+        os.replace(tmp_path, abs_path)  # атомарно: параллельная загрузка того же файла не увидит половину
 
     return f"/static/uploads/{subdir}/{new_name}"
 
@@ -36,3 +58,155 @@ def save_product_image(file_storage) -> str:
 
 def save_category_image(file_storage) -> str:
     return save_image(file_storage, "categories")
+
+
+def _abs_upload_path(image_url: str) -> str:
+    prefix = "/static/uploads/"
+    if not image_url or not image_url.startswith(prefix):
+        return ""
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], *image_url[len(prefix):].split("/"))
+
+
+def make_variants(image_url: str) -> dict:
+    """
+    Создаёт рядом с оригиналом WebP-варианты шириной VARIANT_WIDTHS (без увеличения).
+    Возвращает {"320": "/static/uploads/.../xxx_320.webp", ...}; {} если Pillow нет или файл не найден.
+    """
+    abs_path = _abs_upload_path(image_url)
+    if Image is None or not abs_path or not os.path.exists(abs_path):
+        return {}
+
+    stem = os.path.splitext(abs_path)[0]
+    url_stem = os.path.splitext(image_url)[0]
+    variants = {}
+
+    with Image.open(abs_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for width in VARIANT_WIDTHS:
+            width = min(width, image.width)  # не увеличиваем
+            if str(width) in variants:
+                break
+            variant_url = f"{url_stem}_{width}.webp"
+            if os.path.exists(f"{stem}_{width}.webp"):
+                variants[str(width)] = variant_url  # тот же оригинал уже обрабатывали
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+            resized.save(f"{stem}_{width}.webp", "WEBP", quality=WEBP_QUALITY, method=4)
+            variants[str(width)] = variant_url
+
+    return variants
+
+
+def _variant_models():
+    from app.models import Product, Category
+    return {"product": Product, "category": Category}
+
+
+def build_variants_job(reporter, model_name: str, obj_id: int):
+    """Фоновая задача (app/jobs.py): варианты картинки товара/категории."""
+    from app import db
+    from app.cache import bump_catalog_version
+
+    obj = db.session.get(_variant_models()[model_name], obj_id)
+    if not obj or not obj.image_url:
+        return None
+
+    image_url = obj.image_url
+    variants = make_variants(image_url)
+
+    db.session.refresh(obj)
+    if obj.image_url == image_url:  # картинку не успели заменить, пока шла обработка
+        obj.image_variants = variants or None
+        bump_catalog_version()  # srcset на страницах каталога
+        db.session.commit()
+
+    reporter.report(len(variants), f"{model_name} #{obj_id}: вариантов {len(variants)}", force=True)
+    return None
+
+
+def enqueue_variants(obj):
+    """Сбрасывает старые варианты и ставит генерацию новых в фон (вызывать после commit)."""
+    from app.jobs import enqueue
+
+    if not obj.image_url:
+        return None
+    model_name = obj.__class__.__name__.lower()
+    return enqueue("image_variants", build_variants_job, model_name, obj.id)
+
+
+def image_src(obj, width=640) -> str:
+    """Вариант не меньше width (или крупнейший), иначе оригинал."""
+    variants = getattr(obj, "image_variants", None) or {}
+    if variants:
+        widths = sorted(int(w) for w in variants)
+        fit = next((w for w in widths if w >= width), widths[-1])
+        return variants[str(fit)]
+    return getattr(obj, "image_url", None) or ""
+
+
+def image_srcset(obj) -> str:
+    variants = getattr(obj, "image_variants", None) or {}
+    return ", ".join(f"{variants[w]} {w}w" for w in sorted(variants, key=int))
+
+
+def send_upload(filename: str):
+    """
+    Отдаёт файл из UPLOAD_FOLDER с вечным кэшем.
+    UPLOADS_ACCEL_PREFIX — отдать через nginx (X-Accel-Redirect);
+    USE_X_SENDFILE (штатный флаг Flask) — через X-Sendfile.
+    """
+    config = current_app.config
+    max_age = config["UPLOADS_MAX_AGE"]
+    accel_prefix = config.get("UPLOADS_ACCEL_PREFIX")
+
+    if accel_prefix:
+        abs_path = safe_join(config["UPLOAD_FOLDER"], filename)
+        if not abs_path or not os.path.isfile(abs_path):
+            abort(404)
+        response = current_app.response_class()
+        response.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{filename}"
+        response.headers["Content-Type"] = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    else:
+        response = send_from_directory(config["UPLOAD_FOLDER"], filename, max_age=max_age)
+
+    response.headers["Cache-Control"] = f"public, max-age={max_age}, immutable"
+    return response
+
+
+def referenced_upload_urls() -> set:
+    from app import db
+    from app.models import Product, Category
+
+    urls = set()
+    for model in (Product, Category):
+        for image_url, variants in db.session.query(model.image_url, model.image_variants):
+            if image_url:
+                urls.add(image_url)
+            urls.update((variants or {}).values())
+    return urls
+
+
+def collect_garbage(dry_run=False, min_age_seconds=3600) -> list:
+    """
+    Удаляет файлы в UPLOAD_FOLDER, на которые не ссылается ни один товар/категория.
+    Свежие файлы (моложе min_age_seconds) не трогаем: их может ещё обрабатывать фоновая задача.
+    """
+    base_folder = current_app.config["UPLOAD_FOLDER"]
+    referenced = referenced_upload_urls()
+    now = time.time()
+    removed = []
+
+    for root, _, files in os.walk(base_folder):
+        for name in files:
+            abs_path = os.path.join(root, name)
+            url = "/static/uploads/" + os.path.relpath(abs_path, base_folder).replace(os.sep, "/")
+            if url in referenced or now - os.path.getmtime(abs_path) < min_age_seconds:
+                continue
+            if not dry_run:
+                os.remove(abs_path)
+            removed.append(url)
+    return removed
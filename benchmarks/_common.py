@@ -0,0 +1,79 @@
+"""
+Общее для бенчмарков: приложение на отдельной БД и сводка по замерам.
+
+По умолчанию — временный файл SQLite; --database-url позволяет гонять то же на Postgres
+(пустая база: таблицы создаются и удаляются бенчмарком).
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def base_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="БД для замера (по умолчанию — временный SQLite)")
+    return parser
+
+
+@contextmanager
+def bench_app(database_url=None):
+    """Приложение с чистой схемой; после выхода таблицы удаляются."""
+    import config
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.Config.SQLALCHEMY_DATABASE_URI = database_url or f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}"
+        config.Config.JOBS_FOLDER = os.path.join(tmp, "jobs")
+
+        from app import create_app, db
+
+        app = create_app()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            try:
+                yield app
+            finally:
+                db.session.remove()
+                db.drop_all()
+                db.engine.dispose()
+
+
+def serialize_sqlite_writes(engine):
+    """
+    SQLite не знает FOR UPDATE: без этого параллельные транзакции теряют обновления партий.
+    BEGIN IMMEDIATE заставляет второго писателя ждать первого, как блокировка строк на Postgres.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute("PRAGMA busy_timeout = 30000")
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    engine.dispose()
+
+
+def timings(fn, args_list):
+    """Вызывает fn(*args) для каждого набора аргументов -> список длительностей в мс."""
+    result = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        result.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def summary(samples_ms):
+    ordered = sorted(samples_ms)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"p50 {statistics.median(ordered):.3f} мс, p95 {p95:.3f} мс, среднее {statistics.fmean(ordered):.3f} мс"
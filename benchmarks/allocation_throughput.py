@@ -0,0 +1,115 @@
+"""
+Пропускная способность подтверждения продаж (FEFO-списание с блокировкой партий) при нескольких кассах.
+
+Каждая касса — отдельный поток со своим пользователем и черновиком: кладёт две позиции
+и подтверждает продажу (app/cart.py: confirm_sale) — столько раз, сколько задано --sales.
+Все кассы продают одни и те же товары, то есть конкурируют за одни партии.
+На SQLite записи сериализуются BEGIN IMMEDIATE (аналог FOR UPDATE), на Postgres — реальные блокировки.
+
+    python -m benchmarks.allocation_throughput
+    python -m benchmarks.allocation_throughput --tills 1,4,16 --sales 200 --database-url postgresql://...
+"""
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from flask_login import login_user
+
+from benchmarks._common import base_parser, bench_app, serialize_sqlite_writes
+
+BATCHES_PER_PRODUCT = 20
+
+
+def _setup(db, tills):
+    from app.models import Batch, Category, Product, User
+    from app.stock import adjust_stock
+
+    category = Category(name="Бенчмарк")
+    db.session.add(category)
+    db.session.flush()
+    products = [
+        Product(name="Молоко", price=Decimal("100"), category_id=category.id, shelf_life_days=5),
+        Product(name="Сыр", price=Decimal("500"), is_weight_based=True, category_id=category.id, shelf_life_days=30),
+    ]
+    users = [
+        User(username=f"till{n}", phone=f"+7900000{n:04d}", phone_normalized=f"+7900000{n:04d}",
+             password_hash="x", is_admin=True)
+        for n in range(tills)
+    ]
+    db.session.add_all(products + users)
+    db.session.flush()
+
+    today = date.today()
+    for product in products:
+        for n in range(BATCHES_PER_PRODUCT):
+            batch = Batch(product_id=product.id, quantity=Decimal("100000"),
+                          produced_at=today - timedelta(days=n), expires_at=today + timedelta(days=30))
+            db.session.add(batch)
+            adjust_stock(product.id, batch.expires_at, batch.quantity)
+    db.session.commit()
+    return [p.id for p in products], [u.id for u in users]
+
+
+def _till(app, user_id, product_ids, sales, start, errors):
+    from app import db
+    from app.cart import KIND, confirm_sale
+    from app.drafts import add_line
+    from app.models import User
+
+    start.wait()
+    with app.test_request_context():
+        try:
+            login_user(db.session.get(User, user_id))
+            for _ in range(sales):
+                add_line(KIND, product_ids[0], Decimal("1"))
+                add_line(KIND, product_ids[1], Decimal("0.25"))
+                db.session.commit()
+                confirm_sale()
+                db.session.commit()
+        except Exception as e:  # замер не должен молча «ускориться» из-за упавших касс
+            errors.append(e)
+        finally:
+            db.session.remove()
+
+
+def main():
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument("--tills", default="1,2,4,8")
+    parser.add_argument("--sales", type=int, default=100, help="продаж на кассу")
+    args = parser.parse_args()
+    till_counts = [int(n) for n in args.tills.split(",")]
+
+    print(f"{'касс':>5}  {'продаж':>7}  {'время, с':>8}  {'продаж/с':>9}")
+    for tills in till_counts:
+        with bench_app(args.database_url) as app:
+            from app import db
+            from app.models import Sale
+
+            serialize_sqlite_writes(db.engine)
+            product_ids, user_ids = _setup(db, tills)
+            db.session.remove()
+
+            start, errors = threading.Event(), []
+            threads = [
+                threading.Thread(target=_till, args=(app, user_id, product_ids, args.sales, start, errors))
+                for user_id in user_ids
+            ]
+            for thread in threads:
+                thread.start()
+            started = time.perf_counter()
+            start.set()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            if errors:
+                raise errors[0]
+            total = db.session.execute(db.select(db.func.count(Sale.id))).scalar()
+            db.session.remove()
+            assert total == tills * args.sales, total
+            print(f"{tills:>5}  {total:>7}  {elapsed:>8.2f}  {total / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
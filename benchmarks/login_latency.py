@@ -0,0 +1,91 @@
+"""
+Задержка поиска пользователя по телефону при входе (find_user_by_phone) от 1k до 1M пользователей.
+
+Сравнивается индексный поиск по users.phone_normalized с прежним перебором всех пользователей
+с нормализацией в Python (он гоняется только до --legacy-max, дальше слишком долго).
+
+    python -m benchmarks.login_latency
+    python -m benchmarks.login_latency --sizes 1000,10000 --lookups 200
+"""
+import random
+
+from benchmarks._common import base_parser, bench_app, summary, timings
+
+INSERT_CHUNK = 10_000
+
+
+def _phone(n):
+    return f"+79{n:09d}"
+
+
+def _raw_phone(n):
+    # так номер вводят в форму входа: с 8, пробелами и скобками
+    return f"8 (9{n // 10**6:03d}) {n // 1000 % 1000:03d}-{n % 1000:03d}"
+
+
+def _fill_users(db, User, start, stop):
+    table = User.__table__
+    for chunk_start in range(start, stop, INSERT_CHUNK):
+        rows = [
+            {
+                "username": f"user{n}",
+                "phone": _raw_phone(n),
+                "phone_normalized": _phone(n),
+                "password_hash": "x",
+                "is_admin": False,
+            }
+            for n in range(chunk_start, min(chunk_start + INSERT_CHUNK, stop))
+        ]
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def _legacy_find(User, normalize_phone, phone_raw):
+    # как было до индекса по phone_normalized: все пользователи в память и нормализация в цикле
+    normalized = normalize_phone(phone_raw)
+    for user in User.query.all():
+        if normalize_phone(user.phone) == normalized:
+            return user
+    return None
+
+
+def main():
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--legacy-max", type=int, default=10_000)
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    with bench_app(args.database_url) as app:
+        from app import db
+        from app.models import User
+        from app.routes import find_user_by_phone, normalize_phone
+
+        rng = random.Random(1)
+        filled = 0
+        print(f"{'users':>9}  поиск")
+        for size in sizes:
+            _fill_users(db, User, filled, size)
+            filled = size
+
+            hits = [(_raw_phone(n),) for n in (rng.randrange(size) for _ in range(args.lookups))]
+            misses = [(_phone(size + n),) for n in range(max(args.lookups // 10, 1))]
+
+            with app.test_request_context():
+                # прогрев соединения и кэша запросов; заодно проверка, что номера действительно находятся
+                assert find_user_by_phone(hits[0][0]) is not None
+                assert find_user_by_phone(misses[0][0]) is None
+                indexed = timings(find_user_by_phone, hits + misses)
+                db.session.remove()
+                print(f"{size:>9}  индекс:  {summary(indexed)}")
+
+                if size <= args.legacy_max:
+                    sample = hits[: max(args.lookups // 10, 1)]
+                    legacy = timings(lambda phone: _legacy_find(User, normalize_phone, phone), sample)
+                    db.session.remove()
+                    print(f"{'':>9}  перебор: {summary(legacy)}")
+
+
+if __name__ == "__main__":
+    main()
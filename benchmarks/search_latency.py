@@ -0,0 +1,81 @@
+"""
+Задержка поиска товаров (search_products, первая страница) от 1k до 100k товаров.
+
+Цель — меньше 10 мс на 100k товаров. Индекс строится так же, как в рабочей БД после
+`flask search-reindex`: FTS5 на SQLite, tsvector + pg_trgm на Postgres (--database-url).
+
+    python -m benchmarks.search_latency
+    python -m benchmarks.search_latency --sizes 1000,10000 --lookups 200
+"""
+import random
+from decimal import Decimal
+
+from benchmarks._common import base_parser, bench_app, summary, timings
+
+INSERT_CHUNK = 10_000
+KINDS = ["Молоко", "Кефир", "Сыр", "Творог", "Йогурт", "Ряженка", "Сметана", "Масло", "Мёд", "Хлеб"]
+SORTS = ["козье", "коровье", "фермерское", "домашнее", "топлёное", "копчёный", "цельное", "лесной", "ржаной"]
+SUPPLIERS = ["Ферма Ивановых", "Луговое", "Заречье", "Пасека Сидорова", "Берёзка"]
+
+
+def _fill_products(db, Product, category_id, rng, start, stop):
+    table = Product.__table__
+    for chunk_start in range(start, stop, INSERT_CHUNK):
+        rows = [
+            {
+                "name": f"{rng.choice(KINDS)} {rng.choice(SORTS)} №{n}",
+                "description": f"{rng.choice(SORTS)} {rng.choice(KINDS).lower()} от {rng.choice(SUPPLIERS)}",
+                "tags": rng.choice(SORTS),
+                "supplier_name": rng.choice(SUPPLIERS),
+                "price": Decimal(rng.randrange(50, 900)),
+                "category_id": category_id,
+                "is_weight_based": False,
+            }
+            for n in range(chunk_start, min(chunk_start + INSERT_CHUNK, stop))
+        ]
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def _queries(rng, count):
+    # целые слова, префиксы, два слова и редкий запрос (номер товара)
+    pool = [kind.lower() for kind in KINDS] + [kind[:3].lower() for kind in KINDS]
+    pool += [f"{kind.lower()} {sort}" for kind in KINDS[:3] for sort in SORTS[:3]] + ["луговое", "№4242"]
+    return [(rng.choice(pool),) for _ in range(count)]
+
+
+def main():
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--lookups", type=int, default=300)
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    with bench_app(args.database_url) as app:
+        from app import db
+        from app.models import Category, Product
+        from app.search import reindex, search_products
+
+        category = Category(name="Бенчмарк")
+        db.session.add(category)
+        db.session.commit()
+        category_id = category.id
+
+        rng = random.Random(1)
+        filled = 0
+        print(f"{'товаров':>9}  поиск (первая страница)")
+        for size in sizes:
+            _fill_products(db, Product, category_id, rng, filled, size)
+            filled = size
+            reindex()
+
+            queries = _queries(rng, args.lookups)
+            with app.test_request_context():
+                assert search_products("молоко").total > 0  # прогрев и проверка, что индекс используется
+                samples = timings(lambda q: search_products(q).items, queries)
+                db.session.remove()
+            print(f"{size:>9}  {summary(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,3 +13,32 @@ class Config:
     # uploads
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "app", "static", "uploads")
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5 MB
+    UPLOADS_MAX_AGE = 365 * 24 * 3600  # имена по хэшу содержимого -> кэш навсегда
+    UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX")  # напр. /protected-uploads/ для nginx
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "0") == "1"
+
+    # backup restore: строк на один executemany
+    BACKUP_RESTORE_CHUNK = int(os.getenv("BACKUP_RESTORE_CHUNK", "1000"))
+
+    # фоновые задачи
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOBS_FOLDER = os.getenv("JOBS_FOLDER", os.path.join(BASE_DIR, "instance", "jobs"))
+
+    # кэш страниц каталога: memory (LRU в процессе) | sqlite (общий файл для воркеров) | none
+    PAGE_CACHE_BACKEND = os.getenv("PAGE_CACHE_BACKEND", "memory")
+    PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "512"))
+    PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", os.path.join(BASE_DIR, "instance", "page_cache.sqlite3"))
+
+    # самовывоз: слоты по PICKUP_SLOT_MINUTES с PICKUP_OPEN до PICKUP_CLOSE, запись на PICKUP_DAYS_AHEAD дней вперёд
+    PICKUP_OPEN = os.getenv("PICKUP_OPEN", "09:00")
+    PICKUP_CLOSE = os.getenv("PICKUP_CLOSE", "20:00")
+    PICKUP_SLOT_MINUTES = int(os.getenv("PICKUP_SLOT_MINUTES", "15"))
+    PICKUP_SLOT_CAPACITY = int(os.getenv("PICKUP_SLOT_CAPACITY", "4"))  # заказов на слот по умолчанию
+    PICKUP_DAYS_AHEAD = int(os.getenv("PICKUP_DAYS_AHEAD", "7"))
+
+    # весовые/ценовые EAN-13 от весов: 2 цифры префикса + PLU (5) + значение (5) + контрольная
+    BARCODE_WEIGHT_PREFIXES = os.getenv("BARCODE_WEIGHT_PREFIXES", "20,21,22,23,24,25").split(",")  # граммы
+    BARCODE_PRICE_PREFIXES = os.getenv("BARCODE_PRICE_PREFIXES", "26,27,28,29").split(",")  # копейки
+
+    # ключи касс для выгрузки офлайн-продаж (/admin/sales/ingest, заголовок X-Till-Key) — через запятую
+    TILL_API_KEYS = [key.strip() for key in os.getenv("TILL_API_KEYS", "").split(",") if key.strip()]
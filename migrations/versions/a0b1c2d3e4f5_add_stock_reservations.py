@@ -0,0 +1,52 @@
+"""add stock reservations for preorders
+
+Revision ID: a0b1c2d3e4f5
+Revises: f9a0b1c2d3e4
+Create Date: 2026-03-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a0b1c2d3e4f5'
+down_revision = 'f9a0b1c2d3e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('batches') as batch_op:
+        batch_op.add_column(sa.Column('reserved', sa.Numeric(precision=10, scale=3), nullable=False, server_default='0'))
+    with op.batch_alter_table('product_stock') as batch_op:
+        batch_op.add_column(sa.Column('reserved', sa.Numeric(precision=12, scale=3), nullable=False, server_default='0'))
+
+    op.create_table(
+        'stock_reservations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('preorder_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('batch_id', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.Date(), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=10, scale=3), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.ForeignKeyConstraint(['preorder_id'], ['preorders.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.ForeignKeyConstraint(['batch_id'], ['batches.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_stock_reservations_preorder_id', 'stock_reservations', ['preorder_id'], unique=False)
+    op.create_index('ix_stock_reservations_product_id', 'stock_reservations', ['product_id'], unique=False)
+    op.create_index('ix_stock_reservations_batch_id', 'stock_reservations', ['batch_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_stock_reservations_batch_id', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_product_id', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_preorder_id', table_name='stock_reservations')
+    op.drop_table('stock_reservations')
+    with op.batch_alter_table('product_stock') as batch_op:
+        batch_op.drop_column('reserved')
+    with op.batch_alter_table('batches') as batch_op:
+        batch_op.drop_column('reserved')
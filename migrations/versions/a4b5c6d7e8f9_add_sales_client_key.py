@@ -0,0 +1,28 @@
+"""add client_key to sales
+
+Revision ID: a4b5c6d7e8f9
+Revises: f3a4b5c6d7e8
+Create Date: 2026-03-12 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4b5c6d7e8f9'
+down_revision = 'f3a4b5c6d7e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.add_column(sa.Column('client_key', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_sales_client_key', ['client_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.drop_index('ix_sales_client_key')
+        batch_op.drop_column('client_key')
@@ -0,0 +1,56 @@
+"""add updated_at columns and deleted_rows
+
+Revision ID: a7b8c9d0e1f2
+Revises: f2a3b4c5d6e7
+Create Date: 2026-03-05 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7b8c9d0e1f2'
+down_revision = 'f2a3b4c5d6e7'
+branch_labels = None
+depends_on = None
+
+TABLES_WITH_CREATED_AT = ['users', 'batches', 'preorders']
+TABLES_WITHOUT_CREATED_AT = ['categories', 'products']
+
+
+def upgrade():
+    for table in TABLES_WITH_CREATED_AT + TABLES_WITHOUT_CREATED_AT:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True, server_default=sa.text('CURRENT_TIMESTAMP')))
+
+    bind = op.get_bind()
+    for table in TABLES_WITH_CREATED_AT:
+        bind.execute(sa.text(f"UPDATE {table} SET updated_at = created_at"))
+    for table in TABLES_WITHOUT_CREATED_AT:
+        bind.execute(sa.text(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+
+    for table in TABLES_WITH_CREATED_AT + TABLES_WITHOUT_CREATED_AT:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+            batch_op.create_index(f'ix_{table}_updated_at', ['updated_at'], unique=False)
+
+    op.create_table(
+        'deleted_rows',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(length=64), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_deleted_rows_deleted_at'), 'deleted_rows', ['deleted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_deleted_rows_deleted_at'), table_name='deleted_rows')
+    op.drop_table('deleted_rows')
+
+    for table in TABLES_WITH_CREATED_AT + TABLES_WITHOUT_CREATED_AT:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_index(f'ix_{table}_updated_at')
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,47 @@
+"""add pickup slots with capacity and booking counters
+
+Revision ID: b1c2d3e4f5a6
+Revises: a0b1c2d3e4f5
+Create Date: 2026-03-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1c2d3e4f5a6'
+down_revision = 'a0b1c2d3e4f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'pickup_slots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('starts_at', sa.String(length=5), nullable=False),
+        sa.Column('capacity', sa.Integer(), nullable=False),
+        sa.Column('booked', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.CheckConstraint('booked >= 0 AND booked <= capacity', name='ck_pickup_slots_booked'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'starts_at', name='uq_pickup_slots_day_start'),
+    )
+    op.create_index('ix_pickup_slots_updated_at', 'pickup_slots', ['updated_at'], unique=False)
+
+    with op.batch_alter_table('preorders') as batch_op:
+        batch_op.add_column(sa.Column('pickup_slot_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_preorders_pickup_slot_id', ['pickup_slot_id'], unique=False)
+        batch_op.create_foreign_key('fk_preorders_pickup_slot_id', 'pickup_slots', ['pickup_slot_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('preorders') as batch_op:
+        batch_op.drop_constraint('fk_preorders_pickup_slot_id', type_='foreignkey')
+        batch_op.drop_index('ix_preorders_pickup_slot_id')
+        batch_op.drop_column('pickup_slot_id')
+
+    op.drop_index('ix_pickup_slots_updated_at', table_name='pickup_slots')
+    op.drop_table('pickup_slots')
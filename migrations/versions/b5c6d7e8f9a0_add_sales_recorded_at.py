@@ -0,0 +1,33 @@
+"""add recorded_at to sales
+
+Revision ID: b5c6d7e8f9a0
+Revises: a4b5c6d7e8f9
+Create Date: 2026-03-12 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5c6d7e8f9a0'
+down_revision = 'a4b5c6d7e8f9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.add_column(sa.Column('recorded_at', sa.DateTime(), nullable=True, server_default=sa.text('CURRENT_TIMESTAMP')))
+
+    op.get_bind().execute(sa.text("UPDATE sales SET recorded_at = created_at"))
+
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.alter_column('recorded_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_sales_recorded_at', ['recorded_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.drop_index('ix_sales_recorded_at')
+        batch_op.drop_column('recorded_at')
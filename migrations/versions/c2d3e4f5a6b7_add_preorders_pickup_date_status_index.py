@@ -0,0 +1,23 @@
+"""add preorders (pickup_date, status) index for pick lists
+
+Revision ID: c2d3e4f5a6b7
+Revises: b1c2d3e4f5a6
+Create Date: 2026-03-20 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d3e4f5a6b7'
+down_revision = 'b1c2d3e4f5a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_preorders_pickup_date_status', 'preorders', ['pickup_date', 'status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_preorders_pickup_date_status', table_name='preorders')
@@ -0,0 +1,42 @@
+"""add sales_daily rollup
+
+Revision ID: c6d7e8f9a0b1
+Revises: b5c6d7e8f9a0
+Create Date: 2026-03-14 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6d7e8f9a0b1'
+down_revision = 'b5c6d7e8f9a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sales_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=14, scale=3), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('sales_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('day', 'product_id'),
+    )
+    op.create_index('ix_sales_daily_product_id', 'sales_daily', ['product_id'], unique=False)
+
+    op.get_bind().execute(sa.text(
+        "INSERT INTO sales_daily (day, product_id, quantity, revenue, sales_count) "
+        "SELECT date(s.created_at), i.product_id, SUM(i.quantity), SUM(i.line_total), COUNT(DISTINCT i.sale_id) "
+        "FROM sale_items i JOIN sales s ON s.id = i.sale_id "
+        "GROUP BY date(s.created_at), i.product_id"
+    ))
+
+
+def downgrade():
+    op.drop_index('ix_sales_daily_product_id', table_name='sales_daily')
+    op.drop_table('sales_daily')
@@ -0,0 +1,66 @@
+"""add users.phone_normalized
+
+Revision ID: d4e5f6a7b8c9
+Revises: b9a1d2f3c4d5
+Create Date: 2026-03-02 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e5f6a7b8c9'
+down_revision = 'b9a1d2f3c4d5'
+branch_labels = None
+depends_on = None
+
+
+def _normalize_phone(phone_raw):
+    digits = re.sub(r"\D", "", phone_raw or "")
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = f"7{digits[1:]}"
+    if len(digits) == 10:
+        digits = f"7{digits}"
+    if len(digits) != 11 or not digits.startswith("7"):
+        return None
+    return f"+{digits}"
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('phone_normalized', sa.String(length=20), nullable=True))
+
+    # старший по id пользователь сохраняет телефон; у дублей и нераспознанных номеров
+    # phone_normalized остаётся NULL — вход для них идёт по старому сравнению (find_user_by_phone),
+    # пока админ не исправит номер
+    rows = bind.execute(sa.text("SELECT id, phone FROM users ORDER BY id")).fetchall()
+    taken = set()
+    unresolved = []
+    for row in rows:
+        phone = _normalize_phone(row.phone)
+        if not phone or phone in taken:
+            unresolved.append(row.id)
+            continue
+        taken.add(phone)
+        bind.execute(
+            sa.text("UPDATE users SET phone_normalized = :phone WHERE id = :user_id"),
+            {"phone": phone, "user_id": row.id},
+        )
+    if unresolved:
+        print(
+            "users.phone_normalized: телефон не распознан или занят другим пользователем, "
+            f"исправьте номер — id: {', '.join(map(str, unresolved))}"
+        )
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.create_index('ix_users_phone_normalized', ['phone_normalized'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_index('ix_users_phone_normalized')
+        batch_op.drop_column('phone_normalized')
@@ -0,0 +1,36 @@
+"""add total_amount and item_count to sales
+
+Revision ID: d7e8f9a0b1c2
+Revises: c6d7e8f9a0b1
+Create Date: 2026-03-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e8f9a0b1c2'
+down_revision = 'c6d7e8f9a0b1'
+branch_labels = None
+depends_on = None
+
+BACKFILL_SQL = (
+    "UPDATE sales SET "
+    "total_amount = COALESCE((SELECT SUM(i.line_total) FROM sale_items i WHERE i.sale_id = sales.id), 0), "
+    "item_count = (SELECT COUNT(*) FROM sale_items i WHERE i.sale_id = sales.id)"
+)
+
+
+def upgrade():
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.add_column(sa.Column('total_amount', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.get_bind().execute(sa.text(BACKFILL_SQL))
+
+
+def downgrade():
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.drop_column('item_count')
+        batch_op.drop_column('total_amount')
@@ -0,0 +1,39 @@
+"""add product_stock counters
+
+Revision ID: e1f2a3b4c5d6
+Revises: d4e5f6a7b8c9
+Create Date: 2026-03-03 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f2a3b4c5d6'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'product_stock',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.Date(), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=12, scale=3), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('product_id', 'expires_at')
+    )
+
+    op.execute("""
+               INSERT INTO product_stock (product_id, expires_at, quantity)
+               SELECT product_id, expires_at, SUM(quantity)
+               FROM batches
+               GROUP BY product_id, expires_at
+               HAVING SUM(quantity) > 0
+               """)
+
+
+def downgrade():
+    op.drop_table('product_stock')
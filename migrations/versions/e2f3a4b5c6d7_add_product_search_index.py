@@ -0,0 +1,85 @@
+"""add product full-text search (tsvector + trigram on Postgres, FTS5 on SQLite)
+
+Revision ID: e2f3a4b5c6d7
+Revises: d0e1f2a3b4c5
+Create Date: 2026-03-09 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f3a4b5c6d7'
+down_revision = 'd0e1f2a3b4c5'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, tags, supplier_name, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, tags, supplier_name, description)
+        VALUES (new.id, new.name, new.tags, new.supplier_name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, tags, supplier_name, description)
+        VALUES ('delete', old.id, old.name, old.tags, old.supplier_name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, tags, supplier_name, description)
+        VALUES ('delete', old.id, old.name, old.tags, old.supplier_name, old.description);
+        INSERT INTO products_fts(rowid, name, tags, supplier_name, description)
+        VALUES (new.id, new.name, new.tags, new.supplier_name, new.description);
+    END
+    """,
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        # генерируемая колонка: вес A — название, B — теги, C — поставщик, D — описание
+        op.execute("""
+            ALTER TABLE products ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('russian', coalesce(tags, '')), 'B') ||
+                setweight(to_tsvector('russian', coalesce(supplier_name, '')), 'C') ||
+                setweight(to_tsvector('russian', coalesce(description, '')), 'D')
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_products_search_vector ON products USING gin (search_vector)")
+        op.execute("CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)")
+
+    elif bind.dialect.name == 'sqlite':
+        for ddl in SQLITE_FTS_DDL:
+            bind.execute(sa.text(ddl))
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_products_search_vector")
+        op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
+
+    elif bind.dialect.name == 'sqlite':
+        for name in ('products_fts_au', 'products_fts_ad', 'products_fts_ai'):
+            bind.execute(sa.text(f"DROP TRIGGER IF EXISTS {name}"))
+        bind.execute(sa.text("DROP TABLE IF EXISTS products_fts"))
@@ -0,0 +1,23 @@
+"""add (status, created_at) index to preorders
+
+Revision ID: e8f9a0b1c2d3
+Revises: d7e8f9a0b1c2
+Create Date: 2026-03-16 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8f9a0b1c2d3'
+down_revision = 'd7e8f9a0b1c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_preorders_status_created_at', 'preorders', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_preorders_status_created_at', table_name='preorders')
@@ -0,0 +1,41 @@
+"""add draft_lines
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2026-03-04 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a3b4c5d6e7'
+down_revision = 'e1f2a3b4c5d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'draft_lines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('terminal', sa.String(length=32), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('line_key', sa.String(length=40), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=10, scale=3), nullable=False),
+        sa.Column('produced_at', sa.Date(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'terminal', 'kind', 'line_key', name='uq_draft_lines_key')
+    )
+    op.create_index(op.f('ix_draft_lines_user_id'), 'draft_lines', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_draft_lines_user_id'), table_name='draft_lines')
+    op.drop_table('draft_lines')
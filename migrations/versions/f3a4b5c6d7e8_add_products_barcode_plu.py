@@ -0,0 +1,32 @@
+"""add barcode and plu to products
+
+Revision ID: f3a4b5c6d7e8
+Revises: e2f3a4b5c6d7
+Create Date: 2026-03-10 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a4b5c6d7e8'
+down_revision = 'e2f3a4b5c6d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('barcode', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('plu', sa.String(length=5), nullable=True))
+        batch_op.create_index('ix_products_barcode', ['barcode'], unique=True)
+        batch_op.create_index('ix_products_plu', ['plu'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_index('ix_products_plu')
+        batch_op.drop_index('ix_products_barcode')
+        batch_op.drop_column('plu')
+        batch_op.drop_column('barcode')
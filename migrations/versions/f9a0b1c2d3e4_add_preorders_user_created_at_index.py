@@ -0,0 +1,27 @@
+"""add (user_id, created_at DESC) index to preorders
+
+Revision ID: f9a0b1c2d3e4
+Revises: e8f9a0b1c2d3
+Create Date: 2026-03-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f9a0b1c2d3e4'
+down_revision = 'e8f9a0b1c2d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_preorders_user_created_at', 'preorders',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_preorders_user_created_at', table_name='preorders')
@@ -0,0 +1,119 @@
+"""
+Тесты идут на временном SQLite (внешние ключи включены, как на Postgres)
+или на пустой базе из TEST_DATABASE_URL — например, чтобы проверить FOR UPDATE SKIP LOCKED.
+"""
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+from app import create_app, db
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__.startswith("sqlite3"):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.execute("PRAGMA busy_timeout = 30000")
+        cursor.close()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    url = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'test.sqlite'}"
+    monkeypatch.setattr(config.Config, "SQLALCHEMY_DATABASE_URI", url)
+    monkeypatch.setattr(config.Config, "JOBS_FOLDER", str(tmp_path / "jobs"))
+    monkeypatch.setattr(config.Config, "PAGE_CACHE_BACKEND", "memory")
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def serialized_writes(app):
+    """
+    SQLite не знает FOR UPDATE: транзакции открываются BEGIN IMMEDIATE, и второй писатель
+    ждёт первого — так ведут себя блокировки строк партий на Postgres. На Postgres — ничего не меняет.
+    """
+    engine = db.engine
+    if engine.dialect.name != "sqlite":
+        yield
+        return
+
+    def _autocommit_driver(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None  # BEGIN выдаём сами
+
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    db.session.remove()
+    engine.dispose()
+    event.listen(engine, "connect", _autocommit_driver)
+    event.listen(engine, "begin", _begin_immediate)
+    try:
+        yield
+    finally:
+        db.session.remove()
+        event.remove(engine, "begin", _begin_immediate)
+        event.remove(engine, "connect", _autocommit_driver)
+        engine.dispose()
+
+
+@pytest.fixture
+def catalog(app):
+    """Категория и два товара: штучный «Молоко» и весовой «Сыр»."""
+    from app.models import Category, Product
+
+    category = Category(name="Молочка")
+    db.session.add(category)
+    db.session.flush()
+    milk = Product(name="Молоко", price=Decimal("100"), category_id=category.id, shelf_life_days=5)
+    cheese = Product(name="Сыр", price=Decimal("500"), is_weight_based=True, category_id=category.id,
+                     shelf_life_days=30)
+    db.session.add_all([milk, cheese])
+    db.session.commit()
+    return milk, cheese
+
+
+@pytest.fixture
+def admin_client(app):
+    """Клиент, вошедший как администратор."""
+    from app.models import User
+
+    admin = User(username="admin", phone="+79001234567", phone_normalized="+79001234567",
+                 password_hash="x", is_admin=True)
+    db.session.add(admin)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(admin.id)
+    return client
+
+
+def add_batch(product, quantity, produced_days_ago=0, expires_in=5):
+    """Партия + счётчик остатка, как при поставке (без commit)."""
+    from app.models import Batch
+    from app.stock import adjust_stock
+
+    today = date.today()
+    batch = Batch(
+        product_id=product.id,
+        quantity=Decimal(str(quantity)),
+        produced_at=today - timedelta(days=produced_days_ago),
+        expires_at=today + timedelta(days=expires_in),
+    )
+    db.session.add(batch)
+    adjust_stock(product.id, batch.expires_at, batch.quantity)
+    return batch
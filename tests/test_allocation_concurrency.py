@@ -0,0 +1,134 @@
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from app.allocation import InsufficientStock, allocate
+from app.models import Batch, ProductStock
+from app.stock import reconcile_stock
+from tests.conftest import add_batch
+
+TILLS = 8
+ATTEMPTS_PER_TILL = 25
+
+
+def _sell(app, product_id, qty, results):
+    with app.app_context():
+        try:
+            allocated = allocate([(product_id, qty)])
+            db.session.commit()
+            results.append(sum(line.quantity for line in allocated))
+        except InsufficientStock:
+            db.session.rollback()
+            results.append(Decimal("0"))
+        finally:
+            db.session.remove()
+
+
+def _till(app, product_id, results, start):
+    start.wait()
+    for _ in range(ATTEMPTS_PER_TILL):
+        _sell(app, product_id, Decimal("1"), results)
+
+
+def test_parallel_tills_never_oversell(app, serialized_writes, catalog):
+    milk, _ = catalog
+    product_id = milk.id
+    for days_ago, qty in ((3, 20), (2, 30), (1, 10)):
+        add_batch(milk, qty, produced_days_ago=days_ago)
+    db.session.commit()  # дальше основной поток не держит транзакцию, пока работают кассы
+    stock = Decimal("60")
+
+    results, start = [], threading.Event()
+    tills = [threading.Thread(target=_till, args=(app, product_id, results, start)) for _ in range(TILLS)]
+    for till in tills:
+        till.start()
+    start.set()
+    for till in tills:
+        till.join()
+
+    sold = sum(results, Decimal("0"))
+    # спрос (8 × 25 = 200) больше остатка: продано ровно то, что было, — ни больше (перепродажа),
+    # ни меньше (ложная нехватка из-за SKIP LOCKED перепроверяется с ожиданием)
+    assert len(results) == TILLS * ATTEMPTS_PER_TILL
+    assert sold == stock
+    assert Batch.query.filter_by(product_id=product_id).count() == 0
+    assert ProductStock.query.filter_by(product_id=product_id).count() == 0
+    assert reconcile_stock(fix=False) == []
+
+
+def test_skip_locked_shortage_is_rechecked_with_waiting_lock(app, catalog):
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("SKIP LOCKED есть только на Postgres (TEST_DATABASE_URL)")
+
+    milk, _ = catalog
+    add_batch(milk, 5)
+    db.session.commit()
+
+    holding, release = threading.Event(), threading.Event()
+
+    def _other_till():
+        with app.app_context():
+            allocate([(milk.id, Decimal("2"))])
+            holding.set()  # партия заблокирована и не закоммичена
+            release.wait(5)
+            db.session.commit()
+            db.session.remove()
+
+    other = threading.Thread(target=_other_till)
+    other.start()
+    holding.wait(5)
+    threading.Timer(0.3, release.set).start()
+
+    started = time.monotonic()
+    allocated = allocate([(milk.id, Decimal("3"))])  # SKIP LOCKED не видит партию -> ждём вторую кассу
+    db.session.commit()
+    other.join()
+
+    assert sum(line.quantity for line in allocated) == Decimal("3")
+    assert time.monotonic() - started >= 0.2
+    assert Batch.query.filter_by(product_id=milk.id).count() == 0
+
+
+ROUNDS = 20
+
+
+def test_sales_needing_both_batches_do_not_deadlock(app, serialized_writes, catalog):
+    # каждая продажа (6) больше первой партии (5): обеим кассам нужны обе партии.
+    # Если касса, взявшая в первом проходе одну партию, держала бы её во втором,
+    # Postgres прерывал бы одну из продаж с DeadlockDetected
+    milk, _ = catalog
+    product_id = milk.id
+    db.session.commit()
+
+    for _ in range(ROUNDS):
+        add_batch(milk, 5, produced_days_ago=2)
+        add_batch(milk, 10, produced_days_ago=1)
+        db.session.commit()
+
+        results, errors, start = [], [], threading.Barrier(2)
+
+        def _sale():
+            start.wait()
+            try:
+                _sell(app, product_id, Decimal("6"), results)
+            except Exception as e:  # DeadlockDetected и прочее — в основной поток
+                errors.append(e)
+
+        sales = [threading.Thread(target=_sale) for _ in range(2)]
+        for sale in sales:
+            sale.start()
+        for sale in sales:
+            sale.join()
+
+        assert errors == []
+        assert results == [Decimal("6"), Decimal("6")]
+        left = db.session.execute(
+            db.select(db.func.sum(Batch.quantity)).where(Batch.product_id == product_id)
+        ).scalar()
+        assert Decimal(str(left)) == Decimal("3")
+        db.session.execute(db.delete(Batch).where(Batch.product_id == product_id))
+        db.session.execute(db.delete(ProductStock).where(ProductStock.product_id == product_id))
+        db.session.commit()
@@ -0,0 +1,49 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from app.backup import parse_watermark, restore_chain
+
+
+def _increment(since, watermark):
+    meta = {"kind": "incremental", "since": since, "watermark": watermark, "tables": []}
+    return iter([{"table": "meta", "row": meta}])
+
+
+@pytest.fixture
+def app_timezone(monkeypatch):
+    """Пояс процесса приложения отличается от пояса БД (SQLite пишет now() в UTC)."""
+    monkeypatch.setenv("TZ", "Asia/Vladivostok")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_parse_watermark_uses_db_clock_not_process_zone(app, app_timezone):
+    if db.engine.dialect.name != "sqlite":
+        pytest.skip("пояс БД задан только для SQLite (UTC)")
+    assert datetime(2026, 3, 1, 12, 0).astimezone().utcoffset() == timedelta(hours=10)
+
+    # водяной знак с поясом -> те же часы, что у CURRENT_TIMESTAMP и колонок *_at, а не +10
+    assert parse_watermark("2026-03-01T12:00:00+03:00") == datetime(2026, 3, 1, 9, 0)
+    assert parse_watermark("2026-03-01T12:00:00") == datetime(2026, 3, 1, 12, 0)
+
+    # наивный now() базы и он же с поясом UTC — один и тот же момент
+    stamp = db.session.execute(db.select(db.func.now())).scalar()
+    assert parse_watermark(stamp.replace(tzinfo=timezone.utc).isoformat()) == stamp
+
+
+def test_chain_mixes_aware_watermark_with_naive_since(app):
+    watermark = datetime(2026, 3, 1, 12, 0).astimezone()  # now() Postgres — с поясом
+    naive_since = watermark.replace(tzinfo=None) - timedelta(minutes=1)  # --since, введённый руками
+    full = iter([{"table": "meta", "row": {"kind": "full", "watermark": watermark.isoformat(), "tables": []}}])
+
+    restore_chain([full, _increment(naive_since.isoformat(), (watermark + timedelta(hours=1)).isoformat())])
+
+    gap = (watermark + timedelta(minutes=1)).replace(tzinfo=None).isoformat()
+    with pytest.raises(ValueError, match="Разрыв"):
+        full = iter([{"table": "meta", "row": {"kind": "full", "watermark": watermark.isoformat(), "tables": []}}])
+        restore_chain([full, _increment(gap, gap)])
@@ -0,0 +1,37 @@
+import shutil
+
+from app import db
+from app.backup import export_backup_job, restore_backup_job
+from app.jobs import JobReporter
+from app.models import Batch, Job, User
+from tests.conftest import add_batch
+
+
+def test_full_restore_with_foreign_keys_keeps_job_history(app, catalog, tmp_path):
+    milk, _ = catalog
+    admin = User(username="admin", phone="+79001234567", phone_normalized="+79001234567",
+                 password_hash="x", is_admin=True)
+    db.session.add(admin)
+    add_batch(milk, 10)
+    db.session.commit()
+
+    export = Job(kind="backup_export", user_id=admin.id)
+    db.session.add(export)
+    db.session.commit()
+    backup_path = str(tmp_path / "full.ndjson.gz")
+    export_backup_job(JobReporter(export.id), backup_path)
+
+    # задача восстановления ссылается на пользователя, которого полное восстановление удаляет
+    restore = Job(kind="backup_restore", user_id=admin.id, status="running")
+    db.session.add(restore)
+    db.session.commit()
+    restore_id = restore.id
+    upload = str(tmp_path / "upload.ndjson.gz")  # restore_backup_job удаляет загруженные файлы
+    shutil.copy(backup_path, upload)
+
+    restore_backup_job(JobReporter(restore_id), [upload])
+    db.session.expire_all()
+
+    assert [u.username for u in User.query.all()] == ["admin"]
+    assert Batch.query.count() == 1
+    assert db.session.get(Job, restore_id).user_id is None
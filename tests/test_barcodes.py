@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from app.barcodes import parse_code, scan_quantity
+
+
+def _weight_code(plu, grams, prefix="20"):
+    body = f"{prefix}{int(plu):05d}{grams:05d}"
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(body)))
+    return body + str((10 - total % 10) % 10)
+
+
+@pytest.fixture
+def plu_catalog(catalog):
+    milk, cheese = catalog
+    milk.plu, cheese.plu = "41", "42"
+    db.session.commit()
+    return milk, cheese
+
+
+def test_weight_code_for_weight_product(app, plu_catalog):
+    _, cheese = plu_catalog
+    assert scan_quantity(cheese, parse_code(_weight_code(42, 347))) == Decimal("0.347")
+
+
+def test_weight_code_for_piece_product_is_rejected(app, plu_catalog):
+    milk, _ = plu_catalog
+    with pytest.raises(ValueError, match="штучного"):
+        scan_quantity(milk, parse_code(_weight_code(41, 347)))
+
+
+def test_scanner_posts_json_without_csrf_token(app, admin_client, plu_catalog):
+    milk, cheese = plu_catalog
+    app.config.update(WTF_CSRF_ENABLED=True)
+
+    response = admin_client.post("/admin/sales/scan", json={"code": _weight_code(42, 347)})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()["quantity"] == "0.347"
+
+    rejected = admin_client.post("/admin/sales/scan", json={"code": _weight_code(41, 347)})
+    assert rejected.status_code == 400
+    assert "штучного" in rejected.get_json()["error"]
+
+    # форма со страницы кассы без токена по-прежнему отклоняется
+    assert admin_client.post("/admin/sales/scan", data={"code": "41"}).status_code == 400
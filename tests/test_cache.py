@@ -0,0 +1,25 @@
+from app.cache import LRUCache, SQLiteCache
+
+
+def test_lru_ignores_writes_of_older_version():
+    cache = LRUCache()
+    cache.set(2, "home", "new")
+    cache.set(1, "catalog", "stale")
+
+    assert cache.get(2, "home") == "new"
+    assert cache.get(1, "catalog") is None
+
+    cache.set(3, "home", "newer")
+    assert cache.get(2, "home") is None
+    assert cache.get(3, "home") == "newer"
+
+
+def test_sqlite_cache_keeps_newer_page(app, tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    stale_worker = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    stale_worker.set(1, "home", "old")
+    cache.set(2, "home", "new")
+    stale_worker.set(1, "home", "stale")  # этот воркер ещё не видел версию 2
+
+    assert cache.get(2, "home") == "new"
+    assert cache.get(1, "home") is None
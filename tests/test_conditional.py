@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app import db
+from app.conditional import _as_utc
+
+
+def test_catalog_page_is_validated_by_etag_only(app, catalog):
+    client = app.test_client()
+    first = client.get("/products")
+    assert first.status_code == 200
+    assert first.headers.get("ETag")
+    assert "Last-Modified" not in first.headers
+
+    # без Last-Modified одного If-Modified-Since мало: шапка и шаблоны могли смениться
+    future = "Fri, 01 Jan 2100 00:00:00 GMT"
+    assert client.get("/products", headers={"If-Modified-Since": future}).status_code == 200
+    assert client.get("/products", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_naive_sqlite_time_is_utc(app):
+    if db.engine.dialect.name != "sqlite":
+        pytest.skip("на Postgres пояс берётся из current_setting('TimeZone')")
+    # SQLite пишет CURRENT_TIMESTAMP в UTC
+    assert _as_utc(datetime(2026, 3, 1, 12, 0, 0, 500)) == datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Preorder, User
+from app.orders import ACTIVE_PER_PAGE, customer_orders
+
+
+def test_customer_orders_pages_through_all_active_orders(app):
+    user = User(username="buyer", phone="+79001234567", phone_normalized="+79001234567", password_hash="x")
+    db.session.add(user)
+    db.session.flush()
+    start = datetime(2026, 1, 1)
+    total_active = ACTIVE_PER_PAGE + 7
+    db.session.add_all(
+        Preorder(user_id=user.id, status="active", created_at=start + timedelta(minutes=n))
+        for n in range(total_active)
+    )
+    db.session.add(Preorder(user_id=user.id, status="completed", created_at=start))
+    db.session.commit()
+
+    active, active_next, history, _ = customer_orders(user.id)
+    assert len(active) == ACTIVE_PER_PAGE and active_next
+    assert len(history) == 1
+
+    rest, rest_next, history, next_cursor = customer_orders(user.id, active_after=active_next)
+    assert len(rest) == total_active - ACTIVE_PER_PAGE and rest_next is None
+    assert history == [] and next_cursor is None
+    assert {o.id for o in active}.isdisjoint(o.id for o in rest)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+    page = client.get("/profile").get_data(as_text=True)
+    assert "Показать ещё активные" in page
+    assert "Показать ещё активные" not in client.get(f"/profile?active_after={active_next}").get_data(as_text=True)
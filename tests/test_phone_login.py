@@ -0,0 +1,61 @@
+import importlib.util
+from pathlib import Path
+
+import sqlalchemy as sa
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+
+from app import db
+from app.commands import users_phones_command
+from app.models import User
+from app.routes import find_user_by_phone
+
+MIGRATION = Path(__file__).parent.parent / "migrations" / "versions" / "d4e5f6a7b8c9_add_users_phone_normalized.py"
+
+
+def _migration():
+    spec = importlib.util.spec_from_file_location("phone_normalized_migration", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_migration_leaves_duplicates_and_garbage_null_and_reports_them(tmp_path, capsys):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'old.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE users (id INTEGER PRIMARY KEY, phone VARCHAR(20))"))
+        conn.execute(sa.text("INSERT INTO users (id, phone) VALUES (1, '8 (900) 123-45-67'), "
+                             "(2, '+7 900 123 45 67'), (3, 'нет'), (4, '9001112233')"))
+        with Operations.context(MigrationContext.configure(conn)):
+            _migration().upgrade()
+        phones = dict(conn.execute(sa.text("SELECT id, phone_normalized FROM users")).all())
+
+    assert phones == {1: "+79001234567", 2: None, 3: None, 4: "+79001112233"}
+    assert "id: 2, 3" in capsys.readouterr().out
+
+
+def test_login_falls_back_for_users_without_normalized_phone(app):
+    db.session.add_all([
+        User(username="new", phone="+79001234567", phone_normalized="+79001234567", password_hash="x"),
+        User(username="legacy", phone="8 (900) 555-00-11", phone_normalized=None, password_hash="x"),
+    ])
+    db.session.commit()
+
+    assert find_user_by_phone("89001234567").username == "new"
+    assert find_user_by_phone("+7 900 555 00 11").username == "legacy"
+    assert find_user_by_phone("+79009999999") is None
+
+
+def test_users_phones_command_fills_free_numbers(app):
+    db.session.add_all([
+        User(username="a", phone="+79001234567", phone_normalized="+79001234567", password_hash="x"),
+        User(username="dup", phone="8 900 123 45 67", phone_normalized=None, password_hash="x"),
+        User(username="free", phone="8 900 555 00 11", phone_normalized=None, password_hash="x"),
+    ])
+    db.session.commit()
+
+    output = app.test_cli_runner().invoke(users_phones_command).output
+    assert "+79001234567 занят" in output
+    assert "исправлено: 1" in output
+    assert User.query.filter_by(username="free").one().phone_normalized == "+79005550011"
+    assert User.query.filter_by(username="dup").one().phone_normalized is None
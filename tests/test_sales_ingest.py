@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app import db
+from app.models import Batch, Sale
+from tests.conftest import add_batch
+
+TILL_KEY = "till-1-secret"
+
+
+def _queue(key, product_id, qty):
+    sold_at = (datetime.now() - timedelta(hours=1)).isoformat()
+    return {"sales": [{"key": key, "sold_at": sold_at, "items": [{"product_id": product_id, "qty": qty}]}]}
+
+
+def test_offline_till_flushes_queue_with_key_and_no_session(app, catalog):
+    milk, _ = catalog
+    add_batch(milk, 5)
+    db.session.commit()
+    app.config.update(WTF_CSRF_ENABLED=True, TILL_API_KEYS=[TILL_KEY])
+    client = app.test_client()  # ни сессии, ни CSRF-токена — как у кассы после простоя без сети
+
+    payload = _queue("till1-000001", milk.id, "2")
+    response = client.post("/admin/sales/ingest", json=payload, headers={"X-Till-Key": TILL_KEY})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()["results"][0]["status"] == "created"
+
+    # повтор той же очереди после обрыва связи — без дублей
+    again = client.post("/admin/sales/ingest", json=payload, headers={"X-Till-Key": TILL_KEY})
+    assert again.get_json()["results"][0]["status"] == "duplicate"
+    assert Sale.query.count() == 1
+    assert Decimal(str(Batch.query.one().quantity)) == Decimal("3")
+
+
+def test_ingest_rejects_unknown_key_and_anonymous(app, catalog):
+    app.config.update(WTF_CSRF_ENABLED=True, TILL_API_KEYS=[TILL_KEY])
+    client = app.test_client()
+    payload = _queue("till1-000001", catalog[0].id, "1")
+
+    assert client.post("/admin/sales/ingest", json=payload, headers={"X-Till-Key": "wrong"}).status_code == 403
+    assert client.post("/admin/sales/ingest", json=payload).status_code == 302  # на страницу входа
+    assert Sale.query.count() == 0
+
+
+def test_admin_session_posts_json_without_csrf_token(app, admin_client, catalog):
+    milk, _ = catalog
+    add_batch(milk, 5)
+    db.session.commit()
+    app.config.update(WTF_CSRF_ENABLED=True)
+
+    payload = _queue("till1-000002", milk.id, "1")
+    assert admin_client.post("/admin/sales/ingest", json=payload).status_code == 200
+    # не-JSON по-прежнему требует токен страницы
+    assert admin_client.post("/admin/sales/ingest", data={"sales": "x"}).status_code == 400